@@ -20,7 +20,7 @@ load_dotenv()
 api_key = os.getenv("GEMINI_API_KEY")
 # client = genai.Client(api_key=api_key)
 genai.configure(api_key=api_key)
-client = GenerativeModel("gemini-2.0-flash")
+# The model is created in main(), once the tools for its system instruction are known
 
 
 max_iterations = 11
@@ -28,18 +28,16 @@ last_response = None
 iteration = 0
 iteration_response = []
 
-async def generate_with_timeout(client, prompt, timeout=10):
-    """Generate content with a timeout"""
+async def generate_with_timeout(chat, message, timeout=10):
+    """Send the next message of the chat session with a timeout"""
     print("Starting LLM generation...")
     try:
-        # Convert the synchronous generate_content call to run in a thread
+        # Convert the synchronous send_message call to run in a thread
         loop = asyncio.get_event_loop()
         response = await asyncio.wait_for(
             loop.run_in_executor(
                 None, 
-                lambda: client.generate_content(
-                    contents=prompt
-                )
+                lambda: chat.send_message(message)
             ),
             timeout=timeout
         )
@@ -159,6 +157,11 @@ DO NOT include any explanations or additional text.
 Your entire response should be a single line starting with either FUNCTION_CALL: or ALL_EXECUTION_COMPLETE:"""
 
                 query = """Find the ASCII values of characters in INDIA and then return sum of exponentials of those values. Finally and display the result in Paint. """
+
+                # The system prompt goes in once as the system instruction, and the chat
+                # session keeps the earlier turns, so each iteration only sends its new result
+                client = GenerativeModel("gemini-2.0-flash", system_instruction=system_prompt)
+                chat = client.start_chat()
                 print("Starting iteration loop...")
                 
                 # Use global iteration variables
@@ -167,16 +170,14 @@ Your entire response should be a single line starting with either FUNCTION_CALL:
                 while iteration < max_iterations:
                     print(f"\n--- Iteration {iteration + 1} ---")
                     if last_response is None:
-                        current_query = query
+                        message = f"Query: {query}"
                     else:
-                        current_query = current_query + "\n\n" + " ".join(iteration_response)
-                        current_query = current_query + "  What should I do next?"
+                        message = iteration_response[-1] + "  What should I do next?"
 
                     # Get model's response with timeout
                     print("Preparing to generate LLM response...")
-                    prompt = f"{system_prompt}\n\nQuery: {current_query}"
                     try:
-                        response = await generate_with_timeout(client, prompt)
+                        response = await generate_with_timeout(chat, message)
                         response_text = response.text.strip()
                         print(f"LLM Response: {response_text}")
                         
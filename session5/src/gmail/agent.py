@@ -0,0 +1,129 @@
+import asyncio
+import concurrent.futures
+import time
+import traceback
+
+from function_calls import FunctionCallSplitter, call_with_limit, parse_function_call
+from prompting import create_agent_prompt
+from renderers import FINAL_TOOLS, render_result
+
+
+class AgentLoop:
+    """Server-side tool loop for one user request.
+
+    After each round of tool calls the model is asked for its next action with
+    every result so far in context, until it answers in plain text or the step or
+    time budget runs out. Progress goes into the execution store: each step
+    is appended to the entry's steps and the model's text is streamed into
+    processed_result, so SSE clients see the run as it happens.
+
+    call_tool(func_name, params) is awaited and returns (arguments, result_text).
+    complete(prompt, on_chunk) is awaited and calls on_chunk with each piece of
+    streamed model text. log(sender, message), if given, receives each tool
+    result and the final answer as conversation turns.
+    """
+
+    def __init__(self, store, call_tool, complete, max_steps: int = 6, time_budget: float = 90, max_parallel: int = 4,
+                 log=None):
+        self.store = store
+        self.call_tool = call_tool
+        self.complete = complete
+        self.log = log or (lambda sender, message: None)
+        self.max_steps = max_steps
+        self.time_budget = time_budget
+        # Shared by all runs, so concurrent requests together stay within the limit
+        self.slots = asyncio.Semaphore(max_parallel)
+
+    def create(self, execution_id, func_name):
+        self.store.create(execution_id, {
+            "status": "processing",
+            "function_name": func_name,
+            "error": None,
+            "raw_result": None,
+            "processed_result": None,
+            "steps": []
+        })
+
+    def fail(self, execution_id, error):
+        """Mark an execution failed whose run never started, e.g. when the model's stream broke off"""
+        self.store.update(execution_id, {"status": "error", "error": error})
+
+    def execute(self, func_name, params):
+        """Coroutine running one call within the concurrency limit; returns its step dict"""
+        return call_with_limit(self.slots, self.call_tool, func_name, params)
+
+    async def run(self, execution_id, user_message, calls, started=None):
+        """Execute calls and keep going until the model has an answer.
+
+        calls is a list of (func_name, params). The calls of one model turn are
+        independent and run concurrently; started may hold futures for calls
+        of the first turn that are already running.
+        """
+        deadline = time.monotonic() + self.time_budget
+        steps = []
+        try:
+            while True:
+                self.store.update(execution_id, {"function_name": ", ".join(func_name for func_name, _ in calls)})
+                pending = started or [self.execute(func_name, params) for func_name, params in calls]
+                started = None
+                # Futures from other threads (run_coroutine_threadsafe) need wrapping to be awaited
+                results = await asyncio.gather(*(
+                    asyncio.wrap_future(p) if isinstance(p, concurrent.futures.Future) else p for p in pending
+                ))
+                steps.extend(results)
+                for step in results:
+                    self.log("System", f"Result from {step['functionName']}:\n{step['result']}")
+                self.store.update(execution_id, {
+                    "steps": list(steps),
+                    "raw_result": "\n".join(step["result"] for step in results),
+                    "processed_result": None
+                })
+
+                # A request that was a single final action (send, trash, ...) needs
+                # no further model turn. Anything longer may have steps left, so the
+                # model is always asked for its next action after those.
+                if len(steps) == 1 and steps[0]["functionName"] in FINAL_TOOLS:
+                    answer = render_result(steps[0]["functionName"], steps[0]["arguments"], steps[0]["result"])
+                    if answer is not None:
+                        break
+
+                can_continue = len(steps) < self.max_steps and time.monotonic() < deadline
+                answer, next_calls = await self.next_action(execution_id, create_agent_prompt(user_message, steps, can_continue))
+                if not next_calls:
+                    break
+                if not can_continue:
+                    answer = answer or f"I stopped after {len(steps)} tool calls without finishing. The results so far are shown above."
+                    break
+                calls = [parse_function_call(call) for call in next_calls]
+
+            self.store.update(execution_id, {
+                "status": "completed",
+                "processed_result": answer
+            })
+            if answer:
+                self.log("Assistant", answer)
+        except Exception as e:
+            error_details = traceback.format_exc()
+            self.store.update(execution_id, {
+                "status": "error",
+                "error": f"Error executing {', '.join(func_name for func_name, _ in calls)}: {str(e)}\n\nDetails:\n{error_details}"
+            })
+
+    async def next_action(self, execution_id, prompt):
+        """Stream the model's next turn; returns its text and every function call in it"""
+        splitter = FunctionCallSplitter()
+        text = ""
+        calls = []
+
+        def handle(pieces):
+            nonlocal text
+            for kind, value in pieces:
+                if kind == "call":
+                    calls.append(value)
+                elif not calls:
+                    text += value
+                    self.store.update(execution_id, {"processed_result": text})
+
+        await self.complete(prompt, lambda chunk: handle(splitter.feed(chunk)))
+        handle(splitter.close())
+        return text.strip(), calls
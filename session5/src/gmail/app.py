@@ -3,10 +3,16 @@ import asyncio
 import threading
 import uuid
 import json
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory
 from dotenv import load_dotenv
-from mcp import ClientSession, StdioServerParameters
 import google.generativeai as genai
+from agent import AgentLoop
+from conversation_log import ConversationLog
+from execution_store import open_execution_store, result_payload
+from llm_cache import ResponseCache
+from function_calls import parse_function_call, parse_function_calls, split_function_calls
+from prompting import SystemPromptModel, create_system_prompt
+from web_backend import call_tool, create_session_pool, email_data, fetch_tool_text, startup_error_message, tool_error
 
 # Load environment variables
 load_dotenv()
@@ -14,80 +20,97 @@ load_dotenv()
 # Initialize Gemini
 api_key = os.getenv("GEMINI_API_KEY")
 genai.configure(api_key=api_key)
-model = genai.GenerativeModel("gemini-2.0-flash")
 
 # Initialize Flask app
 app = Flask(__name__, static_folder='static')
 
-# Global variables
-session = None
+# Per-worker state: every worker process has its own MCP session pool
+pool = None
 tools = []
-function_results = {}
 initialization_status = {"status": "not_started", "error": None}
 
+# Store of execution results, shared by all workers. In memory by default; set
+# EXECUTION_STORE_PATH to a SQLite file when running several worker processes,
+# so an execution started in one worker can be read from any other.
+function_results = open_execution_store()
+
+# With CONVERSATION_LOG_PATH set, every turn of the conversation (tool results
+# included) is appended to that file, so a reloaded page or a restarted server
+# can show where the conversation left off. Workers share the file. Unset, the
+# conversation is not written to disk.
+conversation_log = ConversationLog(os.getenv("CONVERSATION_LOG_PATH"))
+
+# Model carrying the system prompt, rebuilt only when the tool list changes
+assistant_model = SystemPromptModel("gemini-2.0-flash", create_system_prompt)
+
+# Cache of first-pass answers, so repeated requests skip the Gemini round trip.
+# Set LLM_CACHE_PATH to a SQLite file to keep it across restarts.
+response_cache = ResponseCache(
+    max_size=int(os.getenv("LLM_CACHE_SIZE", "500")),
+    ttl=float(os.getenv("LLM_CACHE_TTL", "600")),
+    path=os.getenv("LLM_CACHE_PATH")
+)
+
+# Long-lived event loop that owns the worker's MCP session pool. Flask request threads
+# never await on their own loops; they submit coroutines here with run_coroutine_threadsafe,
+# and concurrent tool calls are spread over the pool's server processes. The loop is
+# started per process on first use, since a thread does not survive a fork.
+loop = None
+loop_pid = None
+worker_lock = threading.Lock()
+initialized = threading.Event()
+
+def ensure_worker():
+    """Start this worker's session loop and MCP session pool if it has none yet"""
+    global loop, loop_pid, pool, tools, initialization_status, initialized
+    with worker_lock:
+        if loop_pid != os.getpid():
+            # First use in this process, or state inherited from a parent process
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, daemon=True, name="mcp-session-loop").start()
+            loop_pid = os.getpid()
+            pool, tools = None, []
+            initialization_status = {"status": "not_started", "error": None}
+            initialized = threading.Event()
+        if initialization_status["status"] == "not_started":
+            initialize_server()
+
 def initialize_server():
-    """Initialize connection to the MCP server in a separate thread"""
+    """Start the MCP session pool on the session loop"""
     global initialization_status
     initialization_status = {"status": "in_progress", "error": None}
-    
-    try:
-        asyncio.run(setup_session())
-    except Exception as e:
-        initialization_status = {"status": "failed", "error": str(e)}
+
+    def on_done(future):
+        global initialization_status
+        if not future.cancelled() and future.exception() is not None:
+            initialization_status = {"status": "failed", "error": initialization_status["error"] or str(future.exception())}
+        initialized.set()
+
+    asyncio.run_coroutine_threadsafe(setup_session(), loop).add_done_callback(on_done)
 
 async def setup_session():
-    """Set up the MCP client session"""
-    global session, tools, initialization_status
-    venv_python_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '.venv', 'Scripts', 'python.exe'))    
-    
+    """Start and warm up the pool of MCP server sessions"""
+    global pool, tools, initialization_status
     try:
-        server_params = StdioServerParameters(
-            command=venv_python_path,
-            args=["src/gmail/server.py"]
-        )
-        
-        async with asyncio.timeout(30):  # 30-second timeout for connection
-            from mcp.client.stdio import stdio_client
-            async with stdio_client(server_params) as (read, write):
-                async with ClientSession(read, write) as client_session:
-                    session = client_session
-                    await session.initialize()
-                    
-                    # Get available tools
-                    tools_result = await session.list_tools()
-                    tools = tools_result.tools
-                    
-                    initialization_status = {"status": "success", "error": None}
-                    
-                    # Keep the session alive
-                    while True:
-                        await asyncio.sleep(1)
+        pool = create_session_pool()
+        tools = await pool.start()
+        initialization_status = {"status": "success", "error": None}
     except Exception as e:
-        error_msg = str(e)
-        if "credentials file not found" in error_msg.lower():
-            error_msg = "Gmail credentials file not found. Please create a 'gmail_cred.json' file with your OAuth 2.0 credentials in the project root directory."
-        elif "invalid_grant" in error_msg.lower():
-            error_msg = "Invalid authentication credentials. Your OAuth token may have expired. Delete the token.json file and try again."
-        elif "access_denied" in error_msg.lower():
-            error_msg = "Access denied. You need to authorize the application to access your Gmail account."
-        
-        initialization_status = {"status": "failed", "error": error_msg}
+        initialization_status = {"status": "failed", "error": startup_error_message(e)}
         raise
 
+@app.before_request
+def start_worker():
+    # Any worker may serve any request, so each one connects on the first request it sees
+    ensure_worker()
+
 @app.route('/')
 def index():
     return send_from_directory('.', 'index.html')
 
 @app.route('/api/initialize', methods=['POST'])
 def api_initialize():
-    global initialization_status
-    
-    # Start initialization in a separate thread if not already started
-    if initialization_status["status"] == "not_started":
-        threading.Thread(target=initialize_server, daemon=True).start()
-        return jsonify({"success": True, "message": "Initialization started", "toolCount": 0})
-    
-    # Check initialization status
+    # Initialization was started by start_worker; report this worker's status
     if initialization_status["status"] == "in_progress":
         return jsonify({"success": True, "message": "Initialization in progress", "toolCount": 0})
     elif initialization_status["status"] == "success":
@@ -100,42 +123,27 @@ def process_message():
     data = request.json
     user_message = data.get('message', '')
     
-    # Create system prompt
-    tools_description = get_tools_description()
-    system_prompt = create_system_prompt(tools_description)
+    # This worker may still be connecting; the tool list is needed for the prompt
+    initialized.wait(timeout=30)
+    conversation_log.append("You", user_message)
     
     try:
-        # Get AI response
-        prompt = f"{system_prompt}\n\nUser: {user_message}"
-        response = model.generate_content(prompt)
-        response_text = response.text
+        # Get AI response; the system prompt is cached with the model per tool-list version.
+        # The answer only depends on the message and the tools, so it can come from the cache.
+        model_for_tools = assistant_model.get(tools)
+        response_text = response_cache.generate(model_for_tools, f"User: {user_message}", context=assistant_model.version)
         
-        # Check if response contains a function call
-        if "FUNCTION_CALL:" in response_text:
-            parts = response_text.split("FUNCTION_CALL:")
-            explanation = parts[0].strip()
-            
-            # Parse function call
-            function_info = parts[1].strip().split('\n')[0].strip()
-            function_parts = [p.strip() for p in function_info.split("|")]
-            func_name = function_parts[0]
-            params = function_parts[1:] if len(function_parts) > 1 else []
-            
-            # Generate unique ID for this function execution
-            execution_id = str(uuid.uuid4())
-            
-            # Start function execution in a separate thread
-            threading.Thread(
-                target=execute_function_call,
-                args=(func_name, params, execution_id),
-                daemon=True
-            ).start()
+        # Check if response contains function calls; all of them run, concurrently
+        explanation, calls = parse_function_calls(response_text)
+        conversation_log.append("Assistant", explanation if calls else response_text.strip())
+        if calls:
+            execution_id = start_function_calls(user_message, calls)
             
             # Return response with function call info
             return jsonify({
                 "type": "function_call",
                 "explanation": explanation,
-                "functionName": func_name,
+                "functionName": ", ".join(func_name for func_name, _ in calls),
                 "executionId": execution_id
             })
         else:
@@ -150,248 +158,167 @@ def process_message():
             "error": str(e)
         })
 
-@app.route('/api/function_result/<execution_id>')
-def get_function_result(execution_id):
-    """Get the result of a function execution"""
-    global function_results
-    
-    if execution_id not in function_results:
-        return jsonify({"status": "pending"})
-    
-    result = function_results[execution_id]
-    
-    if result["status"] == "error":
-        return jsonify({
-            "status": "error",
-            "functionName": result["function_name"],
-            "error": result["error"]
-        })
-    elif result["status"] == "completed":
-        return jsonify({
-            "status": "completed",
-            "functionName": result["function_name"],
-            "rawResult": result["raw_result"],
-            "processedResult": result["processed_result"]
-        })
-    else:
-        return jsonify({"status": "processing"})
+@app.route('/api/process/stream', methods=['POST'])
+def process_message_stream():
+    """Stream the model's answer as newline-delimited JSON events.
 
-def get_tools_description():
-    """Create a description string for available tools"""
-    global tools
-    
-    if not tools:
-        return "No tools available. Server connection might be down."
+    Text is forwarded as it arrives. Each FUNCTION_CALL line is executed as
+    soon as it is complete, so tools run while the model is still writing;
+    the agent loop picks up their results once the stream ends.
+    """
+    data = request.json
+    user_message = data.get('message', '')
+    initialized.wait(timeout=30)
+    conversation_log.append("You", user_message)
     
-    tools_description = []
-    for i, tool in enumerate(tools):
+    def events():
+        execution_id = None
+        handed_off = False
         try:
-            params = tool.inputSchema
-            desc = getattr(tool, 'description', 'No description available')
-            name = getattr(tool, 'name', f'tool_{i}')
-            
-            if 'properties' in params:
-                param_details = []
-                for param_name, param_info in params['properties'].items():
-                    param_type = param_info.get('type', 'unknown')
-                    param_desc = param_info.get('description', '')
-                    param_details.append(f"{param_name} ({param_type}): {param_desc}")
-                params_str = '\n    - ' + '\n    - '.join(param_details) if param_details else 'no parameters'
-            else:
-                params_str = 'no parameters'
-
-            tool_desc = f"{name}: {desc}\n  Parameters: {params_str}"
-            tools_description.append(tool_desc)
-        except Exception:
-            tools_description.append(f"Error processing tool {i}")
-    
-    return "\n\n".join(tools_description)
-
-def create_system_prompt(tools_description):
-    """Create the system prompt for the LLM"""
-    return f"""You are an intelligent email assistant with access to the user's Gmail account.
+            model_for_tools = assistant_model.get(tools)
+            chunks = response_cache.stream(model_for_tools, f"User: {user_message}", context=assistant_model.version)
+            calls = []
+            started = []
+            answer = ""
+            for kind, value in split_function_calls(chunks):
+                if kind == "text":
+                    answer += value
+                    yield json.dumps({"type": "text", "content": value}) + "\n"
+                    continue
+                func_name, params = parse_function_call(value)
+                if execution_id is None:
+                    execution_id = str(uuid.uuid4())
+                    agent.create(execution_id, func_name)
+                calls.append((func_name, params))
+                started.append(asyncio.run_coroutine_threadsafe(agent.execute(func_name, params), loop))
+                yield json.dumps({
+                    "type": "function_call",
+                    "functionName": func_name,
+                    "executionId": execution_id
+                }) + "\n"
+            conversation_log.append("Assistant", answer.strip())
+            if calls:
+                asyncio.run_coroutine_threadsafe(agent.run(execution_id, user_message, calls, started), loop)
+                handed_off = True
+            yield json.dumps({"type": "done"}) + "\n"
+        except Exception as e:
+            if execution_id and not handed_off:
+                agent.fail(execution_id, f"The response stream failed after tool calls were started: {e}")
+                handed_off = True
+            yield json.dumps({"type": "error", "error": str(e)}) + "\n"
+        finally:
+            # The client went away mid-stream, so no agent run will finish this execution
+            if execution_id and not handed_off:
+                agent.fail(execution_id, "The response stream was closed before the tool calls finished")
     
-    Your job is to help the user manage their emails through conversation while using available email tools.
-
-    Available email tools:
-    {tools_description}
-
-    When you need to use a tool, format your response exactly as follows:
+    return Response(events(), mimetype='application/x-ndjson', headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
 
-    1. First explain your reasoning and what you're going to do
-    2. Then put the function call on a separate line starting with FUNCTION_CALL:
-    FUNCTION_CALL: function_name|parameter1_value|parameter2_value|...
-    3. Wait for function results before proceeding with your response
+def start_function_calls(user_message, calls):
+    """Start the agent loop for a request on the session loop and return its execution ID"""
+    execution_id = str(uuid.uuid4())
+    agent.create(execution_id, ", ".join(func_name for func_name, _ in calls))
+    asyncio.run_coroutine_threadsafe(agent.run(execution_id, user_message, calls), loop)
+    return execution_id
 
-    For example, when sending an email:
-    I'll send an email to your colleague now.
-    FUNCTION_CALL: send-email|example@gmail.com|Meeting Tomorrow|Hi there,\n\nI wanted to confirm our meeting tomorrow at 2pm.\n\nBest regards,\nYou
+@app.route('/api/function_result/<execution_id>')
+def get_function_result(execution_id):
+    """Get the result of a function execution"""
+    result = function_results.get(execution_id)
+    if result is None:
+        return jsonify(result_payload(None)), 404
+    
+    return jsonify(result_payload(result))
 
-    Important guidelines:
+@app.route('/api/function_result/<execution_id>/stream')
+def stream_function_result(execution_id):
+    """Push every status change of a function execution as Server-Sent Events"""
+    def events():
+        version = -1
+        while True:
+            result = function_results.wait_for_change(execution_id, version, timeout=15)
+            if result is None:
+                yield f"data: {json.dumps(result_payload(None))}\n\n"
+                return
+            if result["version"] == version:
+                # Nothing new yet; a comment line keeps the connection open
+                yield ": keep-alive\n\n"
+                continue
+            version = result["version"]
+            payload = result_payload(result)
+            yield f"data: {json.dumps(payload)}\n\n"
+            if payload["status"] in ("completed", "error"):
+                return
 
-    1. REASONING PROCESS:
-    - Always explain your thought process before taking any action
-    - Consider what the user is asking for and choose the appropriate tool
-    - Verify information before sending emails or trashing content
+    return Response(events(), mimetype='text/event-stream', headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
 
-    2. EMAIL HANDLING:
-    - ALWAYS get explicit confirmation before sending any email or trashing messages
-    - Draft emails when asked but don't send without confirmation
-    - When showing email content, format it clearly with sender, subject, and body
-    - When reading emails, mark them as read automatically
+def email_data_response(func_name, arguments, cache_control, shape=lambda data: data):
+    """JSON response for a direct tool call, with an ETag so unchanged data comes back as 304"""
+    initialized.wait(timeout=30)
+    status, body, headers = asyncio.run_coroutine_threadsafe(
+        email_data(pool, func_name, arguments, cache_control, request.headers.get("If-None-Match", ""), shape), loop
+    ).result()
+    return Response(body, status=status, headers=headers, mimetype="application/json")
 
-    3. VERIFICATION STEPS:
-    - Check that email addresses are properly formatted before sending
-    - For email drafting, ask if the user wants to make any changes before sending
-    - After actions are completed, summarize what was done
+@app.route('/api/history')
+def get_history():
+    """Latest turns of the conversation log, oldest first, to restore the page after a reload"""
+    limit = min(max(request.args.get('limit', 100, type=int), 1), 500)
+    _, turns = conversation_log.load_tail(max_turns=limit)
+    return jsonify({"turns": turns})
 
-    4. FUNCTION CALL FORMAT:
-    - ALWAYS use the exact format: FUNCTION_CALL: function_name|param1_value|param2_value|...
-    - DO NOT include parameter names in the function call, only their values
-    - For email parameters, use the actual email values directly
+@app.route('/api/emails')
+def list_emails():
+    """One page of the inbox; pass nextCursor back as cursor for the next page"""
+    limit = min(max(request.args.get('limit', 25, type=int), 1), 100)
+    arguments = {"query": request.args.get('q', 'in:inbox'), "max_results": limit}
+    if request.args.get('cursor'):
+        arguments["page_token"] = request.args['cursor']
 
-    5. CONVERSATION STYLE:
-    - Be concise but friendly
-    - Format email content for readability
-    - Ask clarifying questions when needed
+    return email_data_response("list-emails", arguments, "private, max-age=30", shape=lambda page: {
+        "emails": page["emails"],
+        "nextCursor": page["next_page_token"]
+    })
 
-    Remember: You must get explicit confirmation before sending emails or deleting content.
-    """
+@app.route('/api/emails/<email_id>')
+def get_email(email_id):
+    """Content of one email. Read state is unchanged; POST to .../read for that."""
+    return email_data_response("read-email", {"email_id": email_id, "mark_read": False}, "no-store")
 
-def execute_function_call(func_name, params, execution_id):
-    """Execute a function call and store the results"""
-    global session, tools, function_results
-    
-    # Initialize result entry
-    function_results[execution_id] = {
-        "status": "processing",
-        "function_name": func_name,
-        "error": None,
-        "raw_result": None,
-        "processed_result": None
-    }
-    
+@app.route('/api/emails/<email_id>/read', methods=['POST'])
+def mark_email_read(email_id):
+    """Mark one email as read, as opening it in the chat does"""
+    initialized.wait(timeout=30)
     try:
-        # Find the matching tool
-        tool = next((t for t in tools if t.name == func_name), None)
-        if not tool:
-            function_results[execution_id].update({
-                "status": "error",
-                "error": f"Unknown tool: {func_name}"
-            })
-            return
-        
-        # Prepare arguments
-        arguments = {}
-        schema_properties = tool.inputSchema.get('properties', {})
-        
-        # Extract parameter names from schema
-        param_names = list(schema_properties.keys())
-        
-        # Map parameters to the schema by position
-        for i, param_value in enumerate(params):
-            if i < len(param_names):
-                param_name = param_names[i]
-                param_info = schema_properties[param_name]
-                param_type = param_info.get('type', 'string')
-                
-                # Convert value to appropriate type
-                if param_type == 'integer':
-                    try:
-                        arguments[param_name] = int(param_value)
-                    except ValueError:
-                        arguments[param_name] = 0
-                elif param_type == 'number':
-                    try:
-                        arguments[param_name] = float(param_value)
-                    except ValueError:
-                        arguments[param_name] = 0.0
-                elif param_type == 'array':
-                    if isinstance(param_value, str):
-                        param_value = param_value.strip('[]').split(',')
-                    try:
-                        arguments[param_name] = [int(x.strip()) if x.strip().isdigit() else x.strip() for x in param_value]
-                    except:
-                        arguments[param_name] = []
-                else:
-                    arguments[param_name] = str(param_value)
-        
-        # Check if session is initialized
-        if not session:
-            function_results[execution_id].update({
-                "status": "error",
-                "error": "Session not initialized. Please wait for connection to establish."
-            })
-            return
-                
-        # Execute the function
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        # Add timeout to avoid hanging
-        async def call_with_timeout():
-            try:
-                async with asyncio.timeout(30):  # 30 second timeout
-                    return await session.call_tool(func_name, arguments=arguments)
-            except asyncio.TimeoutError:
-                return "Operation timed out"
-                
-        result = loop.run_until_complete(call_with_timeout())
-        loop.close()
-        
-        # Process the result
-        result_text = ""
-        if hasattr(result, 'content'):
-            if isinstance(result.content, list):
-                for item in result.content:
-                    if hasattr(item, 'text'):
-                        result_text += item.text + "\n"
-                    else:
-                        result_text += str(item) + "\n"
-            else:
-                result_text = str(result.content)
-        else:
-            result_text = str(result)
-        
-        # Update the raw result
-        function_results[execution_id].update({
-            "raw_result": result_text
-        })
-        
-        # Process the result with the AI to get a human-friendly response
-        processed_result = process_function_result(func_name, arguments, result_text)
-        
-        # Update the processed result
-        function_results[execution_id].update({
-            "status": "completed",
-            "processed_result": processed_result
-        })
-        
-    except Exception as e:
-        import traceback
-        error_details = traceback.format_exc()
-        function_results[execution_id].update({
-            "status": "error",
-            "error": f"Error executing {func_name}: {str(e)}\n\nDetails:\n{error_details}"
-        })
+        asyncio.run_coroutine_threadsafe(
+            fetch_tool_text(pool, "mark-email-as-read", {"email_id": email_id}), loop
+        ).result()
+    except (ValueError, TimeoutError, RuntimeError) as e:
+        status, body = tool_error(e)
+        return Response(body, status=status, mimetype="application/json")
+    return jsonify({"status": "read"})
 
-def process_function_result(func_name, arguments, result):
-    """Process function result with the LLM to get a human-friendly response"""
-    try:
-        prompt = f"""You are an email assistant. You just executed the function {func_name} 
-        with arguments {arguments} and got this result:
-        
-        {result}
-        
-        Please interpret this result in a user-friendly way. If this contains email data, 
-        format it nicely. If this is a confirmation of an action, summarize what happened.
-        If there's an error, explain it clearly and suggest what to do next.
-        """
-        
-        response = model.generate_content(prompt)
-        return response.text.strip()
-    except Exception as e:
-        return f"I processed the {func_name} request, but had trouble interpreting the results. You can see the raw output above."
+def stream_completion(prompt, on_chunk):
+    """Stream one agent turn from the assistant model. The prompt carries live
+    mailbox data, so these turns never go through the response cache."""
+    for chunk in assistant_model.get(tools).generate_content(prompt, stream=True):
+        on_chunk(chunk.text)
+
+# Multi-step tool loop run on the session loop for each request that calls a tool
+agent = AgentLoop(
+    function_results,
+    lambda func_name, params: call_tool(pool, tools, func_name, params),
+    lambda prompt, on_chunk: asyncio.to_thread(stream_completion, prompt, on_chunk),
+    max_steps=int(os.getenv("AGENT_MAX_STEPS", "6")),
+    time_budget=float(os.getenv("AGENT_TIME_BUDGET", "90")),
+    max_parallel=int(os.getenv("TOOL_CONCURRENCY", "4")),
+    log=conversation_log.append
+)
 
 if __name__ == "__main__":
     app.run(debug=True, port=5000)
\ No newline at end of file
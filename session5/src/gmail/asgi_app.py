@@ -0,0 +1,399 @@
+import os
+import asyncio
+import uuid
+import json
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+import google.generativeai as genai
+from starlette.applications import Starlette
+from starlette.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+from starlette.staticfiles import StaticFiles
+from agent import AgentLoop
+from conversation_log import ConversationLog
+from execution_store import open_execution_store, result_payload
+from llm_cache import ResponseCache
+from function_calls import FunctionCallSplitter, parse_function_call, parse_function_calls
+from prompting import SystemPromptModel, create_system_prompt
+from web_backend import BASE_DIR, call_tool, create_session_pool, email_data, fetch_tool_text, startup_error_message, tool_error
+
+# Load environment variables
+load_dotenv()
+
+# Initialize Gemini
+api_key = os.getenv("GEMINI_API_KEY")
+genai.configure(api_key=api_key)
+
+# Per-worker state: every worker process warms up its own MCP session pool
+pool = None
+tools = []
+initialization_status = {"status": "not_started", "error": None}
+initialized = asyncio.Event()
+
+# Store of execution results, shared by all workers. Set EXECUTION_STORE_PATH to
+# a SQLite file when running several workers (WEB_WORKERS), so an execution
+# started in one worker can be streamed from any other.
+function_results = open_execution_store()
+
+# With CONVERSATION_LOG_PATH set, every turn of the conversation (tool results
+# included) is appended to that file, so a reloaded page or a restarted server
+# can show where the conversation left off. Workers share the file. Unset, the
+# conversation is not written to disk.
+conversation_log = ConversationLog(os.getenv("CONVERSATION_LOG_PATH"))
+
+# Model carrying the system prompt, rebuilt only when the tool list changes
+assistant_model = SystemPromptModel("gemini-2.0-flash", create_system_prompt)
+
+# Cache of first-pass answers; result interpretations carry live data and skip it
+response_cache = ResponseCache(
+    max_size=int(os.getenv("LLM_CACHE_SIZE", "500")),
+    ttl=float(os.getenv("LLM_CACHE_TTL", "600")),
+    path=os.getenv("LLM_CACHE_PATH")
+)
+
+# Upper bound on in-flight Gemini requests; requests beyond the limit wait their
+# turn instead of piling up on the API. MCP tool calls are bounded by the agent.
+llm_slots = asyncio.Semaphore(int(os.getenv("LLM_CONCURRENCY", "8")))
+
+# Strong references to running tasks so they are not garbage collected
+background_tasks = set()
+
+# Replaced on every store change; SSE streams wait on the one they picked up
+result_changed = asyncio.Event()
+
+
+def notify_result_changed(execution_id):
+    global result_changed
+    result_changed.set()
+    result_changed = asyncio.Event()
+
+
+def start_task(coro):
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+
+async def setup_session():
+    """Start and warm up the pool of MCP server sessions"""
+    global pool, tools, initialization_status
+    initialization_status = {"status": "in_progress", "error": None}
+
+    try:
+        pool = create_session_pool()
+        tools = await pool.start()
+        initialization_status = {"status": "success", "error": None}
+    except Exception as e:
+        initialization_status = {"status": "failed", "error": startup_error_message(e)}
+    finally:
+        initialized.set()
+
+
+async def index(request):
+    return FileResponse(os.path.join(BASE_DIR, 'index.html'))
+
+
+async def api_initialize(request):
+    # The pool is started with the worker; report this worker's status
+    if initialization_status["status"] in ("not_started", "in_progress"):
+        return JSONResponse({"success": True, "message": "Initialization in progress", "toolCount": 0})
+    elif initialization_status["status"] == "success":
+        return JSONResponse({"success": True, "message": "Already initialized", "toolCount": len(tools)})
+    else:
+        return JSONResponse({"success": False, "error": initialization_status["error"]})
+
+
+async def wait_until_initialized(timeout=30):
+    """This worker may still be connecting; the tool list is needed for the prompt"""
+    try:
+        await asyncio.wait_for(initialized.wait(), timeout=timeout)
+    except asyncio.TimeoutError:
+        pass
+
+
+async def process_message(request):
+    data = await request.json()
+    user_message = data.get('message', '')
+    await wait_until_initialized()
+    conversation_log.append("You", user_message)
+
+    try:
+        model_for_tools = await assistant_model.get_async(tools)
+        async with llm_slots:
+            response_text = await response_cache.generate_async(model_for_tools, f"User: {user_message}", context=assistant_model.version)
+
+        # Check if response contains function calls; all of them run, concurrently
+        explanation, calls = parse_function_calls(response_text)
+        conversation_log.append("Assistant", explanation if calls else response_text.strip())
+        if calls:
+            execution_id = start_function_calls(user_message, calls)
+
+            return JSONResponse({
+                "type": "function_call",
+                "explanation": explanation,
+                "functionName": ", ".join(func_name for func_name, _ in calls),
+                "executionId": execution_id
+            })
+        else:
+            return JSONResponse({
+                "type": "message",
+                "content": response_text.strip()
+            })
+    except Exception as e:
+        return JSONResponse({
+            "type": "error",
+            "error": str(e)
+        })
+
+
+async def read_stream(user_message, pieces):
+    """Read the model's answer into the pieces queue, ending with None or the
+    exception raised. The LLM slot is held only while the model streams, not
+    while a slow client drains the queue."""
+    try:
+        model_for_tools = await assistant_model.get_async(tools)
+        async with llm_slots:
+            chunks = response_cache.stream_async(model_for_tools, f"User: {user_message}", context=assistant_model.version)
+            async for piece in split_stream(chunks):
+                pieces.put_nowait(piece)
+        pieces.put_nowait(None)
+    except Exception as e:
+        pieces.put_nowait(e)
+
+
+async def split_stream(chunks):
+    """Async counterpart of split_function_calls for streamed text chunks"""
+    splitter = FunctionCallSplitter()
+    async for chunk in chunks:
+        for piece in splitter.feed(chunk):
+            yield piece
+    for piece in splitter.close():
+        yield piece
+
+
+async def process_message_stream(request):
+    """Stream the model's answer as newline-delimited JSON events"""
+    data = await request.json()
+    user_message = data.get('message', '')
+    await wait_until_initialized()
+    conversation_log.append("You", user_message)
+
+    async def events():
+        execution_id = None
+        handed_off = False
+        pieces = asyncio.Queue()
+        reader = start_task(read_stream(user_message, pieces))
+        try:
+            calls = []
+            started = []
+            answer = ""
+            while (piece := await pieces.get()) is not None:
+                if isinstance(piece, Exception):
+                    raise piece
+                kind, value = piece
+                if kind == "text":
+                    answer += value
+                    yield json.dumps({"type": "text", "content": value}) + "\n"
+                    continue
+                # Each call starts right away; the agent collects the results
+                func_name, params = parse_function_call(value)
+                if execution_id is None:
+                    execution_id = str(uuid.uuid4())
+                    agent.create(execution_id, func_name)
+                calls.append((func_name, params))
+                started.append(start_task(agent.execute(func_name, params)))
+                yield json.dumps({
+                    "type": "function_call",
+                    "functionName": func_name,
+                    "executionId": execution_id
+                }) + "\n"
+            conversation_log.append("Assistant", answer.strip())
+            if calls:
+                start_task(agent.run(execution_id, user_message, calls, started))
+                handed_off = True
+            yield json.dumps({"type": "done"}) + "\n"
+        except Exception as e:
+            if execution_id and not handed_off:
+                agent.fail(execution_id, f"The response stream failed after tool calls were started: {e}")
+                handed_off = True
+            yield json.dumps({"type": "error", "error": str(e)}) + "\n"
+        finally:
+            reader.cancel()
+            # The client went away mid-stream, so no agent run will finish this execution
+            if execution_id and not handed_off:
+                agent.fail(execution_id, "The response stream was closed before the tool calls finished")
+
+    return StreamingResponse(events(), media_type='application/x-ndjson', headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+
+def start_function_calls(user_message, calls):
+    """Start the agent loop for a request as a task and return its execution ID"""
+    execution_id = str(uuid.uuid4())
+    agent.create(execution_id, ", ".join(func_name for func_name, _ in calls))
+    start_task(agent.run(execution_id, user_message, calls))
+    return execution_id
+
+
+async def get_function_result(request):
+    """Get the result of a function execution"""
+    result = function_results.get(request.path_params['execution_id'])
+    if result is None:
+        return JSONResponse(result_payload(None), status_code=404)
+
+    return JSONResponse(result_payload(result))
+
+
+async def stream_function_result(request):
+    """Push every status change of a function execution as Server-Sent Events"""
+    execution_id = request.path_params['execution_id']
+
+    async def events():
+        version = -1
+        # Changes made by other workers raise no local event, so a shared store is polled
+        wait = function_results.poll_interval or 15
+        idle = 0
+        while True:
+            changed = result_changed
+            result = function_results.get(execution_id)
+            if result is None:
+                yield f"data: {json.dumps(result_payload(None))}\n\n"
+                return
+            if result["version"] == version:
+                try:
+                    await asyncio.wait_for(changed.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    idle += wait
+                    if idle >= 15:
+                        # Nothing new yet; a comment line keeps the connection open
+                        idle = 0
+                        yield ": keep-alive\n\n"
+                continue
+            idle = 0
+            version = result["version"]
+            payload = result_payload(result)
+            yield f"data: {json.dumps(payload)}\n\n"
+            if payload["status"] in ("completed", "error"):
+                return
+
+    return StreamingResponse(events(), media_type='text/event-stream', headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+
+async def email_data_response(request, func_name, arguments, cache_control, shape=lambda data: data):
+    """JSON response for a direct tool call, with an ETag so unchanged data comes back as 304"""
+    await wait_until_initialized()
+    status, body, headers = await email_data(
+        pool, func_name, arguments, cache_control, request.headers.get("if-none-match", ""), shape
+    )
+    return Response(body, status_code=status, headers=headers, media_type="application/json")
+
+
+async def get_history(request):
+    """Latest turns of the conversation log, oldest first, to restore the page after a reload"""
+    try:
+        limit = min(max(int(request.query_params.get('limit', 100)), 1), 500)
+    except ValueError:
+        limit = 100
+    _, turns = await asyncio.to_thread(conversation_log.load_tail, limit)
+    return JSONResponse({"turns": turns})
+
+
+async def list_emails(request):
+    """One page of the inbox; pass nextCursor back as cursor for the next page"""
+    try:
+        limit = min(max(int(request.query_params.get('limit', 25)), 1), 100)
+    except ValueError:
+        limit = 25
+    arguments = {"query": request.query_params.get('q', 'in:inbox'), "max_results": limit}
+    if request.query_params.get('cursor'):
+        arguments["page_token"] = request.query_params['cursor']
+
+    return await email_data_response(request, "list-emails", arguments, "private, max-age=30", shape=lambda page: {
+        "emails": page["emails"],
+        "nextCursor": page["next_page_token"]
+    })
+
+
+async def get_email(request):
+    """Content of one email. Read state is unchanged; POST to .../read for that."""
+    arguments = {"email_id": request.path_params['email_id'], "mark_read": False}
+    return await email_data_response(request, "read-email", arguments, "no-store")
+
+
+async def mark_email_read(request):
+    """Mark one email as read, as opening it in the chat does"""
+    await wait_until_initialized()
+    try:
+        await fetch_tool_text(pool, "mark-email-as-read", {"email_id": request.path_params['email_id']})
+    except (ValueError, TimeoutError, RuntimeError) as e:
+        status, body = tool_error(e)
+        return Response(body, status_code=status, media_type="application/json")
+    return JSONResponse({"status": "read"})
+
+
+async def stream_completion(prompt, on_chunk):
+    """Stream one agent turn; live mailbox data in the prompt keeps it out of the response cache"""
+    model_for_tools = await assistant_model.get_async(tools)
+    async with llm_slots:
+        response = await model_for_tools.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            on_chunk(chunk.text)
+
+
+# Multi-step tool loop run as a task for each request that calls a tool
+agent = AgentLoop(
+    function_results,
+    lambda func_name, params: call_tool(pool, tools, func_name, params),
+    stream_completion,
+    max_steps=int(os.getenv("AGENT_MAX_STEPS", "6")),
+    time_budget=float(os.getenv("AGENT_TIME_BUDGET", "90")),
+    max_parallel=int(os.getenv("TOOL_CONCURRENCY", "4")),
+    log=conversation_log.append
+)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # The store may be updated from any thread; always wake waiters on this loop
+    loop = asyncio.get_running_loop()
+    function_results.add_listener(lambda execution_id: loop.call_soon_threadsafe(notify_result_changed, execution_id))
+    # Warm up this worker's MCP server pool before the first request needs it
+    start_task(setup_session())
+    yield
+    for task in list(background_tasks):
+        task.cancel()
+    if pool:
+        await pool.close()
+
+
+app = Starlette(
+    routes=[
+        Route('/', index),
+        Route('/api/initialize', api_initialize, methods=['POST']),
+        Route('/api/process', process_message, methods=['POST']),
+        Route('/api/process/stream', process_message_stream, methods=['POST']),
+        Route('/api/function_result/{execution_id}', get_function_result),
+        Route('/api/function_result/{execution_id}/stream', stream_function_result),
+        Route('/api/history', get_history),
+        Route('/api/emails', list_emails),
+        Route('/api/emails/{email_id}', get_email),
+        Route('/api/emails/{email_id}/read', mark_email_read, methods=['POST']),
+        Mount('/static', StaticFiles(directory=os.path.join(BASE_DIR, 'static')), name='static'),
+    ],
+    lifespan=lifespan,
+)
+
+if __name__ == "__main__":
+    import uvicorn
+    # Each worker runs its own MCP session pool; with more than one, results
+    # must live in the shared SQLite store (EXECUTION_STORE_PATH)
+    workers = int(os.getenv("WEB_WORKERS", "1"))
+    if workers > 1 and not os.getenv("EXECUTION_STORE_PATH"):
+        raise SystemExit("WEB_WORKERS > 1 needs EXECUTION_STORE_PATH for results shared between workers")
+    uvicorn.run("asgi_app:app" if workers > 1 else app, host="127.0.0.1", port=5000, workers=workers)
@@ -0,0 +1,173 @@
+import re
+from email.message import Message
+from html.parser import HTMLParser
+
+# Rough characters-per-token ratio for English text with Gemini/GPT tokenizers
+CHARS_PER_TOKEN = 4
+
+DEFAULT_MAX_TOKENS = 1000
+
+BLOCK_TAGS = {
+    'p', 'div', 'br', 'tr', 'ul', 'ol', 'table', 'section', 'article',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'blockquote', 'pre', 'hr', 'header', 'footer',
+}
+SKIP_TAGS = {'script', 'style', 'head', 'title', 'noscript', 'template'}
+
+# Lines that introduce quoted history in replies
+QUOTE_HEADERS = [
+    re.compile(r'^On .{0,200}wrote:\s*$'),
+    re.compile(r'^-{2,}\s*Original Message\s*-{2,}', re.IGNORECASE),
+    re.compile(r'^_{10,}\s*$'),
+]
+# A forwarded message is what the user wants to read, so it is kept
+FORWARD_HEADER = re.compile(r'^-{2,}\s*Forwarded message\s*-{2,}', re.IGNORECASE)
+# "From:" only starts quoted history as the first line of a header block (Outlook style)
+FROM_HEADER = re.compile(r'^\*?From:\*? .+$')
+BLOCK_HEADER = re.compile(r'^\*?(Sent|Date|To|Cc|Subject):\*? ', re.IGNORECASE)
+SIGNATURE_MARKERS = [
+    re.compile(r'^--\s*$'),
+    re.compile(r'^Sent from my \w+', re.IGNORECASE),
+    re.compile(r'^Get Outlook for ', re.IGNORECASE),
+]
+
+HORIZONTAL_SPACE = re.compile(r'[ \t\r\f\v\xa0\u200b]+')
+BLANK_LINES = re.compile(r'\n{3,}')
+
+
+class _HTMLTextExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: list[str] = []
+        self.skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self.skip_depth += 1
+        elif tag == 'li':
+            self.parts.append('\n- ')
+        elif tag in ('td', 'th'):
+            self.parts.append(' ')
+        elif tag in BLOCK_TAGS:
+            self.parts.append('\n')
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in ('br', 'hr'):
+            self.parts.append('\n')
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self.skip_depth = max(self.skip_depth - 1, 0)
+        elif tag in BLOCK_TAGS:
+            self.parts.append('\n')
+
+    def handle_data(self, data):
+        if not self.skip_depth:
+            self.parts.append(data)
+
+
+def html_to_text(html: str) -> str:
+    """Convert HTML to plain text, keeping paragraph and list structure"""
+    parser = _HTMLTextExtractor()
+    parser.feed(html)
+    parser.close()
+    return ''.join(parser.parts)
+
+
+def collapse_whitespace(text: str) -> str:
+    lines = [HORIZONTAL_SPACE.sub(' ', line).strip() for line in text.split('\n')]
+    return BLANK_LINES.sub('\n\n', '\n'.join(lines)).strip()
+
+
+def starts_header_block(lines: list[str], i: int) -> bool:
+    """True if lines[i] is a From: line followed by Sent:/Date:/To: style headers"""
+    if not FROM_HEADER.match(lines[i].strip()):
+        return False
+    following = [line.strip() for line in lines[i + 1:i + 4] if line.strip()]
+    return bool(following) and BLOCK_HEADER.match(following[0]) is not None
+
+
+def strip_quoted_reply(text: str) -> str:
+    """Drop quoted history: '>' lines and everything after a reply header.
+    Forwarded messages, including their header block, are kept."""
+    lines = text.split('\n')
+    kept = []
+    in_forward = False
+    for i, line in enumerate(lines):
+        stripped = line.strip()
+        if FORWARD_HEADER.match(stripped):
+            in_forward = True
+        elif starts_header_block(lines, i):
+            if in_forward:
+                # The forwarded message's own headers
+                in_forward = False
+            elif kept:
+                break
+        elif any(pattern.match(stripped) for pattern in QUOTE_HEADERS) and kept:
+            break
+        if stripped.startswith('>'):
+            continue
+        kept.append(line)
+    return '\n'.join(kept)
+
+
+def strip_signature(text: str) -> str:
+    """Drop everything from the first signature delimiter on"""
+    lines = text.split('\n')
+    for i, line in enumerate(lines):
+        if i and any(pattern.match(line.strip()) for pattern in SIGNATURE_MARKERS):
+            return '\n'.join(lines[:i])
+    return text
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to roughly max_tokens, preferring a paragraph or sentence boundary"""
+    if not max_tokens or estimate_tokens(text) <= max_tokens:
+        return text
+
+    budget = max_tokens * CHARS_PER_TOKEN
+    cut = text.rfind('\n\n', 0, budget)
+    if cut < budget // 2:
+        cut = text.rfind('. ', 0, budget) + 1
+    if cut < budget // 2:
+        cut = budget
+    omitted = estimate_tokens(text[cut:])
+    return f"{text[:cut].rstrip()}\n[... {omitted} more tokens truncated]"
+
+
+def clean_text(text: str, max_tokens: int | None = DEFAULT_MAX_TOKENS) -> str:
+    """Reduce a message body to what a model needs to read"""
+    text = text.replace('\r\n', '\n')
+    text = strip_quoted_reply(text)
+    text = strip_signature(text)
+    text = collapse_whitespace(text)
+    return truncate_to_tokens(text, max_tokens)
+
+
+def _decode_part(part: Message) -> str:
+    payload = part.get_payload(decode=True) or b''
+    return payload.decode(part.get_content_charset() or 'utf-8', errors='replace')
+
+
+def extract_body(mime_message: Message, max_tokens: int | None = DEFAULT_MAX_TOKENS) -> str:
+    """Pick the best text part of a message (plain text, else HTML) and clean it"""
+    plain = html = None
+    for part in mime_message.walk():
+        if part.is_multipart() or part.get_content_disposition() == 'attachment':
+            continue
+        content_type = part.get_content_type()
+        if content_type == 'text/plain' and plain is None:
+            plain = _decode_part(part)
+        elif content_type == 'text/html' and html is None:
+            html = _decode_part(part)
+
+    if plain and plain.strip():
+        text = plain
+    elif html:
+        text = html_to_text(html)
+    else:
+        text = ''
+    return clean_text(text, max_tokens)
@@ -0,0 +1,164 @@
+import json
+import logging
+import sqlite3
+import threading
+from typing import Any, Callable, Iterator
+
+logger = logging.getLogger(__name__)
+
+# Headers requested for metadata-only fetches
+METADATA_HEADERS = ['From', 'To', 'Cc', 'Subject', 'Date']
+
+
+def message_from_api(msg: dict, body: str | None = None) -> dict[str, Any]:
+    """Flatten a Gmail API message resource into a cache entry"""
+    headers = {}
+    for header in msg.get('payload', {}).get('headers', []):
+        headers[header['name'].lower()] = header['value']
+
+    return {
+        'id': msg['id'],
+        'threadId': msg.get('threadId', ''),
+        'labelIds': list(msg.get('labelIds', [])),
+        'internalDate': int(msg.get('internalDate', 0)),
+        'snippet': msg.get('snippet', ''),
+        'from': headers.get('from', ''),
+        'to': headers.get('to', ''),
+        'cc': headers.get('cc', ''),
+        'subject': headers.get('subject', ''),
+        'date': headers.get('date', ''),
+        'body': body,
+    }
+
+
+class MessageCache:
+    """Local store of message metadata keyed by Gmail message ID.
+
+    Entries are kept in memory and, when a path is given, mirrored to a
+    SQLite file so they survive restarts. Processes sharing the file call
+    reload() to pick up what the others stored since. Listeners registered with
+    add_listener are called for every stored entry, which lets derived
+    indexes (contacts, duplicates, ...) be updated incrementally.
+    """
+
+    def __init__(self, path: str | None = None):
+        self.path = path
+        self._messages: dict[str, dict] = {}
+        self._listeners: list[Callable[[dict], None]] = []
+        self._lock = threading.RLock()
+        self._db = None
+        # Highest SQLite rowid loaded; every write gets a higher one
+        self._last_rowid = 0
+
+        if path:
+            # Several server processes may share the file: WAL lets them read
+            # while one writes, and the timeout makes writers wait their turn
+            self._db = sqlite3.connect(path, check_same_thread=False, timeout=10)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS messages (id TEXT PRIMARY KEY, data TEXT NOT NULL)'
+            )
+            self.reload()
+            logger.info(f"Loaded {len(self._messages)} cached messages from {path}")
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def __contains__(self, msg_id: str) -> bool:
+        return msg_id in self._messages
+
+    def get(self, msg_id: str) -> dict | None:
+        return self._messages.get(msg_id)
+
+    def messages(self) -> Iterator[dict]:
+        """Iterate over a snapshot of all cached entries"""
+        with self._lock:
+            snapshot = list(self._messages.values())
+        return iter(snapshot)
+
+    def add_listener(self, listener: Callable[[dict], None], replay: bool = True):
+        """Register a callback for stored entries, optionally replaying existing ones"""
+        with self._lock:
+            self._listeners.append(listener)
+            if replay:
+                for entry in self._messages.values():
+                    listener(entry)
+
+    def reload(self) -> int:
+        """Load entries written to the SQLite file since the last load, including
+        by other processes, and pass them to the listeners. Returns how many."""
+        if not self._db:
+            return 0
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT rowid, id, data FROM messages WHERE rowid > ? ORDER BY rowid', (self._last_rowid,)
+            ).fetchall()
+            entries = []
+            for rowid, msg_id, data in rows:
+                self._last_rowid = rowid
+                entry = json.loads(data)
+                self._messages[msg_id] = entry
+                entries.append(entry)
+            self._notify(entries)
+        return len(entries)
+
+    def put(self, entry: dict):
+        self.put_many([entry])
+
+    def put_many(self, entries: list[dict]):
+        """Store entries, keeping any body already cached for the same message"""
+        if not entries:
+            return
+        with self._lock:
+            for entry in entries:
+                existing = self._messages.get(entry['id'])
+                if existing and entry.get('body') is None:
+                    entry['body'] = existing.get('body')
+                self._messages[entry['id']] = entry
+            if self._db:
+                self._db.executemany(
+                    'INSERT OR REPLACE INTO messages (id, data) VALUES (?, ?)',
+                    [(entry['id'], json.dumps(entry)) for entry in entries]
+                )
+                self._db.commit()
+            self._notify(entries)
+
+    def _notify(self, entries: list[dict]):
+        for entry in entries:
+            for listener in self._listeners:
+                try:
+                    listener(entry)
+                except Exception as error:
+                    logger.error(f"Cache listener failed for {entry['id']}: {error}")
+
+    def set_labels(self, labels: dict[str, list[str]]):
+        """Replace the label IDs of cached entries, e.g. with freshly fetched ones"""
+        with self._lock:
+            entries = []
+            for msg_id, label_ids in labels.items():
+                entry = self._messages.get(msg_id)
+                if entry and entry['labelIds'] != label_ids:
+                    entry['labelIds'] = list(label_ids)
+                    entries.append(entry)
+            if self._db and entries:
+                self._db.executemany(
+                    'INSERT OR REPLACE INTO messages (id, data) VALUES (?, ?)',
+                    [(entry['id'], json.dumps(entry)) for entry in entries]
+                )
+                self._db.commit()
+
+    def update_labels(self, msg_id: str, add: list[str] = (), remove: list[str] = ()):
+        """Apply a label change to a cached entry without refetching it"""
+        with self._lock:
+            entry = self._messages.get(msg_id)
+            if not entry:
+                return
+            labels = [label for label in entry['labelIds'] if label not in remove]
+            labels.extend(label for label in add if label not in labels)
+            entry['labelIds'] = labels
+            if self._db:
+                self._db.execute(
+                    'INSERT OR REPLACE INTO messages (id, data) VALUES (?, ?)',
+                    (msg_id, json.dumps(entry))
+                )
+                self._db.commit()
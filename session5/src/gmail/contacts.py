@@ -0,0 +1,158 @@
+import bisect
+import re
+import threading
+import time
+from email.header import decode_header
+from email.utils import getaddresses, parsedate_to_datetime
+
+# Words that commonly appear in natural-language lookups but never in names
+STOP_WORDS = {'from', 'at', 'in', 'the', 'of', 'and', 'to', 'my', 'team', 'with'}
+
+TOKEN_SPLIT = re.compile(r"[^\w]+|_")
+
+
+def decode_header_value(value: str) -> str:
+    """Decode an RFC 2047 encoded display name"""
+    decoded = ''
+    for part, encoding in decode_header(value):
+        if isinstance(part, bytes):
+            decoded += part.decode(encoding or 'utf-8', errors='replace')
+        else:
+            decoded += part
+    return decoded
+
+
+def _tokens(text: str) -> set[str]:
+    return {token for token in TOKEN_SPLIT.split(text.lower()) if token}
+
+
+class Contact:
+    __slots__ = ('address', 'name', 'count', 'weight', 'last_seen')
+
+    def __init__(self, address: str):
+        self.address = address
+        self.name = ''
+        self.count = 0
+        self.weight = 0.0
+        self.last_seen = 0.0
+
+
+class ContactIndex:
+    """Prefix index of names and addresses seen in message headers.
+
+    Every contact is indexed under the words of its display name and the
+    parts of its address (local part, domain labels and the full address).
+    Tokens live in a sorted list so a prefix lookup is two bisections.
+    Contacts are ranked by an exponentially decayed occurrence count, so
+    both frequent and recent correspondents come first.
+    """
+
+    def __init__(self, ignore: list[str] = (), half_life_days: float = 30.0):
+        self.ignore = {address.lower() for address in ignore}
+        self.half_life = half_life_days * 86400
+        self._contacts: dict[str, Contact] = {}
+        self._tokens: list[str] = []
+        self._postings: dict[str, set[str]] = {}
+        self._seen: set[str] = set()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._contacts)
+
+    def add_message(self, entry: dict):
+        """Record the From, To and Cc addresses of a cached message"""
+        if entry['id'] in self._seen:
+            return
+        self._seen.add(entry['id'])
+
+        timestamp = entry.get('internalDate', 0) / 1000
+        if not timestamp and entry.get('date'):
+            try:
+                timestamp = parsedate_to_datetime(entry['date']).timestamp()
+            except (TypeError, ValueError):
+                timestamp = 0
+        timestamp = timestamp or time.time()
+
+        headers = [entry.get(field) or '' for field in ('from', 'to', 'cc')]
+        for name, address in getaddresses(headers):
+            if address:
+                self.add(address, decode_header_value(name), timestamp)
+
+    def add(self, address: str, name: str = '', timestamp: float | None = None):
+        """Record one occurrence of an address"""
+        address = address.strip().lower()
+        if not address or '@' not in address or address in self.ignore:
+            return
+        timestamp = timestamp or time.time()
+
+        with self._lock:
+            contact = self._contacts.get(address)
+            if contact is None:
+                contact = self._contacts[address] = Contact(address)
+                local, _, domain = address.partition('@')
+                self._index(address, {address, local, domain} | _tokens(local) | _tokens(domain))
+
+            if name and timestamp >= contact.last_seen:
+                if name.lower() != contact.name.lower():
+                    self._index(address, _tokens(name))
+                contact.name = name
+
+            # Fold the new occurrence into the decayed weight
+            if timestamp >= contact.last_seen:
+                contact.weight = contact.weight * self._decay(timestamp - contact.last_seen) + 1
+                contact.last_seen = timestamp
+            else:
+                contact.weight += self._decay(contact.last_seen - timestamp)
+            contact.count += 1
+
+    def lookup(self, query: str, limit: int = 5) -> list[dict]:
+        """Resolve a free-text query such as "Priya from finance" to ranked contacts"""
+        terms = [term for term in _tokens(query) if term not in STOP_WORDS] or list(_tokens(query))
+        if not terms:
+            return []
+
+        now = time.time()
+        with self._lock:
+            matches: dict[str, int] = {}
+            for term in terms:
+                start = bisect.bisect_left(self._tokens, term)
+                end = bisect.bisect_left(self._tokens, term + '\uffff', lo=start)
+                addresses = set()
+                for token in self._tokens[start:end]:
+                    addresses |= self._postings[token]
+                for address in addresses:
+                    matches[address] = matches.get(address, 0) + 1
+            if not matches:
+                return []
+
+            # Prefer contacts matching the most terms, then the highest decayed weight
+            best = max(matches.values())
+            ranked = []
+            for address, matched in matches.items():
+                if matched < best:
+                    continue
+                contact = self._contacts[address]
+                score = contact.weight * self._decay(now - contact.last_seen)
+                ranked.append((score, contact))
+            ranked.sort(key=lambda item: item[0], reverse=True)
+
+            return [
+                {
+                    'name': contact.name,
+                    'address': contact.address,
+                    'count': contact.count,
+                    'score': round(score, 4),
+                }
+                for score, contact in ranked[:limit]
+            ]
+
+    def _index(self, address: str, tokens: set[str]):
+        for token in tokens:
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = set()
+                bisect.insort(self._tokens, token)
+            postings.add(address)
+
+    def _decay(self, age: float) -> float:
+        return 0.5 ** (max(age, 0) / self.half_life)
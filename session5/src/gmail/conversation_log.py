@@ -0,0 +1,120 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+
+# Bytes read per step when scanning the log backwards
+BLOCK_SIZE = 64 * 1024
+
+
+def read_lines_backwards(path: str):
+    """Yield the lines of a file from last to first, reading it in blocks from the end"""
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        partial = b''
+        while position > 0:
+            size = min(BLOCK_SIZE, position)
+            position -= size
+            f.seek(position)
+            lines = (f.read(size) + partial).split(b'\n')
+            # The first piece may continue in the previous block
+            partial = lines.pop(0)
+            for line in reversed(lines):
+                if line.strip():
+                    yield line
+        if partial.strip():
+            yield partial
+
+
+class ConversationLog:
+    """Append-only JSONL log of conversation turns, with periodic snapshots.
+
+    Each line is a turn ({"type": "turn", "sender", "message", "time"}) or a
+    snapshot ({"type": "snapshot", "state", "time"}) of whatever snapshot()
+    returns, e.g. the prompt memory. A snapshot is taken every snapshot_every
+    turns. append() only queues the record; a writer thread writes each one
+    with a single O_APPEND write, so callers never wait on the disk and
+    several processes can share one file.
+
+    load_tail() reads the file backwards and stops at the latest snapshot or
+    after max_turns turns, so resuming costs the same however long the
+    history is. With no path the log does nothing.
+    """
+
+    def __init__(self, path: str | None, snapshot_every: int = 50, snapshot=None):
+        self.path = path
+        self.snapshot_every = snapshot_every
+        self.snapshot = snapshot
+        self._count = 0
+        self._queue = None
+        self._writer = None
+        self._writer_pid = None
+        self._lock = threading.Lock()
+
+    def append(self, sender: str, message: str):
+        if not self.path or not message:
+            return
+        self._ensure_writer()
+        self._queue.put({"type": "turn", "sender": sender, "message": message, "time": time.time()})
+        self._count += 1
+        if self.snapshot and self._count % self.snapshot_every == 0:
+            # Taken now, after the turn, so a resume replays only what follows it
+            self._queue.put({"type": "snapshot", "state": self.snapshot(), "time": time.time()})
+
+    def load_tail(self, max_turns: int = 200) -> tuple[dict | None, list[dict]]:
+        """Latest snapshot state (or None) and the turns after it, oldest first"""
+        turns = []
+        if not self.path or not os.path.exists(self.path):
+            return None, turns
+
+        for line in read_lines_backwards(self.path):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Torn last line from a crash mid-write
+                continue
+            if record.get("type") == "snapshot":
+                return record["state"], turns[::-1]
+            if record.get("type") == "turn":
+                turns.append({"sender": record["sender"], "message": record["message"]})
+                if len(turns) >= max_turns:
+                    break
+        return None, turns[::-1]
+
+    def close(self):
+        """Write out everything queued so far"""
+        if self._writer_pid == os.getpid() and self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join(timeout=5)
+
+    def _ensure_writer(self):
+        # Started on first use in each process, since a thread does not survive a fork
+        with self._lock:
+            if self._writer_pid != os.getpid():
+                self._queue = queue.Queue()
+                self._writer = threading.Thread(target=self._write_records, args=(self._queue,), daemon=True, name="conversation-log")
+                self._writer.start()
+                self._writer_pid = os.getpid()
+                atexit.register(self.close)
+
+    def _write_records(self, records):
+        # O_BINARY keeps Windows from translating newlines
+        fd = os.open(self.path, os.O_RDWR | os.O_APPEND | os.O_CREAT | getattr(os, 'O_BINARY', 0), 0o600)
+        try:
+            # Terminate a line torn by a crash, so the next record starts on its own line
+            size = os.lseek(fd, 0, os.SEEK_END)
+            if size:
+                # os.pread is not available on Windows
+                os.lseek(fd, size - 1, os.SEEK_SET)
+                if os.read(fd, 1) != b'\n':
+                    os.write(fd, b'\n')
+            while True:
+                record = records.get()
+                if record is None:
+                    return
+                os.write(fd, (json.dumps(record) + "\n").encode())
+        finally:
+            os.close(fd)
@@ -0,0 +1,132 @@
+import re
+import threading
+import zlib
+
+import numpy as np
+
+URL = re.compile(r'https?://\S+')
+DIGITS = re.compile(r'\d+')
+WORD = re.compile(r'\w+')
+
+MERSENNE_PRIME = (1 << 61) - 1
+
+
+def normalize(text: str) -> list[str]:
+    """Lowercase words with URLs dropped and numbers folded, so alert storms
+    that differ only in counters, timestamps or links look identical"""
+    text = URL.sub(' ', text.lower())
+    text = DIGITS.sub('0', text)
+    return WORD.findall(text)
+
+
+def shingles(words: list[str], size: int = 3) -> np.ndarray:
+    if len(words) < size:
+        grams = [' '.join(words)] if words else []
+    else:
+        grams = [' '.join(words[i:i + size]) for i in range(len(words) - size + 1)]
+    return np.unique(np.array([zlib.crc32(gram.encode()) for gram in grams], dtype=np.uint64))
+
+
+class DuplicateIndex:
+    """MinHash/LSH index of normalized message bodies.
+
+    Each message gets a MinHash signature of its word 3-gram shingles. The
+    signature is split into bands; messages sharing a band bucket are
+    candidates, and candidates whose estimated Jaccard similarity reaches
+    the threshold are merged with union-find. Clusters therefore grow
+    incrementally as messages are cached.
+
+    A message is indexed once, when it is first cached. Most entries come
+    from metadata fetches, which cache no body, so their signature is built
+    from the subject and Gmail's snippet (about the first 200 characters).
+    That is enough for alert storms and newsletters, but messages that only
+    differ further down the body can end up in the same cluster.
+    """
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, threshold: float = 0.7, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, 1 << 31, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 31, size=num_perm, dtype=np.uint64)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.signatures: dict[str, np.ndarray] = {}
+        self.entries: dict[str, dict] = {}
+        self._buckets: dict[tuple[int, bytes], str] = {}
+        self._parent: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def signature(self, text: str) -> np.ndarray | None:
+        hashes = shingles(normalize(text))
+        if not len(hashes):
+            return None
+        permuted = (self.a[:, None] * hashes[None, :] + self.b[:, None]) % MERSENNE_PRIME
+        return permuted.min(axis=1)
+
+    def add_message(self, entry: dict):
+        """Index a cached message by subject and body (or snippet when no body is cached)"""
+        if entry['id'] in self.signatures:
+            return
+        text = f"{entry.get('subject', '')}\n{entry.get('body') or entry.get('snippet') or ''}"
+        sig = self.signature(text)
+        if sig is None:
+            return
+
+        msg_id = entry['id']
+        with self._lock:
+            self.signatures[msg_id] = sig
+            self.entries[msg_id] = {
+                'id': msg_id,
+                'from': entry.get('from', ''),
+                'subject': entry.get('subject', ''),
+                'date': entry.get('date', ''),
+            }
+            self._parent[msg_id] = msg_id
+            for band in range(self.bands):
+                key = (band, sig[band * self.rows:(band + 1) * self.rows].tobytes())
+                first = self._buckets.setdefault(key, msg_id)
+                if first != msg_id and self._find(first) != self._find(msg_id):
+                    if np.mean(self.signatures[first] == sig) >= self.threshold:
+                        self._parent[self._find(msg_id)] = self._find(first)
+
+    def remove(self, msg_ids: list[str]):
+        """Forget messages that were trashed or archived away"""
+        with self._lock:
+            for msg_id in msg_ids:
+                self.entries.pop(msg_id, None)
+
+    def clusters(self, min_size: int = 2) -> list[dict]:
+        """Groups of near-duplicate messages, largest first"""
+        with self._lock:
+            groups: dict[str, list[str]] = {}
+            for msg_id in self.entries:
+                groups.setdefault(self._find(msg_id), []).append(msg_id)
+
+        result = []
+        for root, members in groups.items():
+            if len(members) >= min_size:
+                result.append({'cluster_id': root, 'size': len(members), 'message_ids': members})
+        result.sort(key=lambda cluster: cluster['size'], reverse=True)
+        return result
+
+    def members(self, cluster_id: str) -> list[str]:
+        """Current members of the cluster containing cluster_id"""
+        with self._lock:
+            if cluster_id not in self._parent:
+                return []
+            root = self._find(cluster_id)
+            return [msg_id for msg_id in self.entries if self._find(msg_id) == root]
+
+    def samples(self, cluster: dict, count: int = 3) -> list[dict]:
+        return [self.entries[msg_id] for msg_id in cluster['message_ids'][:count]]
+
+    def _find(self, msg_id: str) -> str:
+        parent = self._parent[msg_id]
+        while parent != self._parent[parent]:
+            # Path halving keeps lookups close to constant time
+            self._parent[parent] = self._parent[self._parent[parent]]
+            parent = self._parent[parent]
+        self._parent[msg_id] = parent
+        return parent
@@ -0,0 +1,76 @@
+import copy
+import re
+
+EDIT_OPERATIONS = [
+    'replace_subject',
+    'replace_paragraph',
+    'insert_paragraph',
+    'delete_paragraph',
+    'append',
+    'set_recipient',
+]
+
+PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+
+
+class Draft:
+    """Editable email draft whose body is addressed by paragraph index"""
+
+    def __init__(self, recipient: str, subject: str, body: str):
+        self.recipient = recipient
+        self.subject = subject
+        self.paragraphs = [p.strip('\n') for p in PARAGRAPH_BREAK.split(body.strip()) if p.strip()]
+
+    @property
+    def body(self) -> str:
+        return '\n\n'.join(self.paragraphs)
+
+    def copy(self) -> 'Draft':
+        return copy.deepcopy(self)
+
+    def apply(self, operation: str, text: str = '', index: int | None = None) -> str:
+        """Apply one edit operation in place and return a short description of the change"""
+        if operation not in EDIT_OPERATIONS:
+            raise ValueError(f"Unknown edit operation: {operation}. Expected one of {', '.join(EDIT_OPERATIONS)}")
+        if operation == 'replace_subject':
+            self.subject = text
+            return f"Subject set to '{text}'"
+        if operation == 'set_recipient':
+            self.recipient = text
+            return f"Recipient set to {text}"
+        if operation == 'append':
+            self.paragraphs.append(text)
+            return f"Appended paragraph {len(self.paragraphs) - 1}"
+
+        if index is None:
+            raise ValueError(f"Operation {operation} requires a paragraph index")
+        if operation == 'insert_paragraph':
+            if not 0 <= index <= len(self.paragraphs):
+                raise ValueError(f"Paragraph index {index} out of range (0-{len(self.paragraphs)})")
+            self.paragraphs.insert(index, text)
+            return f"Inserted paragraph {index}"
+
+        if not 0 <= index < len(self.paragraphs):
+            raise ValueError(f"Paragraph index {index} out of range (0-{len(self.paragraphs) - 1})")
+        if operation == 'replace_paragraph':
+            self.paragraphs[index] = text
+            return f"Replaced paragraph {index}"
+        # Only delete_paragraph is left
+        del self.paragraphs[index]
+        return f"Deleted paragraph {index}"
+
+    def outline(self, width: int = 60) -> str:
+        """One line per paragraph, enough for the model to address edits"""
+        lines = [f"To: {self.recipient}", f"Subject: {self.subject}"]
+        for i, paragraph in enumerate(self.paragraphs):
+            first_line = paragraph.replace('\n', ' ')
+            if len(first_line) > width:
+                first_line = first_line[:width] + '...'
+            lines.append(f"[{i}] {first_line}")
+        return '\n'.join(lines)
+
+    def render(self) -> str:
+        lines = [f"To: {self.recipient}", f"Subject: {self.subject}", ""]
+        for i, paragraph in enumerate(self.paragraphs):
+            lines.append(f"[{i}] {paragraph}")
+        return '\n'.join(lines)
@@ -1,11 +1,21 @@
 import os
+import json
 import asyncio
+import concurrent.futures
+import queue
 import tkinter as tk
 from tkinter import ttk, scrolledtext
 import threading
+from email.utils import parsedate_to_datetime
 from dotenv import load_dotenv
 from mcp import ClientSession, StdioServerParameters
 import google.generativeai as genai
+from function_calls import build_arguments, parse_function_calls, result_to_text, run_function_calls
+from conversation_log import ConversationLog
+from llm_cache import ResponseCache
+from memory import RESULT_PREFIX, ConversationMemory
+from prompting import SystemPromptModel, create_result_prompt, create_summary_prompt
+from renderers import render_result
 
 # Load environment variables
 load_dotenv()
@@ -18,13 +28,63 @@ model = genai.GenerativeModel("gemini-2.0-flash")
 venv_python_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '.venv', 'Scripts', 'python.exe'))  
 
 print('venv:', venv_python_path)  
-history = []
+
+
+async def summarize_history(summary, turns):
+    """Fold older turns into the conversation summary"""
+    response = await asyncio.to_thread(lambda: model.generate_content(create_summary_prompt(summary, turns)))
+    return response.text
+
+# Conversation context for prompts: recent turns verbatim, older ones summarized,
+# so the prompt stays bounded however long the session runs
+memory = ConversationMemory(
+    recent_tokens=int(os.getenv("MEMORY_RECENT_TOKENS", "1500")),
+    summary_tokens=int(os.getenv("MEMORY_SUMMARY_TOKENS", "500")),
+    summarize=summarize_history
+)
+
+# Every turn is appended to this file, with a snapshot of the memory every 50
+# turns, so a restart resumes where the conversation left off. Set
+# CONVERSATION_LOG_PATH to an empty string to keep nothing on disk.
+conversation_log = ConversationLog(
+    os.getenv("CONVERSATION_LOG_PATH", "conversation_log.jsonl"),
+    snapshot_every=50,
+    snapshot=memory.state
+)
+
+# Repeated requests with the same conversation so far are answered from here
+response_cache = ResponseCache(
+    max_size=int(os.getenv("LLM_CACHE_SIZE", "500")),
+    ttl=float(os.getenv("LLM_CACHE_TTL", "600")),
+    path=os.getenv("LLM_CACHE_PATH")
+)
+
+# Oldest lines are dropped from the conversation view beyond this; the prompt
+# context is kept separately in memory
+MAX_CONVERSATION_LINES = int(os.getenv("MAX_CONVERSATION_LINES", "2000"))
+
+# How often queued widget updates are applied, in milliseconds
+UI_UPDATE_INTERVAL = 50
+
+# Inbox rows fetched per page; the next page loads when the list is scrolled near its end
+INBOX_PAGE_SIZE = 50
+
+# Seconds to wait on closing for the MCP session and server process to shut down
+SHUTDOWN_TIMEOUT = 5
+
+
+def short_date(date):
+    """Date header as YYYY-MM-DD HH:MM, or unchanged if it does not parse"""
+    try:
+        return parsedate_to_datetime(date).strftime("%Y-%m-%d %H:%M")
+    except (TypeError, ValueError):
+        return date
 
 class EmailAssistantApp:
     def __init__(self, root):
         self.root = root
         self.root.title("Email Assistant")
-        self.root.geometry("800x600")
+        self.root.geometry("1100x650")
         self.root.configure(bg="#f0f4f8")
         
         # Create a style
@@ -43,10 +103,44 @@ class EmailAssistantApp:
         
         ttk.Label(header_frame, text="Email Assistant", font=("Arial", 18, "bold")).pack(side=tk.LEFT)
         
+        # Inbox on the left, conversation on the right
+        panes = ttk.PanedWindow(main_frame, orient=tk.HORIZONTAL)
+        panes.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        
+        # Inbox list, browsed without the LLM: rows come from metadata-only
+        # list-emails pages and a message is read only when opened
+        inbox_frame = ttk.Frame(panes)
+        inbox_header = ttk.Frame(inbox_frame)
+        inbox_header.pack(fill=tk.X)
+        ttk.Label(inbox_header, text="Inbox", font=("Arial", 12, "bold")).pack(side=tk.LEFT)
+        ttk.Button(inbox_header, text="Refresh", command=lambda: self.load_inbox(reset=True)).pack(side=tk.RIGHT)
+        
+        self.inbox_tree = ttk.Treeview(inbox_frame, columns=("from", "subject", "date"), show="headings", selectmode="browse")
+        self.inbox_tree.heading("from", text="From")
+        self.inbox_tree.heading("subject", text="Subject")
+        self.inbox_tree.heading("date", text="Date")
+        self.inbox_tree.column("from", width=120)
+        self.inbox_tree.column("subject", width=180)
+        self.inbox_tree.column("date", width=110, stretch=False)
+        self.inbox_tree.tag_configure("unread", font=("Arial", 10, "bold"))
+        inbox_scrollbar = ttk.Scrollbar(inbox_frame, orient=tk.VERTICAL, command=self.inbox_tree.yview)
+        self.inbox_tree.configure(yscrollcommand=lambda first, last: self.on_inbox_scroll(inbox_scrollbar, first, last))
+        inbox_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.inbox_tree.pack(fill=tk.BOTH, expand=True)
+        self.inbox_tree.bind("<Double-1>", self.open_selected_email)
+        self.inbox_tree.bind("<Return>", self.open_selected_email)
+        panes.add(inbox_frame, weight=2)
+        
+        # Cursor of the next inbox page (None at the end) and whether one is being fetched
+        self.inbox_cursor = None
+        self.inbox_loading = False
+        
         # Conversation area
-        self.conversation_area = scrolledtext.ScrolledText(main_frame, wrap=tk.WORD, font=("Arial", 11))
-        self.conversation_area.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        conversation_frame = ttk.Frame(panes)
+        self.conversation_area = scrolledtext.ScrolledText(conversation_frame, wrap=tk.WORD, font=("Arial", 11))
+        self.conversation_area.pack(fill=tk.BOTH, expand=True, padx=(5, 0))
         self.conversation_area.configure(state='disabled')
+        panes.add(conversation_frame, weight=3)
         
         # Input area
         input_frame = ttk.Frame(main_frame)
@@ -65,19 +159,44 @@ class EmailAssistantApp:
         status_bar = ttk.Label(main_frame, textvariable=self.status_var, relief=tk.SUNKEN, anchor=tk.W)
         status_bar.pack(fill=tk.X, padx=5, pady=5)
         
-        # Add some initial text
-        self.append_to_conversation("Email Assistant", "Hello! I'm your email assistant. I can help you manage your emails.\n\nYou can ask me to:\n- Read your unread emails\n- Draft emails for you\n- Send emails\n- Trash emails\n- Open emails in your browser\n\nWhat would you like to do today?")
+        # Widgets may only be touched from the Tk thread: other threads queue
+        # their updates here and drain_ui_queue applies them in batches
+        self.ui_queue = queue.Queue()
+        self.root.after(UI_UPDATE_INTERVAL, self.drain_ui_queue)
+        
+        # Pick up the previous conversation, or start with a greeting
+        if not self.resume_conversation():
+            self.append_to_conversation("Email Assistant", "Hello! I'm your email assistant. I can help you manage your emails.\n\nYou can ask me to:\n- Read your unread emails\n- Draft emails for you\n- Send emails\n- Trash emails\n- Open emails in your browser\n\nWhat would you like to do today?")
         
-        # Initialize server connection in a separate thread
         self.session = None
         self.tools = []
-        threading.Thread(target=self.initialize_server, daemon=True).start()
+        # System prompt is built once per tool-list version and sent as system_instruction
+        self.assistant_model = SystemPromptModel("gemini-2.0-flash", self.create_system_prompt)
+        
+        # One background event loop owns the MCP session and runs every LLM and tool call
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True, name="assistant-loop").start()
+        self.stopped = asyncio.Event()
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
+        self.initialize_server()
+    
+    def submit(self, coro):
+        """Run a coroutine on the background loop"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+    
+    def close(self):
+        # Ending the session lets the server process shut down cleanly; wait
+        # for that, but not forever, before the window and the process go away
+        self.loop.call_soon_threadsafe(self.stopped.set)
+        concurrent.futures.wait([self.session_future], timeout=SHUTDOWN_TIMEOUT)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.root.destroy()
     
     def initialize_server(self):
-        """Initialize connection to the MCP server in a separate thread"""
-        self.status_var.set("Connecting to email server...")
-        self.append_to_conversation("System", "Initializing connection to email server...")
-        asyncio.run(self.setup_session())
+        """Start the connection to the MCP server on the background loop"""
+        self.set_status("Connecting to email server...")
+        self.append_to_conversation("System", "Initializing connection to email server...", record=False)
+        self.session_future = self.submit(self.setup_session())
         
     async def setup_session(self):
         """Set up the MCP client session"""
@@ -90,7 +209,7 @@ class EmailAssistantApp:
             # async with asyncio.timeout(12):  # 30-second timeout for connection
             from mcp.client.stdio import stdio_client
             async with stdio_client(server_params) as (read, write):
-                self.status_var.set("Connected to server, initializing session...")
+                self.set_status("Connected to server, initializing session...")
                 async with ClientSession(read, write) as session:
                     self.session = session
                     await session.initialize()
@@ -99,23 +218,81 @@ class EmailAssistantApp:
                     tools_result = await session.list_tools()
                     self.tools = tools_result.tools
                     
-                    self.status_var.set(f"Ready - Connected with {len(self.tools)} available tools")
+                    self.set_status(f"Ready - Connected with {len(self.tools)} available tools")
+                    self.run_on_ui(self.load_inbox, True)
                     
-                    # Keep the session alive
-                    while True:
-                        await asyncio.sleep(1)
+                    # Keep the session alive until the window is closed
+                    await self.stopped.wait()
         except Exception as e:
-            self.status_var.set(f"Error: {str(e)}")
-            self.append_to_conversation("System", f"Failed to connect to email server: {str(e)}")
+            self.set_status(f"Error: {str(e)}")
+            self.append_to_conversation("System", f"Failed to connect to email server: {str(e)}", record=False)
     
-    def append_to_conversation(self, sender, message):
-        history.append({'sender': sender, 'message': message})
-        """Add a message to the conversation area"""
-        self.conversation_area.configure(state='normal')
-        self.conversation_area.insert(tk.END, f"\n{sender}: ", "sender")
-        self.conversation_area.insert(tk.END, f"{message}\n", "message")
-        self.conversation_area.configure(state='disabled')
-        self.conversation_area.see(tk.END)
+    def append_to_conversation(self, sender, message, record=True):
+        """Add a message to the conversation; safe to call from any thread.
+        Unless record is False it also goes into the prompt memory and the log."""
+        if record:
+            memory.add(sender, message)
+            conversation_log.append(sender, message)
+        self.ui_queue.put(("message", sender, message))
+    
+    def resume_conversation(self):
+        """Rebuild the memory from the tail of the log and show its recent turns.
+        Returns False when there is nothing to resume."""
+        snapshot, turns = conversation_log.load_tail()
+        if snapshot is None and not turns:
+            return False
+        if snapshot is not None:
+            memory.restore(snapshot)
+        for turn in turns:
+            memory.add(turn['sender'], turn['message'])
+        
+        for turn in list(memory.turns):
+            self.append_to_conversation(turn['sender'], turn['message'], record=False)
+        self.append_to_conversation("System", "Resumed the previous conversation.", record=False)
+        return True
+    
+    def set_status(self, status):
+        """Update the status bar; safe to call from any thread"""
+        self.ui_queue.put(("status", status))
+    
+    def run_on_ui(self, func, *args):
+        """Call func(*args) on the Tk thread with the next batch of updates"""
+        self.ui_queue.put(("call", func, args))
+    
+    def drain_ui_queue(self):
+        """Apply all queued widget updates at once, then trim the conversation view"""
+        messages = []
+        status = None
+        calls = []
+        while True:
+            try:
+                update = self.ui_queue.get_nowait()
+            except queue.Empty:
+                break
+            if update[0] == "message":
+                messages.append(update[1:])
+            elif update[0] == "status":
+                status = update[1]
+            else:
+                calls.append(update[1:])
+        
+        if messages:
+            self.conversation_area.configure(state='normal')
+            for sender, message in messages:
+                self.conversation_area.insert(tk.END, f"\n{sender}: ", "sender")
+                self.conversation_area.insert(tk.END, f"{message}\n", "message")
+            # A capped widget keeps inserts and redraws fast in long sessions
+            excess = int(self.conversation_area.index('end-1c').split('.')[0]) - MAX_CONVERSATION_LINES
+            if excess > 0:
+                self.conversation_area.delete("1.0", f"{excess + 1}.0")
+            self.conversation_area.configure(state='disabled')
+            self.conversation_area.see(tk.END)
+        if status is not None:
+            self.status_var.set(status)
+        for func, args in calls:
+            func(*args)
+        
+        self.root.after(UI_UPDATE_INTERVAL, self.drain_ui_queue)
         
     def send_message(self, event=None):
         """Process user message and get AI response"""
@@ -126,61 +303,23 @@ class EmailAssistantApp:
         self.append_to_conversation("You", user_message)
         self.user_input.delete("1.0", tk.END)
         
-        # Start processing in a separate thread to keep UI responsive
-        threading.Thread(target=self.process_message, args=(user_message,), daemon=True).start()
+        # Processing runs on the background loop to keep the UI responsive
+        self.submit(self.process_message(user_message))
     
-    def process_message(self, user_message):
+    async def process_message(self, user_message):
         """Process the user message and generate a response using the LLM"""
-        self.status_var.set("Processing...")
-        
-        # Create prompt for the LLM
-        tools_description = self.get_tools_description()
-        system_prompt = self.create_system_prompt(tools_description)
-
-        print(system_prompt)
+        self.set_status("Processing...")
         
         try:
             # Get AI response
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            response = loop.run_until_complete(self.generate_response(system_prompt, user_message))
-            loop.close()
+            response = await self.generate_reply(user_message)
             
             # Parse and handle the response
-            self.handle_ai_response(response)
+            await self.handle_ai_response(response)
         except Exception as e:
-            self.status_var.set("Ready")
+            self.set_status("Ready")
             self.append_to_conversation("System", f"Error processing request: {str(e)}")
     
-    def get_tools_description(self):
-        """Create a description string for available tools"""
-        if not self.tools:
-            return "No tools available. Server connection might be down."
-        
-        tools_description = []
-        for i, tool in enumerate(self.tools):
-            try:
-                params = tool.inputSchema
-                desc = getattr(tool, 'description', 'No description available')
-                name = getattr(tool, 'name', f'tool_{i}')
-                
-                if 'properties' in params:
-                    param_details = []
-                    for param_name, param_info in params['properties'].items():
-                        param_type = param_info.get('type', 'unknown')
-                        param_desc = param_info.get('description', '')
-                        param_details.append(f"{param_name} ({param_type}): {param_desc}")
-                    params_str = '\n    - ' + '\n    - '.join(param_details) if param_details else 'no parameters'
-                else:
-                    params_str = 'no parameters'
-
-                tool_desc = f"{name}: {desc}\n  Parameters: {params_str}"
-                tools_description.append(tool_desc)
-            except Exception:
-                tools_description.append(f"Error processing tool {i}")
-        
-        return "\n\n".join(tools_description)
-    
     def create_system_prompt(self, tools_description):
         """Create the system prompt for the LLM"""
         return f"""You are an intelligent email assistant with access to the user's Gmail account.
@@ -196,7 +335,9 @@ class EmailAssistantApp:
         2. Identify your reasoning type (verification, composition, analysis, synthesis, or decision-making)
         3. Then put the function call on a separate line starting with FUNCTION_CALL:
         FUNCTION_CALL: function_name|parameter1_value|parameter2_value|...
-        4. Wait for function results before proceeding with your response
+        4. If the request needs several independent calls (for example reading three emails),
+        put each FUNCTION_CALL on its own line; they run in parallel
+        5. Wait for function results before proceeding with your response
 
         For example, when sending an email:
         I'll send an email to your colleague now.
@@ -238,10 +379,19 @@ class EmailAssistantApp:
         - Ask clarifying questions when needed
         
         Remember: You must get explicit confirmation before sending emails or deleting content.    
-
-        conversation history: {history}
         """
-        # Remember: You must get explicit confirmation before sending emails or deleting content.    
+
+    async def generate_reply(self, user_message):
+        """Generate the assistant's reply; the system prompt travels as the model's system_instruction"""
+        model_with_prompt = await self.assistant_model.get_async(self.tools)
+        await memory.compact()
+        prompt = f"{memory.render()}\n\nUser: {user_message}"
+        # Once tool output is in the history the answer depends on live mailbox state
+        live = memory.has_tool_results
+        return await asyncio.to_thread(
+            lambda: response_cache.generate(model_with_prompt, prompt, context=self.assistant_model.version, live=live)
+        )
+
     async def generate_response(self, system_prompt, user_message):
         """Generate AI response from the prompt and user message"""
         prompt = f"{system_prompt}\n\nUser: {user_message}"
@@ -250,168 +400,179 @@ class EmailAssistantApp:
         )
         return response.text
     
-    def handle_ai_response(self, response_text):
+    async def handle_ai_response(self, response_text):
         """Handle the AI response and execute any function calls"""
-        # Split the response into parts
-        parts = response_text.split("FUNCTION_CALL:")
+        explanation, calls = parse_function_calls(response_text)
         
-        if len(parts) == 1:
+        if not calls:
             # No function call, just display the response
             self.append_to_conversation("Assistant", response_text.strip())
-            self.status_var.set("Ready")
+            self.set_status("Ready")
             return
         
         # Display the explanation part
-        explanation = parts[0].strip()
         if explanation:
             self.append_to_conversation("Assistant", explanation)
         
-        # Process function call
-        function_info = parts[1].strip()
-        # Handle potential newlines or other text after function call
-        function_info = function_info.split('\n')[0].strip()
+        # Execute every function call
+        await self.execute_function_calls(calls)
+    
+    async def call_tool(self, func_name, params):
+        """Run one tool call; returns the arguments used and the result text"""
+        # Find the matching tool
+        tool = next((t for t in self.tools if t.name == func_name), None)
+        if not tool:
+            raise ValueError(f"Unknown tool: {func_name}")
+        
+        arguments = build_arguments(tool, params)
+        
+        # For debugging - show what we're actually sending
+        self.append_to_conversation("System", f"Calling {func_name} with arguments: {arguments}", record=False)
+        
+        # Check if session is initialized
+        if not self.session:
+            raise ValueError("Session not initialized. Please wait for connection to establish.")
         
+        # Add timeout to avoid hanging
         try:
-            # Parse the function call format
-            function_parts = [p.strip() for p in function_info.split("|")]
-            func_name = function_parts[0]
-            params = function_parts[1:] if len(function_parts) > 1 else []
-            
-            # Execute the function call in a separate thread
-            threading.Thread(target=self.execute_function_call, 
-                            args=(func_name, params), 
-                            daemon=True).start()
+            async with asyncio.timeout(30):  # 30 second timeout
+                result = await self.session.call_tool(func_name, arguments=arguments)
+        except asyncio.TimeoutError:
+            result = "Operation timed out"
+        return arguments, result_to_text(result)
+    
+    async def fetch_tool_data(self, func_name, arguments):
+        """Call a tool directly, without the LLM, and parse its result back into data"""
+        if not self.session:
+            raise ValueError("Session not initialized. Please wait for connection to establish.")
+        
+        async with asyncio.timeout(30):
+            result = await self.session.call_tool(func_name, arguments=arguments)
+        result_text = result_to_text(result)
+        if getattr(result, "isError", False) or result_text.startswith("An HttpError occurred"):
+            raise RuntimeError(result_text)
+        try:
+            return json.loads(result_text)
+        except ValueError:
+            raise RuntimeError(result_text)
+    
+    def load_inbox(self, reset=False):
+        """Fetch the next inbox page (or the first one, on reset) in the background"""
+        if self.inbox_loading or not (reset or self.inbox_cursor):
+            return
+        self.inbox_loading = True
+        self.submit(self.fetch_inbox_page(None if reset else self.inbox_cursor, reset))
+    
+    async def fetch_inbox_page(self, cursor, reset):
+        arguments = {"query": "in:inbox", "max_results": INBOX_PAGE_SIZE}
+        if cursor:
+            arguments["page_token"] = cursor
+        try:
+            page = await self.fetch_tool_data("list-emails", arguments)
         except Exception as e:
-            self.append_to_conversation("System", f"Error parsing function call: {str(e)}")
-            self.status_var.set("Ready")
+            self.set_status(f"Could not load inbox: {str(e)}")
+            page = None
+        self.run_on_ui(self.show_inbox_page, page, reset)
+    
+    def show_inbox_page(self, page, reset):
+        self.inbox_loading = False
+        if page is None:
+            return
+        if reset:
+            self.inbox_tree.delete(*self.inbox_tree.get_children())
+        # Set first: inserting rows scrolls the list, which may ask for the next page
+        self.inbox_cursor = page["next_page_token"]
+        for email in page["emails"]:
+            if self.inbox_tree.exists(email["id"]):
+                continue
+            self.inbox_tree.insert(
+                "", tk.END, iid=email["id"],
+                values=(email["from"], email["subject"] or "(no subject)", short_date(email["date"])),
+                tags=("unread",) if email["unread"] else ()
+            )
     
-    def execute_function_call(self, func_name, params):
-        """Execute a function call and display the results"""
-        self.status_var.set(f"Executing {func_name}...")
-        self.append_to_conversation("System", f"Executing: {func_name}")
+    def mark_inbox_row_read(self, email_id):
+        if self.inbox_tree.exists(email_id):
+            self.inbox_tree.item(email_id, tags=())
+    
+    def on_inbox_scroll(self, scrollbar, first, last):
+        scrollbar.set(first, last)
+        # Load the next page before the user reaches the end of what is loaded
+        if float(last) > 0.9:
+            self.load_inbox()
+    
+    def open_selected_email(self, event=None):
+        """Show the selected inbox message in the conversation"""
+        selection = self.inbox_tree.selection()
+        if selection:
+            self.set_status("Opening email...")
+            self.submit(self.open_email(selection[0]))
+    
+    async def open_email(self, email_id):
+        try:
+            email = await self.fetch_tool_data("read-email", {"email_id": email_id})
+        except Exception as e:
+            self.append_to_conversation("System", f"Error opening email {email_id}: {str(e)}")
+            self.set_status("Ready")
+            return
+        # Reading the email marked it as read
+        self.run_on_ui(self.mark_inbox_row_read, email_id)
+        # Recorded as a tool result, so later answers about it are not served from the response cache
+        self.append_to_conversation(
+            "System",
+            f"{RESULT_PREFIX}read-email ({email_id}):\nFrom: {email['from']}\nTo: {email['to']}\nDate: {email['date']}\nSubject: {email['subject']}\n\n{email['content']}"
+        )
+        self.set_status("Ready")
+    
+    async def execute_function_calls(self, calls):
+        """Execute independent function calls concurrently and display the results in order"""
+        names = ", ".join(func_name for func_name, _ in calls)
+        self.set_status(f"Executing {names}...")
+        self.append_to_conversation("System", f"Executing: {names}", record=False)
         
         try:
-            # Find the matching tool
-            tool = next((t for t in self.tools if t.name == func_name), None)
-            if not tool:
-                self.append_to_conversation("System", f"Unknown tool: {func_name}")
-                self.status_var.set("Ready")
-                return
-            
-            # Prepare arguments
-            arguments = {}
-            schema_properties = tool.inputSchema.get('properties', {})
-            
-            # For debugging
-            self.append_to_conversation("System", f"Function parameters: {params}")
-            self.append_to_conversation("System", f"Expected schema: {schema_properties}")
-            
-            # Extract parameter names from schema
-            param_names = list(schema_properties.keys())
-            
-            # Map parameters to the schema by position
-            for i, param_value in enumerate(params):
-                if i < len(param_names):
-                    param_name = param_names[i]
-                    param_info = schema_properties[param_name]
-                    param_type = param_info.get('type', 'string')
-                    
-                    # Convert value to appropriate type
-                    if param_type == 'integer':
-                        try:
-                            arguments[param_name] = int(param_value)
-                        except ValueError:
-                            arguments[param_name] = 0
-                    elif param_type == 'number':
-                        try:
-                            arguments[param_name] = float(param_value)
-                        except ValueError:
-                            arguments[param_name] = 0.0
-                    elif param_type == 'array':
-                        if isinstance(param_value, str):
-                            param_value = param_value.strip('[]').split(',')
-                        try:
-                            arguments[param_name] = [int(x.strip()) if x.strip().isdigit() else x.strip() for x in param_value]
-                        except:
-                            arguments[param_name] = []
-                    else:
-                        arguments[param_name] = str(param_value)
-            
-            # For debugging - show what we're actually sending
-            self.append_to_conversation("System", f"Calling tool with arguments: {arguments}")
-            
-            # Check if session is initialized
-            if not self.session:
-                self.append_to_conversation("System", "Error: Session not initialized. Please wait for connection to establish.")
-                self.status_var.set("Ready")
-                return
-                
-            # Execute the function
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
-            # Add timeout to avoid hanging
-            async def call_with_timeout():
-                try:
-                    async with asyncio.timeout(30):  # 30 second timeout
-                        return await self.session.call_tool(func_name, arguments=arguments)
-                except asyncio.TimeoutError:
-                    return "Operation timed out"
-                    
-            result = loop.run_until_complete(call_with_timeout())
-            loop.close()
-            
-            # Process and display the results
-            result_text = ""
-            if hasattr(result, 'content'):
-                if isinstance(result.content, list):
-                    for item in result.content:
-                        if hasattr(item, 'text'):
-                            result_text += item.text + "\n"
-                        else:
-                            result_text += str(item) + "\n"
-                else:
-                    result_text = str(result.content)
-            else:
-                result_text = str(result)
-            
-            self.append_to_conversation("System", f"Result from {func_name}:\n{result_text}")
-            
-            # Process the result with the AI to get a human-friendly response
-            threading.Thread(target=self.process_result, 
-                            args=(func_name, arguments, result_text, history), 
-                            daemon=True).start()
+            steps = await run_function_calls(calls, self.call_tool, limit=4)
             
+            for step in steps:
+                self.append_to_conversation("System", f"{RESULT_PREFIX}{step['functionName']}:\n{step['result']}")
         except Exception as e:
             import traceback
             error_details = traceback.format_exc()
-            self.append_to_conversation("System", f"Error executing {func_name}: {str(e)}\n\nDetails:\n{error_details}")
-            self.status_var.set("Ready")
+            self.append_to_conversation("System", f"Error executing {names}: {str(e)}\n\nDetails:\n{error_details}")
+            self.set_status("Ready")
+            return
+        
+        # Process the results with the AI to get a human-friendly response
+        await self.process_results(steps)
+
+    async def process_results(self, steps):
+        """Show locally rendered results, or have the LLM interpret them when it must"""
+        rendered = [render_result(step['functionName'], step['arguments'], step['result']) for step in steps]
+        if None not in rendered:
+            # Known tools are formatted locally, without a second LLM round trip
+            self.append_to_conversation("Assistant", "\n".join(rendered))
+            self.set_status("Ready")
+            return
+        if len(steps) == 1:
+            await self.process_result(steps[0]['functionName'], steps[0]['arguments'], steps[0]['result'])
+            return
+        await self.process_result(
+            ", ".join(step['functionName'] for step in steps),
+            [step['arguments'] for step in steps],
+            "\n\n".join(f"{step['functionName']}:\n{step['result']}" for step in steps)
+        )
 
-    def process_result(self, func_name, arguments, result, history):
+    async def process_result(self, func_name, arguments, result):
         """Process function result with the LLM to get a human-friendly response"""
         try:
-            prompt = f"""You are an email assistant. You just executed the function {func_name} 
-            with arguments {arguments} and got this result:
-            
-            {result}
-            
-            Please interpret this result in a user-friendly way. If this contains email data, 
-            format it nicely. If this is a confirmation of an action, summarize what happened.
-            If there's an error, explain it clearly and suggest what to do next.
-
-            """
-            # Here is past conversion history: {history}            
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            response = loop.run_until_complete(self.generate_response(prompt, ""))
-            loop.close()
+            prompt = create_result_prompt(func_name, arguments, result)
+            response = await self.generate_response(prompt, "")
             
             self.append_to_conversation("Assistant", response.strip())
-        except Exception as e:
+        except Exception:
             self.append_to_conversation("Assistant", f"I processed the {func_name} request, but had trouble interpreting the results. You can see the raw output above.")
         finally:
-            self.status_var.set("Ready")
+            self.set_status("Ready")
 
 
 if __name__ == "__main__":
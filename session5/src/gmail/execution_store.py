@@ -0,0 +1,252 @@
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class ExecutionStore:
+    """Bounded in-memory store of function execution results.
+
+    Entries live in an LRU-ordered dict capped at max_size and expire ttl
+    seconds after their last update, so memory stays flat however long the
+    app runs. Every change bumps the entry's version and notifies waiters,
+    which lets streaming endpoints block until something new happens.
+
+    This store lives in one process. Apps served by several worker processes
+    plug in SQLiteExecutionStore instead, which has the same interface.
+    """
+
+    # Seconds between checks for changes made by other processes; None when
+    # every change happens in this process and waiters are notified directly
+    poll_interval = None
+
+    def __init__(self, max_size: int = 1000, ttl: float = 3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[str, dict] = OrderedDict()
+        self._changed = threading.Condition()
+        self._listeners = []
+
+    def __contains__(self, execution_id: str) -> bool:
+        return self.get(execution_id) is not None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add_listener(self, listener):
+        """Call listener(execution_id) after every change made in this process, e.g. to wake asyncio waiters"""
+        self._listeners.append(listener)
+
+    def create(self, execution_id: str, entry: dict):
+        with self._changed:
+            self._evict()
+            self._store(execution_id, dict(entry, version=0))
+            self._changed.notify_all()
+        self._notify(execution_id)
+
+    def update(self, execution_id: str, changes: dict):
+        """Apply changes to an entry and wake up anything waiting on it"""
+        with self._changed:
+            entry = self._load(execution_id)
+            if entry is None:
+                return
+            entry.update(changes)
+            entry['version'] += 1
+            self._store(execution_id, entry)
+            self._changed.notify_all()
+        self._notify(execution_id)
+
+    def get(self, execution_id: str) -> dict | None:
+        """Snapshot of an entry, or None if it is unknown or expired"""
+        with self._changed:
+            entry = self._load(execution_id)
+            return dict(entry) if entry else None
+
+    def wait_for_change(self, execution_id: str, version: int, timeout: float) -> dict | None:
+        """Block until the entry's version is newer than version or timeout expires.
+        Returns None at once for an unknown or expired entry."""
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while True:
+                entry = self._load(execution_id)
+                remaining = deadline - time.monotonic()
+                if entry is None:
+                    return None
+                if entry['version'] > version or remaining <= 0:
+                    return dict(entry)
+                # Other processes cannot notify us, so poll when they may write
+                self._changed.wait(min(remaining, self.poll_interval or remaining))
+
+    def _notify(self, execution_id: str):
+        for listener in self._listeners:
+            listener(execution_id)
+
+    def _store(self, execution_id: str, entry: dict):
+        entry['updated_at'] = time.time()
+        self._entries[execution_id] = entry
+        self._entries.move_to_end(execution_id)
+
+    def _load(self, execution_id: str) -> dict | None:
+        entry = self._entries.get(execution_id)
+        if entry is None:
+            return None
+        if time.time() - entry['updated_at'] > self.ttl:
+            self._entries.pop(execution_id, None)
+            return None
+        self._entries.move_to_end(execution_id)
+        return entry
+
+    def _evict(self):
+        """Drop expired entries, then the least recently used ones beyond max_size"""
+        cutoff = time.time() - self.ttl
+        while self._entries:
+            oldest = next(iter(self._entries.values()))
+            if oldest['updated_at'] >= cutoff and len(self._entries) < self.max_size:
+                break
+            self._entries.popitem(last=False)
+
+
+class SQLiteExecutionStore(ExecutionStore):
+    """Execution store kept in a SQLite file on local disk.
+
+    Every read goes to the database, so an execution created by one worker
+    process resolves in all the others, and results survive restarts. WAL
+    mode lets readers in other workers proceed while one of them writes.
+
+    Writes are handed to a writer thread with its own connection, so callers
+    on an event loop never wait on a commit. Until it is committed, an entry
+    is served from memory, so this process reads its own writes at once.
+    The writer also prunes expired entries and, beyond max_size, the least
+    recently updated ones.
+    """
+
+    poll_interval = 0.25
+
+    def __init__(self, path: str, max_size: int = 1000, ttl: float = 3600):
+        super().__init__(max_size=max_size, ttl=ttl)
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS executions '
+            '(id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS executions_updated_at ON executions (updated_at)')
+        self._db.commit()
+        self._pending: dict[str, dict] = {}
+        self._writes = queue.Queue()
+        self._writer = threading.Thread(target=self._write_entries, daemon=True, name="execution-store-writer")
+        self._writer.start()
+        atexit.register(self.close)
+
+    def __len__(self) -> int:
+        with self._changed:
+            return self._db.execute('SELECT COUNT(*) FROM executions').fetchone()[0]
+
+    def close(self):
+        """Commit everything written so far"""
+        if self._writer.is_alive():
+            self._writes.put(None)
+            self._writer.join(timeout=5)
+
+    def _store(self, execution_id: str, entry: dict):
+        entry['updated_at'] = time.time()
+        self._pending[execution_id] = dict(entry)
+        self._writes.put(execution_id)
+
+    def _load(self, execution_id: str) -> dict | None:
+        entry = self._pending.get(execution_id)
+        if entry is not None:
+            return dict(entry)
+        row = self._db.execute(
+            'SELECT data FROM executions WHERE id = ? AND updated_at >= ?',
+            (execution_id, time.time() - self.ttl)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _evict(self):
+        # Done by the writer thread after each commit
+        pass
+
+    def _write_entries(self):
+        db = sqlite3.connect(self.path, timeout=10)
+        try:
+            while True:
+                execution_id = self._writes.get()
+                # Commit everything queued meanwhile in one transaction
+                ids = {execution_id}
+                while not self._writes.empty():
+                    ids.add(self._writes.get())
+                done = None in ids
+                ids.discard(None)
+
+                with self._changed:
+                    entries = {i: self._pending[i] for i in ids if i in self._pending}
+                db.executemany(
+                    'INSERT OR REPLACE INTO executions (id, data, updated_at) VALUES (?, ?, ?)',
+                    [(i, json.dumps(entry), entry['updated_at']) for i, entry in entries.items()]
+                )
+                db.execute('DELETE FROM executions WHERE updated_at < ?', (time.time() - self.ttl,))
+                db.execute(
+                    'DELETE FROM executions WHERE id NOT IN '
+                    '(SELECT id FROM executions ORDER BY updated_at DESC LIMIT ?)',
+                    (self.max_size,)
+                )
+                db.commit()
+                with self._changed:
+                    for i, entry in entries.items():
+                        # A newer version may have been queued while this one was written
+                        if self._pending.get(i) is entry:
+                            del self._pending[i]
+                if done:
+                    return
+        finally:
+            db.close()
+
+
+def open_execution_store() -> ExecutionStore:
+    """Store configured by the environment: SQLite at EXECUTION_STORE_PATH when
+    set (required when running several worker processes), otherwise in memory"""
+    ttl = float(os.getenv("EXECUTION_STORE_TTL", "3600"))
+    path = os.getenv("EXECUTION_STORE_PATH")
+    max_size = int(os.getenv("EXECUTION_STORE_SIZE", "1000"))
+    if path:
+        return SQLiteExecutionStore(path, max_size=max_size, ttl=ttl)
+    return ExecutionStore(max_size=max_size, ttl=ttl)
+
+
+def result_payload(result):
+    """JSON body describing the current state of a function execution"""
+    if result is None:
+        # Unknown, expired or evicted: it will never change again
+        return {
+            "status": "error",
+            "functionName": "request",
+            "error": "Unknown or expired execution ID"
+        }
+    if result["status"] == "error":
+        return {
+            "status": "error",
+            "functionName": result["function_name"],
+            "error": result["error"]
+        }
+    elif result["status"] == "completed":
+        return {
+            "status": "completed",
+            "functionName": result["function_name"],
+            "rawResult": result["raw_result"],
+            "processedResult": result["processed_result"],
+            "steps": result.get("steps", [])
+        }
+    else:
+        return {
+            "status": "processing",
+            "functionName": result["function_name"],
+            "rawResult": result["raw_result"],
+            "processedResult": result["processed_result"],
+            "steps": result.get("steps", [])
+        }
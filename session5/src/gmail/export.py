@@ -0,0 +1,263 @@
+import asyncio
+import importlib.util
+import json
+import logging
+import os
+import time
+import uuid
+from base64 import urlsafe_b64decode
+from email import message_from_bytes
+
+try:
+    from .body import extract_body
+    from .contacts import decode_header_value
+except ImportError:
+    from body import extract_body
+    from contacts import decode_header_value
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ['mbox', 'jsonl', 'parquet']
+
+# Page of IDs listed at a time and messages fetched per batch request;
+# together they bound how much of the mailbox is held in memory
+PAGE_SIZE = 500
+CHUNK_SIZE = 50
+
+# Messages whose fetch failed (rate limits, server errors) are retried this
+# many times with exponential backoff before the job fails
+MAX_RETRIES = 4
+RETRY_DELAY = 2
+
+
+def parquet_available() -> bool:
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+def _record(msg: dict, raw: bytes) -> dict:
+    """Structured representation of a raw message for JSONL and Parquet"""
+    mime_message = message_from_bytes(raw)
+    return {
+        'id': msg['id'],
+        'thread_id': msg.get('threadId', ''),
+        'label_ids': list(msg.get('labelIds', [])),
+        'internal_date': int(msg.get('internalDate', 0)),
+        'from': mime_message.get('from', ''),
+        'to': mime_message.get('to', ''),
+        'cc': mime_message.get('cc', ''),
+        'subject': decode_header_value(mime_message.get('subject', '')),
+        'date': mime_message.get('date', ''),
+        'body': extract_body(mime_message, max_tokens=None),
+    }
+
+
+class MboxWriter:
+    """Appends raw messages to an mbox file (mboxrd quoting)"""
+
+    def __init__(self, path: str, offset: int):
+        self.file = open(path, 'ab')
+        self.file.truncate(offset)
+        self.file.seek(offset)
+
+    def write(self, msg: dict, raw: bytes):
+        timestamp = int(msg.get('internalDate', 0)) / 1000 or time.time()
+        self.file.write(f"From MAILER-DAEMON {time.asctime(time.gmtime(timestamp))}\n".encode())
+        for line in raw.replace(b'\r\n', b'\n').split(b'\n'):
+            if line.lstrip(b'>').startswith(b'From '):
+                line = b'>' + line
+            self.file.write(line + b'\n')
+        self.file.write(b'\n')
+
+    def flush(self) -> int:
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+class JsonlWriter:
+    """Appends one JSON object per message"""
+
+    def __init__(self, path: str, offset: int):
+        self.file = open(path, 'ab')
+        self.file.truncate(offset)
+        self.file.seek(offset)
+
+    def write(self, msg: dict, raw: bytes):
+        self.file.write(json.dumps(_record(msg, raw), ensure_ascii=False).encode() + b'\n')
+
+    def flush(self) -> int:
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    """Writes each flushed chunk as a numbered part file in a directory"""
+
+    def __init__(self, path: str, offset: int):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ValueError("Parquet export requires pyarrow. Install it with 'pip install pyarrow'.")
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.path = path
+        self.part = offset
+        self.rows: list[dict] = []
+        os.makedirs(path, exist_ok=True)
+
+    def write(self, msg: dict, raw: bytes):
+        self.rows.append(_record(msg, raw))
+
+    def flush(self) -> int:
+        if self.rows:
+            table = self.pa.Table.from_pylist(self.rows)
+            self.pq.write_table(table, os.path.join(self.path, f"part-{self.part:05d}.parquet"))
+            self.part += 1
+            self.rows = []
+        return self.part
+
+    def close(self):
+        self.rows = []
+
+
+WRITERS = {
+    'mbox': MboxWriter,
+    'jsonl': JsonlWriter,
+    'parquet': ParquetWriter,
+}
+
+
+class ExportJob:
+    """Streams a mailbox query to disk, checkpointing after every chunk.
+
+    The checkpoint (<path>.checkpoint.json) stores the next list page token,
+    the IDs of the current page still to export and the output offset, so a
+    job started again for the same path resumes where it stopped. Messages
+    are fetched in raw format, which does not change their read state.
+    """
+
+    def __init__(self, gmail_service, path: str, export_format: str, query: str = '',
+                 max_messages: int | None = None):
+        if export_format not in WRITERS:
+            raise ValueError(f"Unknown export format: {export_format}. Expected one of {', '.join(EXPORT_FORMATS)}")
+        self.gmail_service = gmail_service
+        self.path = os.path.abspath(path)
+        self.format = export_format
+        self.query = query
+        self.max_messages = max_messages
+        self.checkpoint_path = self.path + '.checkpoint.json'
+        self.job_id = str(uuid.uuid4())
+        self.status = 'pending'
+        self.error = None
+        self.state = self._load_checkpoint()
+
+    def _load_checkpoint(self) -> dict:
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path) as checkpoint_file:
+                state = json.load(checkpoint_file)
+            if state.get('format') == self.format and state.get('query') == self.query:
+                logger.info(f"Resuming export to {self.path} after {state['exported']} messages")
+                return state
+        return {
+            'format': self.format,
+            'query': self.query,
+            'page_token': None,
+            'listed': False,
+            'pending_ids': [],
+            'exported': 0,
+            'offset': 0,
+            'done': False,
+        }
+
+    def _save_checkpoint(self):
+        tmp_path = self.checkpoint_path + '.tmp'
+        with open(tmp_path, 'w') as checkpoint_file:
+            json.dump(self.state, checkpoint_file)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def summary(self) -> dict:
+        return {
+            'job_id': self.job_id,
+            'path': self.path,
+            'format': self.format,
+            'status': self.status,
+            'exported': self.state['exported'],
+            'error': self.error,
+        }
+
+    def _remaining(self) -> int | None:
+        if self.max_messages is None:
+            return None
+        return self.max_messages - self.state['exported']
+
+    async def run(self):
+        if self.state['done']:
+            self.status = 'completed'
+            return
+
+        self.status = 'running'
+        writer = None
+        try:
+            writer = WRITERS[self.format](self.path, self.state['offset'])
+            while True:
+                if not self.state['pending_ids']:
+                    if self.state['listed'] and self.state['page_token'] is None:
+                        break
+                    page = await asyncio.to_thread(
+                        self.gmail_service.list_page, self.query, self.state['page_token'], PAGE_SIZE
+                    )
+                    self.state['pending_ids'] = [msg['id'] for msg in page.get('messages', [])]
+                    self.state['page_token'] = page.get('nextPageToken')
+                    self.state['listed'] = True
+                    if not self.state['pending_ids']:
+                        break
+
+                remaining = self._remaining()
+                if remaining is not None and remaining <= 0:
+                    break
+
+                chunk = self.state['pending_ids'][:CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining)]
+                messages = await self._fetch_chunk(chunk)
+                for msg in messages:
+                    writer.write(msg, urlsafe_b64decode(msg['raw']))
+
+                self.state['offset'] = writer.flush()
+                self.state['exported'] += len(messages)
+                self.state['pending_ids'] = self.state['pending_ids'][len(chunk):]
+                self._save_checkpoint()
+
+            self.state['done'] = self.state['page_token'] is None and not self.state['pending_ids']
+            self._save_checkpoint()
+            self.status = 'completed'
+            logger.info(f"Export to {self.path} finished with {self.state['exported']} messages")
+        except Exception as error:
+            self.status = 'failed'
+            self.error = str(error)
+            logger.error(f"Export to {self.path} failed: {error}")
+        finally:
+            if writer:
+                writer.close()
+
+    async def _fetch_chunk(self, chunk: list[str]) -> list[dict]:
+        """Fetch every message of the chunk in order, retrying failed ones.
+        Raises if some still fail, so the checkpoint never moves past them."""
+        fetched = {}
+        missing = chunk
+        for attempt in range(MAX_RETRIES + 1):
+            if attempt:
+                delay = RETRY_DELAY * 2 ** (attempt - 1)
+                logger.warning(f"Retrying {len(missing)} failed messages of export to {self.path} in {delay}s")
+                await asyncio.sleep(delay)
+            messages, missing = await asyncio.to_thread(self.gmail_service.batch_get, missing, format='raw')
+            fetched.update((msg['id'], msg) for msg in messages)
+            if not missing:
+                return [fetched[email_id] for email_id in chunk]
+        raise RuntimeError(f"Could not fetch {len(missing)} messages after {MAX_RETRIES} retries: {', '.join(missing[:5])}")
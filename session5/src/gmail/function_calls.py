@@ -0,0 +1,143 @@
+import asyncio
+
+FUNCTION_CALL_MARKER = "FUNCTION_CALL:"
+
+
+def parse_function_call(function_info):
+    """Split 'name|param1|param2' into the function name and its parameters"""
+    function_parts = [p.strip() for p in function_info.split("|")]
+    return function_parts[0], function_parts[1:]
+
+
+class FunctionCallSplitter:
+    """Incrementally split streamed model text into ("text", str) and
+    ("call", function_info) pieces.
+
+    Text is released as soon as it cannot be the start of a FUNCTION_CALL
+    marker; a call is released once its line is complete.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+
+    def feed(self, chunk):
+        marker = FUNCTION_CALL_MARKER
+        pieces = []
+        self.buffer += chunk
+        while True:
+            start = self.buffer.find(marker)
+            if start == -1:
+                # Hold back a tail that might be the beginning of the marker
+                keep = next((n for n in range(len(marker) - 1, 0, -1) if self.buffer.endswith(marker[:n])), 0)
+                if len(self.buffer) > keep:
+                    pieces.append(("text", self.buffer[:len(self.buffer) - keep]))
+                    self.buffer = self.buffer[len(self.buffer) - keep:]
+                return pieces
+            if start:
+                pieces.append(("text", self.buffer[:start]))
+                self.buffer = self.buffer[start:]
+            end = self.buffer.find("\n")
+            if end == -1:
+                return pieces
+            pieces.append(("call", self.buffer[len(marker):end].strip()))
+            self.buffer = self.buffer[end + 1:]
+
+    def close(self):
+        """Flush whatever is left once the stream has ended"""
+        buffer, self.buffer = self.buffer, ""
+        if buffer.startswith(FUNCTION_CALL_MARKER):
+            return [("call", buffer[len(FUNCTION_CALL_MARKER):].strip())]
+        return [("text", buffer)] if buffer else []
+
+
+def split_function_calls(chunks):
+    """Split an iterable of streamed text chunks with FunctionCallSplitter"""
+    splitter = FunctionCallSplitter()
+    for chunk in chunks:
+        yield from splitter.feed(chunk)
+    yield from splitter.close()
+
+
+def parse_function_calls(response_text):
+    """Explanation text before the first call, and every FUNCTION_CALL line in the response"""
+    explanation = ""
+    calls = []
+    for kind, value in split_function_calls([response_text]):
+        if kind == "call":
+            calls.append(parse_function_call(value))
+        elif not calls:
+            explanation += value
+    return explanation.strip(), calls
+
+
+async def call_with_limit(slots, call_tool, func_name, params):
+    """Await call_tool(func_name, params) holding one of slots.
+    Returns a step dict; a failing call reports its error as the result."""
+    async with slots:
+        try:
+            arguments, result_text = await call_tool(func_name, params)
+        except Exception as e:
+            arguments, result_text = {}, f"Error executing {func_name}: {str(e)}"
+    return {"functionName": func_name, "arguments": arguments, "result": result_text}
+
+
+async def run_function_calls(calls, call_tool, limit=4):
+    """Run independent (func_name, params) calls concurrently, at most limit at a
+    time, and return their step dicts in call order"""
+    slots = asyncio.Semaphore(limit)
+    return await asyncio.gather(*(call_with_limit(slots, call_tool, func_name, params) for func_name, params in calls))
+
+
+def build_arguments(tool, params):
+    """Map positional parameters onto the tool's input schema, converting types"""
+    arguments = {}
+    schema_properties = tool.inputSchema.get('properties', {})
+
+    # Extract parameter names from schema
+    param_names = list(schema_properties.keys())
+
+    # Map parameters to the schema by position
+    for i, param_value in enumerate(params):
+        if i < len(param_names):
+            param_name = param_names[i]
+            param_info = schema_properties[param_name]
+            param_type = param_info.get('type', 'string')
+
+            # Convert value to appropriate type
+            if param_type == 'integer':
+                try:
+                    arguments[param_name] = int(param_value)
+                except ValueError:
+                    arguments[param_name] = 0
+            elif param_type == 'number':
+                try:
+                    arguments[param_name] = float(param_value)
+                except ValueError:
+                    arguments[param_name] = 0.0
+            elif param_type == 'array':
+                if isinstance(param_value, str):
+                    param_value = param_value.strip('[]').split(',')
+                try:
+                    arguments[param_name] = [int(x.strip()) if x.strip().isdigit() else x.strip() for x in param_value]
+                except:
+                    arguments[param_name] = []
+            else:
+                arguments[param_name] = str(param_value)
+    return arguments
+
+
+def result_to_text(result):
+    """Flatten an MCP tool result into plain text"""
+    result_text = ""
+    if hasattr(result, 'content'):
+        if isinstance(result.content, list):
+            for item in result.content:
+                if hasattr(item, 'text'):
+                    result_text += item.text + "\n"
+                else:
+                    result_text += str(item) + "\n"
+        else:
+            result_text = str(result.content)
+    else:
+        result_text = str(result)
+    return result_text
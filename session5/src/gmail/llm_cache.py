@@ -0,0 +1,134 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse whitespace so prompts that differ only in layout share a key"""
+    return WHITESPACE.sub(' ', prompt).strip()
+
+
+class ResponseCache:
+    """LRU cache of LLM response texts with a TTL and optional SQLite copy.
+
+    Keys are built from the model name, a context string (e.g. the system
+    prompt version), the normalized prompt and the generation config. Only
+    turns whose answer is a function of the prompt alone should be cached:
+    callers pass live=True for turns built from tool results or other live
+    mailbox state, and those always go to the model and are never stored.
+    """
+
+    def __init__(self, max_size: int = 500, ttl: float = 600, path: str | None = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS responses '
+                '(key TEXT PRIMARY KEY, text TEXT NOT NULL, created_at REAL NOT NULL)'
+            )
+            self._db.commit()
+
+    @staticmethod
+    def key(model_name: str, prompt: str, context: str = "", generation_config: dict | None = None) -> str:
+        material = [model_name, context, normalize_prompt(prompt), generation_config or {}]
+        return hashlib.sha256(json.dumps(material, sort_keys=True, default=str).encode()).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and self._db:
+                row = self._db.execute('SELECT text, created_at FROM responses WHERE key = ?', (key,)).fetchone()
+                if row:
+                    entry = self._entries[key] = (row[0], row[1])
+            if entry is None or time.time() - entry[1] > self.ttl:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: str, text: str):
+        if not text.strip():
+            return
+        with self._lock:
+            created_at = time.time()
+            self._entries[key] = (text, created_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            if self._db:
+                self._db.execute(
+                    'INSERT OR REPLACE INTO responses (key, text, created_at) VALUES (?, ?, ?)',
+                    (key, text, created_at)
+                )
+                self._db.execute('DELETE FROM responses WHERE created_at < ?', (created_at - self.ttl,))
+                self._db.commit()
+
+    def generate(self, model, prompt: str, context: str = "", generation_config: dict | None = None, live: bool = False) -> str:
+        """Response text for prompt, from the cache when possible"""
+        if live:
+            return model.generate_content(prompt, generation_config=generation_config).text
+        key = self.key(model.model_name, prompt, context, generation_config)
+        text = self.get(key)
+        if text is None:
+            text = model.generate_content(prompt, generation_config=generation_config).text
+            self.put(key, text)
+        return text
+
+    def stream(self, model, prompt: str, context: str = "", generation_config: dict | None = None, live: bool = False):
+        """Yield response text chunks; a cached response comes back as a single chunk"""
+        if live:
+            for chunk in model.generate_content(prompt, generation_config=generation_config, stream=True):
+                yield chunk.text
+            return
+        key = self.key(model.model_name, prompt, context, generation_config)
+        text = self.get(key)
+        if text is not None:
+            yield text
+            return
+        text = ""
+        for chunk in model.generate_content(prompt, generation_config=generation_config, stream=True):
+            text += chunk.text
+            yield chunk.text
+        self.put(key, text)
+
+    async def generate_async(self, model, prompt: str, context: str = "", generation_config: dict | None = None, live: bool = False) -> str:
+        """Async version of generate using generate_content_async"""
+        if live:
+            return (await model.generate_content_async(prompt, generation_config=generation_config)).text
+        key = self.key(model.model_name, prompt, context, generation_config)
+        text = self.get(key)
+        if text is None:
+            text = (await model.generate_content_async(prompt, generation_config=generation_config)).text
+            self.put(key, text)
+        return text
+
+    async def stream_async(self, model, prompt: str, context: str = "", generation_config: dict | None = None, live: bool = False):
+        """Async version of stream using generate_content_async"""
+        if live:
+            async for chunk in await model.generate_content_async(prompt, generation_config=generation_config, stream=True):
+                yield chunk.text
+            return
+        key = self.key(model.model_name, prompt, context, generation_config)
+        text = self.get(key)
+        if text is not None:
+            yield text
+            return
+        text = ""
+        async for chunk in await model.generate_content_async(prompt, generation_config=generation_config, stream=True):
+            text += chunk.text
+            yield chunk.text
+        self.put(key, text)
@@ -0,0 +1,195 @@
+import asyncio
+import logging
+
+import anyio
+from mcp import ClientSession, types
+from mcp.client.stdio import get_default_environment, stdio_client
+
+logger = logging.getLogger(__name__)
+
+# Raised when the server process or its pipes are gone. Tool errors and
+# request timeouts arrive as McpError over a working connection instead.
+TRANSPORT_ERRORS = (
+    anyio.ClosedResourceError, anyio.BrokenResourceError, anyio.EndOfStream,
+    ConnectionError, EOFError,
+)
+
+# Tools whose state lives in one server process (export jobs, draft edits,
+# duplicate clusters); they always go to the first member so follow-up calls
+# find what the earlier ones created.
+STATEFUL_TOOLS = {
+    'export-mailbox', 'export-status',
+    'create-draft', 'update-draft', 'get-draft', 'send-draft',
+    'find-duplicates', 'cluster-action',
+}
+
+
+class PoolMember:
+    """One server subprocess and the client session talking to it"""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.session: ClientSession | None = None
+        self.in_flight = 0
+        self.ready = asyncio.Event()
+        self.restart = asyncio.Event()
+        self.first_attempt = asyncio.Event()
+        self.error: Exception | None = None
+        self.task: asyncio.Task | None = None
+        # Bumped each time the server process comes up; a new one starts with no state
+        self.generation = 0
+
+
+class MCPSessionPool:
+    """Pool of MCP client sessions, each backed by its own server process.
+
+    Calls go to the healthy member with the fewest calls in flight, so load
+    spreads over size server event loops. A background task pings idle
+    members; a member that fails a ping or drops its connection is torn down
+    and respawned. start() warms every member up (initialize and list_tools)
+    before the pool is used.
+
+    Member 0 starts first, so it alone refreshes the OAuth token and syncs
+    the shared message cache; the others start with GMAIL_STARTUP_SYNC=0.
+    Tools answered from the cache (contacts, triage, duplicates) reload it
+    from the shared file first, so any member sees what the others stored.
+    Stateful tools lose what earlier calls created when their process is
+    replaced; the first call after that gets a warning in its result.
+    """
+
+    def __init__(self, server_params, size: int = 2, init_timeout: float = 30,
+                 health_interval: float = 30, stateful_tools=STATEFUL_TOOLS):
+        self.server_params = server_params
+        self.size = max(1, size)
+        self.init_timeout = init_timeout
+        self.health_interval = health_interval
+        self.stateful_tools = set(stateful_tools)
+        self.members = [PoolMember(i) for i in range(self.size)]
+        self.tools = []
+        self._health_task: asyncio.Task | None = None
+        # (member index, generation) holding the state of stateful tools
+        self._state_owner: tuple[int, int] | None = None
+
+    @property
+    def ready(self) -> bool:
+        return any(member.ready.is_set() for member in self.members)
+
+    async def start(self) -> list:
+        """Spawn and warm up every member; returns the tool list.
+        Raises the first error if no member could be started."""
+        first = self.members[0]
+        first.task = asyncio.create_task(self._run_member(first))
+        # The others then find a fresh token instead of all refreshing it at once
+        await first.first_attempt.wait()
+        for member in self.members[1:]:
+            member.task = asyncio.create_task(self._run_member(member))
+        await asyncio.gather(*(member.first_attempt.wait() for member in self.members))
+
+        if not self.ready:
+            error = next(member.error for member in self.members if member.error)
+            await self.close()
+            raise error
+
+        self._health_task = asyncio.create_task(self._check_health())
+        logger.info(f"MCP pool ready with {sum(m.ready.is_set() for m in self.members)}/{self.size} members")
+        return self.tools
+
+    async def call_tool(self, name: str, arguments: dict):
+        member = self._pick(name)
+        warning = self._check_state(member) if name in self.stateful_tools else None
+        member.in_flight += 1
+        try:
+            result = await member.session.call_tool(name, arguments=arguments)
+        except TRANSPORT_ERRORS as e:
+            logger.warning(f"MCP pool member {member.index} lost its connection: {e}")
+            member.restart.set()
+            raise
+        finally:
+            member.in_flight -= 1
+        if warning:
+            result.content.insert(0, types.TextContent(type="text", text=warning))
+        return result
+
+    async def close(self):
+        tasks = [member.task for member in self.members if member.task] + [self._health_task]
+        for task in tasks:
+            if task:
+                task.cancel()
+        await asyncio.gather(*(task for task in tasks if task), return_exceptions=True)
+
+    def _pick(self, name: str) -> PoolMember:
+        healthy = [member for member in self.members if member.ready.is_set()]
+        if not healthy:
+            raise ValueError("No MCP server available. Please wait for the connection to be re-established.")
+        if name in self.stateful_tools and self.members[0].ready.is_set():
+            return self.members[0]
+        return min(healthy, key=lambda member: member.in_flight)
+
+    def _check_state(self, member: PoolMember) -> str | None:
+        """Warning text when a stateful call lands on a different process than the previous one"""
+        owner = (member.index, member.generation)
+        previous, self._state_owner = self._state_owner, owner
+        if previous is None or previous == owner:
+            return None
+        logger.warning(f"MCP server holding tool state was replaced; stateful tools now use member {member.index}")
+        return ("Warning: the mail server process was restarted, so drafts, export jobs and "
+                "duplicate clusters created before this call are gone.")
+
+    def _member_params(self, member: PoolMember):
+        if member.index == 0:
+            return self.server_params
+        env = dict(self.server_params.env or get_default_environment(), GMAIL_STARTUP_SYNC='0')
+        return self.server_params.model_copy(update={'env': env})
+
+    async def _run_member(self, member: PoolMember):
+        """Keep one server process running, respawning it whenever it fails"""
+        delay = 1
+        while True:
+            try:
+                async with stdio_client(self._member_params(member)) as (read, write):
+                    async with ClientSession(read, write) as session:
+                        async with asyncio.timeout(self.init_timeout):
+                            await session.initialize()
+                            tools_result = await session.list_tools()
+                        if not self.tools:
+                            self.tools = tools_result.tools
+
+                        member.session = session
+                        member.generation += 1
+                        member.error = None
+                        member.restart.clear()
+                        member.ready.set()
+                        member.first_attempt.set()
+                        delay = 1
+                        logger.info(f"MCP pool member {member.index} is up")
+
+                        await member.restart.wait()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                member.error = e
+                logger.warning(f"MCP pool member {member.index} failed: {e}")
+            finally:
+                member.ready.clear()
+                member.session = None
+
+            # Failed on startup (e.g. missing credentials): let start() report it.
+            # If no member came up, start() closes the pool and this task ends.
+            member.first_attempt.set()
+            # Back off so a server that keeps crashing does not spin
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60)
+
+    async def _check_health(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            for member in self.members:
+                if not member.ready.is_set() or member.in_flight:
+                    # Busy members prove themselves alive through their calls
+                    continue
+                try:
+                    async with asyncio.timeout(5):
+                        await member.session.send_ping()
+                except Exception as e:
+                    logger.warning(f"MCP pool member {member.index} failed its health check: {e}")
+                    member.restart.set()
@@ -0,0 +1,120 @@
+import threading
+
+from body import CHARS_PER_TOKEN, estimate_tokens, truncate_to_tokens
+
+# System messages carrying raw tool output start with this
+RESULT_PREFIX = "Result from "
+
+
+def format_turns(turns) -> str:
+    return "\n".join(f"{turn['sender']}: {turn['message']}" for turn in turns)
+
+
+def first_line(text: str, max_tokens: int = 30) -> str:
+    lines = text.strip().splitlines()
+    return truncate_to_tokens(lines[0], max_tokens) if lines else ""
+
+
+class ConversationMemory:
+    """Conversation context for prompts, kept within a token budget.
+
+    Recent turns are kept verbatim. Once they exceed recent_tokens the oldest
+    ones are evicted, and compact() folds them into a running summary with
+    summarize(summary, turns_text) -> str. Without a summarizer, or when it
+    fails, each evicted turn is condensed to one line instead. System messages
+    (tool calls and raw results) are cut to result_tokens once an assistant
+    reply has followed them, since the reply already digested them. With the
+    summary capped at summary_tokens, render() stays within about
+    recent_tokens + summary_tokens however long the session runs.
+    """
+
+    def __init__(self, recent_tokens: int = 1500, summary_tokens: int = 500,
+                 result_tokens: int = 150, summarize=None):
+        self.recent_tokens = recent_tokens
+        self.summary_tokens = summary_tokens
+        self.result_tokens = result_tokens
+        self.summarize = summarize
+        self.turns = []
+        self.summary = ""
+        # True once any tool result was seen; answers then depend on live mailbox state
+        self.has_tool_results = False
+        self._evicted = []
+        self._lock = threading.Lock()
+
+    def add(self, sender: str, message: str):
+        with self._lock:
+            if sender == "Assistant":
+                self._digest()
+            if sender == "System" and message.startswith(RESULT_PREFIX):
+                self.has_tool_results = True
+            # A single huge turn may take at most half of the recent budget
+            self.turns.append({'sender': sender, 'message': truncate_to_tokens(message, self.recent_tokens // 2)})
+            self._evict()
+
+    def state(self) -> dict:
+        """Everything needed to rebuild this memory, as JSON-serializable data"""
+        with self._lock:
+            return {
+                'summary': self.summary,
+                'turns': [dict(turn) for turn in self._evicted + self.turns],
+                'has_tool_results': self.has_tool_results,
+            }
+
+    def restore(self, state: dict):
+        with self._lock:
+            self.summary = state.get('summary', "")
+            self.turns = [dict(turn) for turn in state.get('turns', [])]
+            self.has_tool_results = state.get('has_tool_results', False)
+            self._evicted = []
+            self._evict()
+
+    async def compact(self):
+        """Fold evicted turns into the summary; call before render()"""
+        with self._lock:
+            turns, self._evicted = self._evicted, []
+            summary = self.summary
+        if not turns:
+            return
+
+        new_summary = None
+        if self.summarize:
+            try:
+                new_summary = await self.summarize(summary, format_turns(turns))
+            except Exception:
+                new_summary = None
+        if not new_summary:
+            lines = [f"{turn['sender']}: {first_line(turn['message'])}" for turn in turns]
+            new_summary = "\n".join(filter(None, [summary] + lines))
+
+        with self._lock:
+            self.summary = self._trim_summary(new_summary.strip())
+
+    def render(self) -> str:
+        """Summary and recent turns as text for the next prompt"""
+        with self._lock:
+            parts = []
+            if self.summary:
+                parts.append(f"Summary of earlier conversation:\n{self.summary}")
+            parts.append(f"Recent conversation:\n{format_turns(self.turns)}")
+            return "\n\n".join(parts)
+
+    def _evict(self):
+        while len(self.turns) > 1 and self._recent_size() > self.recent_tokens:
+            self._evicted.append(self.turns.pop(0))
+
+    def _digest(self):
+        for turn in self.turns:
+            if turn['sender'] == "System" and not turn.get('digested'):
+                turn['message'] = truncate_to_tokens(turn['message'], self.result_tokens)
+                turn['digested'] = True
+
+    def _recent_size(self) -> int:
+        return sum(estimate_tokens(turn['sender']) + estimate_tokens(turn['message']) + 1 for turn in self.turns)
+
+    def _trim_summary(self, summary: str) -> str:
+        """Keep the newest part of an over-long summary, starting at a line boundary"""
+        if estimate_tokens(summary) <= self.summary_tokens:
+            return summary
+        tail = summary[-self.summary_tokens * CHARS_PER_TOKEN:]
+        newline = tail.find('\n')
+        return tail[newline + 1:] if 0 <= newline < len(tail) // 2 else tail
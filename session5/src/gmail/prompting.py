@@ -0,0 +1,216 @@
+import asyncio
+import datetime
+import hashlib
+import json
+import logging
+import threading
+import time
+
+import google.generativeai as genai
+
+logger = logging.getLogger(__name__)
+
+
+def describe_tools(tools) -> str:
+    """Create a description string for available tools"""
+    if not tools:
+        return "No tools available. Server connection might be down."
+
+    tools_description = []
+    for i, tool in enumerate(tools):
+        try:
+            params = tool.inputSchema
+            desc = getattr(tool, 'description', 'No description available')
+            name = getattr(tool, 'name', f'tool_{i}')
+
+            if 'properties' in params:
+                param_details = []
+                for param_name, param_info in params['properties'].items():
+                    param_type = param_info.get('type', 'unknown')
+                    param_desc = param_info.get('description', '')
+                    param_details.append(f"{param_name} ({param_type}): {param_desc}")
+                params_str = '\n    - ' + '\n    - '.join(param_details) if param_details else 'no parameters'
+            else:
+                params_str = 'no parameters'
+
+            tool_desc = f"{name}: {desc}\n  Parameters: {params_str}"
+            tools_description.append(tool_desc)
+        except Exception:
+            tools_description.append(f"Error processing tool {i}")
+
+    return "\n\n".join(tools_description)
+
+
+def create_system_prompt(tools_description):
+    """Create the system prompt for the LLM"""
+    return f"""You are an intelligent email assistant with access to the user's Gmail account.
+    
+    Your job is to help the user manage their emails through conversation while using available email tools.
+
+    Available email tools:
+    {tools_description}
+
+    When you need to use a tool, format your response exactly as follows:
+
+    1. First explain your reasoning and what you're going to do
+    2. Then put the function call on a separate line starting with FUNCTION_CALL:
+    FUNCTION_CALL: function_name|parameter1_value|parameter2_value|...
+    3. If the request needs several independent calls (for example reading three emails),
+    put each FUNCTION_CALL on its own line; they run in parallel
+    4. Wait for function results before proceeding with your response
+
+    For example, when sending an email:
+    I'll send an email to your colleague now.
+    FUNCTION_CALL: send-email|example@gmail.com|Meeting Tomorrow|Hi there,\n\nI wanted to confirm our meeting tomorrow at 2pm.\n\nBest regards,\nYou
+
+    Important guidelines:
+
+    1. REASONING PROCESS:
+    - Always explain your thought process before taking any action
+    - Consider what the user is asking for and choose the appropriate tool
+    - Verify information before sending emails or trashing content
+
+    2. EMAIL HANDLING:
+    - ALWAYS get explicit confirmation before sending any email or trashing messages
+    - Draft emails when asked but don't send without confirmation
+    - When showing email content, format it clearly with sender, subject, and body
+    - When reading emails, mark them as read automatically
+
+    3. VERIFICATION STEPS:
+    - Check that email addresses are properly formatted before sending
+    - For email drafting, ask if the user wants to make any changes before sending
+    - After actions are completed, summarize what was done
+
+    4. FUNCTION CALL FORMAT:
+    - ALWAYS use the exact format: FUNCTION_CALL: function_name|param1_value|param2_value|...
+    - DO NOT include parameter names in the function call, only their values
+    - For email parameters, use the actual email values directly
+
+    5. CONVERSATION STYLE:
+    - Be concise but friendly
+    - Format email content for readability
+    - Ask clarifying questions when needed
+
+    Remember: You must get explicit confirmation before sending emails or deleting content.
+    """
+
+
+def create_result_prompt(func_name, arguments, result) -> str:
+    """Prompt asking the LLM to interpret a tool result for the user"""
+    return f"""You are an email assistant. You just executed the function {func_name} 
+        with arguments {arguments} and got this result:
+        
+        {result}
+        
+        Please interpret this result in a user-friendly way. If this contains email data, 
+        format it nicely. If this is a confirmation of an action, summarize what happened.
+        If there's an error, explain it clearly and suggest what to do next.
+        """
+
+
+def create_summary_prompt(summary, turns, max_words=300) -> str:
+    """Prompt folding older conversation turns into the running summary"""
+    return f"""Update the summary of a conversation between a user and their email assistant
+        with the turns below. Keep what later requests may refer to: email IDs, addresses,
+        names, drafts, decisions and anything still waiting for the user's confirmation.
+        Leave out tool output that was already answered. Reply with the updated summary
+        only, in at most {max_words} words.
+
+        Current summary:
+        {summary or "(none yet)"}
+
+        Turns to add:
+        {turns}
+        """
+
+
+def create_agent_prompt(user_message, steps, can_continue=True) -> str:
+    """Prompt for the next action of a multi-step request, with every tool result so far"""
+    history = "\n\n".join(
+        f"{i}. {step['functionName']} with arguments {step['arguments']} returned:\n{step['result']}"
+        for i, step in enumerate(steps, 1)
+    )
+    if can_continue:
+        instruction = """If the request needs another tool call, briefly say why and put the next
+        FUNCTION_CALL on its own line. Otherwise answer the user directly in plain text:
+        format email data nicely, summarize completed actions and explain any errors."""
+    else:
+        instruction = """The step budget for this request is used up. Do not call any more tools;
+        answer the user with what you have and say what is left to do."""
+    return f"""User: {user_message}
+
+        Tool calls made so far for this request:
+
+        {history}
+
+        {instruction}
+        """
+
+
+def tools_version(tools) -> str:
+    """Fingerprint of the tool list; changes whenever a tool or its schema changes"""
+    catalog = [
+        (getattr(tool, 'name', ''), getattr(tool, 'description', ''), tool.inputSchema)
+        for tool in tools
+    ]
+    return hashlib.sha256(json.dumps(catalog, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class SystemPromptModel:
+    """Gemini model with the system prompt passed as system_instruction.
+
+    The tool catalog and system prompt are built once per tool-list version
+    instead of on every turn. Where the API supports it the system prompt is
+    also stored with context caching, so repeated turns do not pay for its
+    input tokens again; otherwise the plain system_instruction model is used.
+    """
+
+    def __init__(self, model_name: str, build_system_prompt, cache_ttl: int = 3600):
+        self.model_name = model_name
+        self.build_system_prompt = build_system_prompt
+        self.cache_ttl = cache_ttl
+        self._version = None
+        self._model = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def version(self) -> str | None:
+        """Tool-list version of the current system prompt, for use in cache keys"""
+        return self._version
+
+    def get(self, tools) -> genai.GenerativeModel:
+        """Model for the current tool list, rebuilt only when the tools change"""
+        version = tools_version(tools)
+        with self._lock:
+            if version != self._version or time.time() >= self._expires_at:
+                system_prompt = self.build_system_prompt(describe_tools(tools))
+                self._model, self._expires_at = self._create(system_prompt)
+                self._version = version
+            return self._model
+
+    async def get_async(self, tools) -> genai.GenerativeModel:
+        """get() for event-loop callers; building the model is a blocking network call"""
+        return await asyncio.to_thread(self.get, tools)
+
+    def _cached_model_name(self) -> str:
+        """Configured model name in the models/... form context caching expects"""
+        if self.model_name.startswith("models/"):
+            return self.model_name
+        return f"models/{self.model_name}"
+
+    def _create(self, system_prompt: str) -> tuple[genai.GenerativeModel, float]:
+        try:
+            cached = genai.caching.CachedContent.create(
+                model=self._cached_model_name(),
+                display_name=f"system-prompt-{self.model_name}",
+                system_instruction=system_prompt,
+                ttl=datetime.timedelta(seconds=self.cache_ttl),
+            )
+            logger.info(f"System prompt stored with context caching: {cached.name}")
+            # Refresh a minute early so requests never hit an expired cache
+            return genai.GenerativeModel.from_cached_content(cached), time.time() + self.cache_ttl - 60
+        except Exception as e:
+            # Context caching needs a minimum prompt size and a supported model
+            logger.info(f"Context caching unavailable, using system_instruction: {e}")
+            return genai.GenerativeModel(self.model_name, system_instruction=system_prompt), float('inf')
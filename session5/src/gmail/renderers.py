@@ -0,0 +1,91 @@
+import json
+
+# Any of these in a result means something went wrong; the LLM explains those
+FAILURE_MARKERS = ("error", "failed", "timed out", "unknown")
+
+RENDERERS = {}
+# Tools whose result ends a request made of that one call: once rendered, no further model turn is needed
+FINAL_TOOLS = set()
+
+
+def renderer(*names, final=False):
+    """Register a function(arguments, result) -> str as the renderer for the given tools"""
+    def register(func):
+        for name in names:
+            RENDERERS[name] = func
+            if final:
+                FINAL_TOOLS.add(name)
+        return func
+    return register
+
+
+def render_result(func_name, arguments, result) -> str | None:
+    """Format a known tool result locally.
+
+    Returns None when there is no renderer for the tool or the result looks
+    like a failure, in which case the caller falls back to the LLM pass.
+    """
+    render = RENDERERS.get(func_name)
+    if render is None:
+        return None
+    result = result.strip()
+    if any(marker in result.lower() for marker in FAILURE_MARKERS):
+        return None
+    try:
+        return render(arguments, result)
+    except (ValueError, SyntaxError, KeyError, TypeError):
+        # Result was not in the shape the renderer expects
+        return None
+
+
+@renderer("mark-email-as-read", final=True)
+def render_mark_as_read(arguments, result):
+    return f"Done. Email {arguments.get('email_id', '')} is now marked as read."
+
+
+@renderer("trash-email", final=True)
+def render_trash(arguments, result):
+    return f"Done. Email {arguments.get('email_id', '')} was moved to the trash. You can restore it from Trash in Gmail for 30 days."
+
+
+@renderer("open-email", final=True)
+def render_open(arguments, result):
+    return f"Email {arguments.get('email_id', '')} is now open in your browser."
+
+
+@renderer("send-email", final=True)
+def render_send(arguments, result):
+    return f"Your email \"{arguments.get('subject', '')}\" was sent to {arguments.get('recipient_id', '')}."
+
+
+@renderer("send-draft", final=True)
+def render_send_draft(arguments, result):
+    return f"Draft {arguments.get('draft_id', '')} was sent."
+
+
+@renderer("create-draft", "update-draft", "get-draft", "cluster-action", final=True)
+def render_verbatim(arguments, result):
+    # These results are already written for the user
+    return result
+
+
+@renderer("get-unread-emails")
+def render_unread(arguments, result):
+    messages = json.loads(result)
+    if not messages:
+        return "You have no unread emails in your primary inbox."
+    lines = [f"You have {len(messages)} unread emails in your primary inbox:"]
+    lines.extend(f"- {message['id']}" for message in messages)
+    return "\n".join(lines)
+
+
+@renderer("lookup-contact")
+def render_contacts(arguments, result):
+    if result.startswith("No known contacts"):
+        return result
+    matches = json.loads(result)
+    lines = ["Matching contacts:"]
+    for match in matches:
+        name = f"{match['name']} " if match['name'] else ""
+        lines.append(f"- {name}<{match['address']}> ({match['count']} messages)")
+    return "\n".join(lines)
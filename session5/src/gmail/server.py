@@ -1,5 +1,6 @@
 from typing import Any
 import argparse
+import json
 import os
 import asyncio
 import logging
@@ -10,6 +11,7 @@ from base64 import urlsafe_b64decode
 from email import message_from_bytes
 import webbrowser
 import sys
+import threading
 
 from mcp.server.models import InitializationOptions
 import mcp.types as types
@@ -23,6 +25,26 @@ from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
+try:
+    from .body import DEFAULT_MAX_TOKENS, extract_body, truncate_to_tokens
+    from .cache import METADATA_HEADERS, MessageCache, message_from_api
+    from .contacts import ContactIndex
+    from .dedup import DuplicateIndex
+    from .drafts import EDIT_OPERATIONS, Draft
+    from .export import EXPORT_FORMATS, ExportJob, parquet_available
+    from .triage import TriageClassifier
+except ImportError:
+    # Running as a script (python src/gmail/server.py)
+    from body import DEFAULT_MAX_TOKENS, extract_body, truncate_to_tokens
+    from cache import METADATA_HEADERS, MessageCache, message_from_api
+    from contacts import ContactIndex
+    from dedup import DuplicateIndex
+    from drafts import EDIT_OPERATIONS, Draft
+    from export import EXPORT_FORMATS, ExportJob, parquet_available
+    from triage import TriageClassifier
+
+
+CLUSTER_ACTIONS = ['trash', 'mark-read', 'archive', 'label']
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -37,6 +59,8 @@ You have the following tools available:
 - Read email content (read-email)
 - Trash email (tras-email)
 - Open email in browser (open-email)
+- Look up a contact's address by name (lookup-contact)
+- Create, edit and send server-side drafts (create-draft, update-draft, get-draft, send-draft)
 Never send an email draft or trash an email unless the user confirms first. 
 Always ask for approval if not already given.
 """
@@ -79,8 +103,8 @@ PROMPTS = {
                 required=True
             ),
             types.PromptArgument(
-                name="current_draft",
-                description="The current draft to edit",
+                name="draft_id",
+                description="ID of the draft to edit",
                 required=True
             ),
         ],
@@ -103,11 +127,19 @@ def decode_mime_header(header: str) -> str:
     return decoded_string
 
 
+def data_content(data, artifact_type: str) -> list[types.TextContent]:
+    """Tool result whose text is the data as JSON, so clients can parse it back.
+    Error messages (plain strings) are passed through as they are."""
+    text = data if isinstance(data, str) else json.dumps(data)
+    return [types.TextContent(type="text", text=text, artifact={"type": artifact_type, "data": data})]
+
+
 class GmailService:
     def __init__(self,
                  creds_file_path: str,
                  token_path: str,
-                 scopes: list[str] = ['https://www.googleapis.com/auth/gmail.modify']):
+                 scopes: list[str] = ['https://www.googleapis.com/auth/gmail.modify'],
+                 cache_path: str | None = None):
         logger.info(f"Initializing GmailService with creds file: {creds_file_path}")
         self.creds_file_path = creds_file_path
         self.token_path = token_path
@@ -115,10 +147,24 @@ class GmailService:
         self.token = self._get_token()
         logger.info("Token retrieved successfully")
         self.service = self._get_service()
+        # Calls made from worker threads get their own HTTP client, one at a time
+        self.batch_service = self._get_service()
+        self._batch_lock = threading.Lock()
         logger.info("Gmail service initialized")
         self.user_email = self._get_user_email()
         logger.info(f"User email retrieved: {self.user_email}")
 
+        self.cache = MessageCache(cache_path)
+        self.contacts = ContactIndex(ignore=[self.user_email])
+        self.duplicates = DuplicateIndex()
+        self.cache.add_listener(self.contacts.add_message)
+        self.cache.add_listener(self.duplicates.add_message)
+        self.drafts: dict[str, Draft] = {}
+        self.export_jobs: dict[str, ExportJob] = {}
+        self._export_tasks: set[asyncio.Task] = set()
+        self.triage = TriageClassifier()
+        self._triage_cache_size = -1
+
     def _get_token(self) -> Credentials:
         """Get or refresh Google API token"""
 
@@ -158,23 +204,39 @@ class GmailService:
         user_email = profile.get('emailAddress', '')
         return user_email
     
+    def _encode_message(self, recipient_id: str, subject: str, message: str) -> str:
+        """Build a base64url encoded RFC 2822 message"""
+        message_obj = EmailMessage()
+        message_obj.set_content(message)
+
+        message_obj['To'] = recipient_id
+        message_obj['From'] = self.user_email
+        message_obj['Subject'] = subject
+
+        return base64.urlsafe_b64encode(message_obj.as_bytes()).decode()
+
     async def send_email(self, recipient_id: str, subject: str, message: str,) -> dict:
         """Creates and sends an email message"""
         try:
-            message_obj = EmailMessage()
-            message_obj.set_content(message)
-            
-            message_obj['To'] = recipient_id
-            message_obj['From'] = self.user_email
-            message_obj['Subject'] = subject
-
-            encoded_message = base64.urlsafe_b64encode(message_obj.as_bytes()).decode()
-            create_message = {'raw': encoded_message}
+            create_message = {'raw': self._encode_message(recipient_id, subject, message)}
             
             send_message = await asyncio.to_thread(
-                self.service.users().messages().send(userId="me", body=create_message).execute
+                self._execute, lambda service: service.users().messages().send(userId="me", body=create_message)
             )
             logger.info(f"Message sent: {send_message['id']}")
+            self.cache.put({
+                'id': send_message['id'],
+                'threadId': send_message.get('threadId', ''),
+                'labelIds': send_message.get('labelIds', ['SENT']),
+                'internalDate': 0,
+                'snippet': message[:200],
+                'from': self.user_email,
+                'to': recipient_id,
+                'cc': '',
+                'subject': subject,
+                'date': '',
+                'body': message,
+            })
             return {"status": "success", "message_id": send_message["id"]}
         except HttpError as error:
             return {"status": "error", "error_message": str(error)}
@@ -212,8 +274,11 @@ class GmailService:
         except HttpError as error:
             return f"An HttpError occurred: {str(error)}"
 
-    async def read_email(self, email_id: str) -> dict[str, str]| str:
-        """Retrieves email contents including to, from, subject, and contents."""
+    async def read_email(self, email_id: str, max_tokens: int | None = DEFAULT_MAX_TOKENS,
+                         mark_read: bool = True) -> dict[str, str]| str:
+        """Retrieves email contents including to, from, subject, and contents.
+        The body is cleaned and truncated to roughly max_tokens (0 or None for no limit).
+        With mark_read=False the read state is left unchanged."""
         try:
             msg = self.service.users().messages().get(userId="me", id=email_id, format='raw').execute()
             email_metadata = {}
@@ -225,29 +290,35 @@ class GmailService:
             # Parse the RFC 2822 email
             mime_message = message_from_bytes(decoded_data)
 
-            # Extract the email body
-            body = None
-            if mime_message.is_multipart():
-                for part in mime_message.walk():
-                    # Extract the text/plain part
-                    if part.get_content_type() == "text/plain":
-                        body = part.get_payload(decode=True).decode()
-                        break
-            else:
-                # For non-multipart messages
-                body = mime_message.get_payload(decode=True).decode()
-            email_metadata['content'] = body
+            # Extract the email body as compact plain text (HTML converted, quotes and signature removed)
+            body = extract_body(mime_message, max_tokens=None)
+            email_metadata['content'] = truncate_to_tokens(body, max_tokens)
             
             # Extract metadata
             email_metadata['subject'] = decode_mime_header(mime_message.get('subject', ''))
             email_metadata['from'] = mime_message.get('from','')
             email_metadata['to'] = mime_message.get('to','')
             email_metadata['date'] = mime_message.get('date','')
+
+            self.cache.put({
+                'id': email_id,
+                'threadId': msg.get('threadId', ''),
+                'labelIds': [label for label in msg.get('labelIds', []) if not (mark_read and label == 'UNREAD')],
+                'internalDate': int(msg.get('internalDate', 0)),
+                'snippet': msg.get('snippet', ''),
+                'from': email_metadata['from'],
+                'to': email_metadata['to'],
+                'cc': mime_message.get('cc', ''),
+                'subject': email_metadata['subject'],
+                'date': email_metadata['date'],
+                'body': truncate_to_tokens(body, DEFAULT_MAX_TOKENS),
+            })
             
             logger.info(f"Email read: {email_id}")
             
             # We want to mark email as read once we read it
-            await self.mark_email_as_read(email_id)
+            if mark_read:
+                await self.mark_email_as_read(email_id)
 
             return email_metadata
         except HttpError as error:
@@ -258,6 +329,7 @@ class GmailService:
         try:
             self.service.users().messages().trash(userId="me", id=email_id).execute()
             logger.info(f"Email moved to trash: {email_id}")
+            self._forget_trashed([email_id])
             return "Email moved to trash successfully."
         except HttpError as error:
             return f"An HttpError occurred: {str(error)}"
@@ -267,17 +339,349 @@ class GmailService:
         try:
             self.service.users().messages().modify(userId="me", id=email_id, body={'removeLabelIds': ['UNREAD']}).execute()
             logger.info(f"Email marked as read: {email_id}")
+            self.cache.update_labels(email_id, remove=['UNREAD'])
             return "Email marked as read."
         except HttpError as error:
             return f"An HttpError occurred: {str(error)}"
+
+    async def create_draft(self, recipient_id: str, subject: str, message: str) -> dict:
+        """Creates a draft in the mailbox and keeps an editable copy on the server"""
+        try:
+            draft = Draft(recipient_id, subject, message)
+            body = {'message': {'raw': self._encode_message(draft.recipient, draft.subject, draft.body)}}
+            created = await asyncio.to_thread(
+                self._execute, lambda service: service.users().drafts().create(userId="me", body=body)
+            )
+            self.drafts[created['id']] = draft
+            logger.info(f"Draft created: {created['id']}")
+            return {"status": "success", "draft_id": created['id'], "outline": draft.outline()}
+        except HttpError as error:
+            return {"status": "error", "error_message": str(error)}
+
+    async def _load_draft(self, draft_id: str) -> Draft:
+        """Returns the server-side copy of a draft, fetching it from Gmail if needed"""
+        if draft_id in self.drafts:
+            return self.drafts[draft_id]
+
+        fetched = await asyncio.to_thread(
+            self._execute, lambda service: service.users().drafts().get(userId="me", id=draft_id, format='raw')
+        )
+        mime_message = message_from_bytes(urlsafe_b64decode(fetched['message']['raw']))
+        body = ''
+        for part in mime_message.walk():
+            if part.get_content_type() == "text/plain":
+                body = part.get_payload(decode=True).decode(part.get_content_charset() or 'utf-8')
+                break
+        draft = Draft(mime_message.get('to', ''), decode_mime_header(mime_message.get('subject', '')), body)
+        self.drafts[draft_id] = draft
+        return draft
+
+    async def get_draft(self, draft_id: str) -> str:
+        """Returns the draft with numbered paragraphs"""
+        try:
+            draft = await self._load_draft(draft_id)
+            return draft.render()
+        except HttpError as error:
+            return f"An HttpError occurred: {str(error)}"
+
+    async def edit_draft(self, draft_id: str, operation: str, text: str = '', index: int | None = None) -> str:
+        """Applies a single edit operation to a draft and saves it.
+        Returns a short summary instead of the full draft."""
+        try:
+            # Edit a copy, so the local draft only changes once Gmail has saved it
+            draft = (await self._load_draft(draft_id)).copy()
+            change = draft.apply(operation, text, index)
+            body = {
+                'id': draft_id,
+                'message': {'raw': self._encode_message(draft.recipient, draft.subject, draft.body)},
+            }
+            await asyncio.to_thread(
+                self._execute, lambda service: service.users().drafts().update(userId="me", id=draft_id, body=body)
+            )
+            self.drafts[draft_id] = draft
+            logger.info(f"Draft updated: {draft_id} ({operation})")
+            return f"{change} in draft {draft_id}. Draft now has {len(draft.paragraphs)} paragraphs."
+        except HttpError as error:
+            return f"An HttpError occurred: {str(error)}"
+
+    async def send_draft(self, draft_id: str) -> dict:
+        """Sends an existing draft by ID"""
+        try:
+            sent = await asyncio.to_thread(
+                self._execute, lambda service: service.users().drafts().send(userId="me", body={'id': draft_id})
+            )
+            draft = self.drafts.pop(draft_id, None)
+            if draft:
+                self.cache.put({
+                    'id': sent['id'],
+                    'threadId': sent.get('threadId', ''),
+                    'labelIds': sent.get('labelIds', ['SENT']),
+                    'internalDate': 0,
+                    'snippet': draft.body[:200],
+                    'from': self.user_email,
+                    'to': draft.recipient,
+                    'cc': '',
+                    'subject': draft.subject,
+                    'date': '',
+                    'body': draft.body,
+                })
+            logger.info(f"Draft sent: {draft_id} as message {sent['id']}")
+            return {"status": "success", "message_id": sent["id"]}
+        except HttpError as error:
+            return {"status": "error", "error_message": str(error)}
+
+    def _execute(self, build):
+        """Build a request on the batch client and execute it (blocking).
+        The loop-thread client is not thread-safe, so worker threads use this one."""
+        with self._batch_lock:
+            return build(self.batch_service).execute()
+
+    def batch_get(self, email_ids: list[str], batch_size: int = 50, **params) -> tuple[list[dict], list[str]]:
+        """Fetch many messages with batched HTTP requests (blocking).
+        Returns the messages fetched and the IDs whose sub-request failed (e.g. 429 or 5xx)."""
+        results = {}
+        failed = []
+
+        def callback(request_id, response, exception):
+            if exception is not None:
+                logger.error(f"Batch fetch failed for {request_id}: {exception}")
+                failed.append(request_id)
+            else:
+                results[request_id] = response
+
+        with self._batch_lock:
+            for start in range(0, len(email_ids), batch_size):
+                batch = self.batch_service.new_batch_http_request(callback=callback)
+                for email_id in email_ids[start:start + batch_size]:
+                    batch.add(
+                        self.batch_service.users().messages().get(userId='me', id=email_id, **params),
+                        request_id=email_id
+                    )
+                batch.execute()
+
+        return [results[email_id] for email_id in email_ids if email_id in results], failed
+
+    def list_page(self, query: str = '', page_token: str | None = None, max_results: int = 100) -> dict:
+        """List one page of message IDs on the batch client (blocking)"""
+        params = {'userId': 'me', 'maxResults': max_results}
+        if query:
+            params['q'] = query
+        if page_token:
+            params['pageToken'] = page_token
+        with self._batch_lock:
+            return self.batch_service.users().messages().list(**params).execute()
+
+    async def fetch_metadata(self, email_ids: list[str], refresh_labels: bool = False) -> list[dict]:
+        """Fetches headers and labels for the given IDs and stores them in the cache.
+        With refresh_labels, labels of already cached messages are fetched again
+        (format 'minimal'), so read state changed elsewhere shows up.
+        Does not change read state."""
+        missing = [email_id for email_id in email_ids if email_id not in self.cache]
+        cached = [email_id for email_id in email_ids if email_id in self.cache]
+        if missing:
+            messages, _ = await asyncio.to_thread(
+                self.batch_get, missing, format='metadata', metadataHeaders=METADATA_HEADERS
+            )
+            self.cache.put_many([message_from_api(msg) for msg in messages])
+        if refresh_labels and cached:
+            messages, _ = await asyncio.to_thread(self.batch_get, cached, format='minimal')
+            self.cache.set_labels({msg['id']: msg.get('labelIds', []) for msg in messages})
+        return [self.cache.get(email_id) for email_id in email_ids if email_id in self.cache]
+
+    async def sync_recent(self, max_results: int = 500) -> int:
+        """Caches metadata of the most recent messages. Returns number of messages synced."""
+        try:
+            response = await asyncio.to_thread(self.list_page, max_results=max_results)
+            email_ids = [msg['id'] for msg in response.get('messages', [])]
+            await self.fetch_metadata(email_ids)
+            logger.info(f"Synced {len(email_ids)} recent messages, {len(self.contacts)} contacts indexed")
+            return len(email_ids)
+        except HttpError as error:
+            logger.error(f"An HttpError occurred while syncing: {error}")
+            return 0
+
+    async def start_export(self, path: str, export_format: str, query: str = '',
+                           max_messages: int | None = None) -> dict:
+        """Starts (or resumes) a background export of the messages matching query"""
+        if export_format == 'parquet' and not parquet_available():
+            raise ValueError("Parquet export requires pyarrow. Install it with 'pip install pyarrow'.")
+        for job in self.export_jobs.values():
+            if job.path == os.path.abspath(path) and job.status == 'running':
+                return job.summary()
+
+        job = ExportJob(self, path, export_format, query, max_messages)
+        self.export_jobs[job.job_id] = job
+        task = asyncio.create_task(job.run())
+        self._export_tasks.add(task)
+        task.add_done_callback(self._export_tasks.discard)
+        return job.summary()
+
+    async def list_emails(self, query: str = 'in:inbox', page_token: str | None = None,
+                          max_results: int = 25) -> dict | str:
+        """Lists one page of messages with sender, subject, date and snippet.
+        Only metadata is fetched, so read state is unchanged."""
+        try:
+            response = await asyncio.to_thread(self.list_page, query, page_token, max_results)
+            email_ids = [msg['id'] for msg in response.get('messages', [])]
+            entries = await self.fetch_metadata(email_ids, refresh_labels=True)
+            return {
+                'emails': [
+                    {
+                        'id': entry['id'],
+                        'threadId': entry['threadId'],
+                        'from': entry['from'],
+                        'subject': entry['subject'],
+                        'date': entry['date'],
+                        'snippet': entry['snippet'],
+                        'unread': 'UNREAD' in entry['labelIds'],
+                    }
+                    for entry in entries
+                ],
+                'next_page_token': response.get('nextPageToken'),
+            }
+        except HttpError as error:
+            return f"An HttpError occurred: {str(error)}"
+
+    async def prioritize_unread(self, top_k: int = 10) -> list[dict] | str:
+        """Scores every unread message with the local classifier and returns the top K.
+        Only metadata is fetched, so read state is unchanged."""
+        await asyncio.to_thread(self.cache.reload)
+        unread = await self.get_unread_emails()
+        if isinstance(unread, str):
+            return unread
+        unread_ids = [msg['id'] for msg in unread]
+        entries = await self.fetch_metadata(unread_ids)
+
+        # Retrain only when the label history has grown
+        if len(self.cache) != self._triage_cache_size:
+            unread_set = set(unread_ids)
+            history = [entry for entry in self.cache.messages() if entry['id'] not in unread_set]
+            await asyncio.to_thread(self.triage.fit, history)
+            self._triage_cache_size = len(self.cache)
+
+        ranked = self.triage.top_k(entries, top_k)
+        return [
+            {
+                'id': entry['id'],
+                'from': entry['from'],
+                'subject': entry['subject'],
+                'date': entry['date'],
+                'score': round(score, 4),
+            }
+            for entry, score in ranked
+        ]
+
+    async def find_duplicates(self, min_size: int = 3, limit: int = 10) -> list[dict]:
+        """Returns clusters of near-identical cached messages with a few samples each"""
+        await asyncio.to_thread(self.cache.reload)
+        clusters = self.duplicates.clusters(min_size)[:limit]
+        return [
+            {
+                'cluster_id': cluster['cluster_id'],
+                'size': cluster['size'],
+                'samples': self.duplicates.samples(cluster),
+            }
+            for cluster in clusters
+        ]
+
+    def _label_id(self, label_name: str) -> str:
+        """Resolve a user label name to its ID, creating the label if needed (blocking)"""
+        with self._batch_lock:
+            labels = self.batch_service.users().labels().list(userId='me').execute().get('labels', [])
+            for label in labels:
+                if label['name'].lower() == label_name.lower():
+                    return label['id']
+            created = self.batch_service.users().labels().create(
+                userId='me', body={'name': label_name}
+            ).execute()
+            return created['id']
+
+    def _batch_modify(self, email_ids: list[str], add: list[str] = (), remove: list[str] = ()):
+        """Change labels of up to 1000 messages per request (blocking)"""
+        with self._batch_lock:
+            for start in range(0, len(email_ids), 1000):
+                body = {'ids': email_ids[start:start + 1000], 'addLabelIds': list(add), 'removeLabelIds': list(remove)}
+                self.batch_service.users().messages().batchModify(userId='me', body=body).execute()
+        for email_id in email_ids:
+            self.cache.update_labels(email_id, add, remove)
+
+    def _forget_trashed(self, email_ids: list[str]):
+        """Keep the cache and duplicate index in step with messages moved to trash"""
+        for email_id in email_ids:
+            self.cache.update_labels(email_id, add=['TRASH'])
+        self.duplicates.remove(email_ids)
+
+    def _batch_trash(self, email_ids: list[str], batch_size: int = 50) -> list[str]:
+        """Move messages to trash with batched HTTP requests (blocking).
+        Returns the IDs whose sub-request failed."""
+        failed = []
+
+        def callback(request_id, response, exception):
+            if exception is not None:
+                logger.error(f"Trash failed for {request_id}: {exception}")
+                failed.append(request_id)
+
+        with self._batch_lock:
+            for start in range(0, len(email_ids), batch_size):
+                batch = self.batch_service.new_batch_http_request(callback=callback)
+                for email_id in email_ids[start:start + batch_size]:
+                    batch.add(self.batch_service.users().messages().trash(userId='me', id=email_id), request_id=email_id)
+                batch.execute()
+        return failed
+
+    async def cluster_action(self, cluster_id: str, action: str, label_name: str = '') -> str:
+        """Applies one action to every message of a duplicate cluster using batched requests"""
+        await asyncio.to_thread(self.cache.reload)
+        email_ids = self.duplicates.members(cluster_id)
+        if not email_ids:
+            return f"Unknown or empty cluster: {cluster_id}"
+
+        try:
+            if action == 'trash':
+                failed = await asyncio.to_thread(self._batch_trash, email_ids)
+                failed_set = set(failed)
+                self._forget_trashed([email_id for email_id in email_ids if email_id not in failed_set])
+                if failed:
+                    logger.error(f"Trash failed for {len(failed)} of {len(email_ids)} messages in cluster {cluster_id}")
+                    return (f"Moved {len(email_ids) - len(failed)} of {len(email_ids)} messages in cluster {cluster_id} to trash. "
+                            f"Failed: {', '.join(failed)}")
+            elif action == 'mark-read':
+                await asyncio.to_thread(self._batch_modify, email_ids, remove=['UNREAD'])
+            elif action == 'archive':
+                await asyncio.to_thread(self._batch_modify, email_ids, remove=['INBOX'])
+                self.duplicates.remove(email_ids)
+            elif action == 'label':
+                if not label_name:
+                    raise ValueError("Missing label parameter")
+                label_id = await asyncio.to_thread(self._label_id, label_name)
+                await asyncio.to_thread(self._batch_modify, email_ids, add=[label_id])
+            else:
+                raise ValueError(f"Unknown cluster action: {action}. Expected one of {', '.join(CLUSTER_ACTIONS)}")
+            logger.info(f"Applied {action} to {len(email_ids)} messages in cluster {cluster_id}")
+            return f"Applied {action} to {len(email_ids)} messages in cluster {cluster_id}."
+        except HttpError as error:
+            return f"An HttpError occurred: {str(error)}"
+
+    async def lookup_contact(self, query: str, limit: int = 5) -> list[dict]:
+        """Resolves a name or partial address to known contacts using the local index only."""
+        # Other pool members share the cache file; index what they stored meanwhile
+        await asyncio.to_thread(self.cache.reload)
+        return self.contacts.lookup(query, limit)
   
 async def main(creds_file_path: str,
                token_path: str):
     creds_file_path = rf"D:\workspace\code\EAG1\gmail_cred.json"
     token_path = rf"D:\workspace\code\EAG1\application_token\app_tokens.json"
-    gmail_service = GmailService(creds_file_path, token_path)
+    cache_path = os.path.join(os.path.dirname(token_path), 'gmail_cache.sqlite3')
+    gmail_service = GmailService(creds_file_path, token_path, cache_path=cache_path)
     server = Server("gmail")
 
+    # Warm the local cache (and contact index) without blocking startup.
+    # Pool members share the cache file, so only the first one syncs.
+    sync_task = None
+    if os.getenv('GMAIL_STARTUP_SYNC', '1') != '0':
+        sync_task = asyncio.create_task(gmail_service.sync_recent())
+
     @server.list_prompts()
     async def list_prompts() -> list[types.Prompt]:
         return list(PROMPTS.values())
@@ -315,7 +719,7 @@ async def main(creds_file_path: str,
                         content=types.TextContent(
                             type="text",
                             text=f"""Please draft an email about {content} for {recipient} ({recipient_email}).
-                            Include a subject line starting with 'Subject:' on the first line.
+                            Save it with the create-draft tool and keep the returned draft ID.
                             Do not send the email yet, just draft it and ask the user for their thoughts."""
                         )
                     )
@@ -323,23 +727,23 @@ async def main(creds_file_path: str,
             )
         
         elif name == "edit-draft":
+            draft_id = arguments.get("draft_id", "")
             changes = arguments.get("changes", "")
-            current_draft = arguments.get("current_draft", "")
             
-            # Edit existing draft based on requested changes
+            # The draft stays on the server; only the requested changes go through the model
             return types.GetPromptResult(
                 messages=[
                     types.PromptMessage(
                         role="user",
                         content=types.TextContent(
                             type="text",
-                            text=f"""Please revise the current email draft:
-                            {current_draft}
+                            text=f"""Please revise email draft {draft_id}.
                             
                             Requested changes:
                             {changes}
                             
-                            Please provide the updated draft."""
+                            Apply them with update-draft, one operation per call, addressing paragraphs by index.
+                            Use get-draft only if you need to see the paragraph text."""
                         )
                     )
                 ]
@@ -400,7 +804,8 @@ async def main(creds_file_path: str,
             ),
             types.Tool(
                 name="read-email",
-                description="Retrieves given email content",
+                description="""Retrieves given email content.
+                The body is returned as plain text without quoted history or signature.""",
                 inputSchema={
                     "type": "object",
                     "properties": {
@@ -408,6 +813,14 @@ async def main(creds_file_path: str,
                             "type": "string",
                             "description": "Email ID",
                         },
+                        "max_tokens": {
+                            "type": "integer",
+                            "description": f"Approximate token budget for the body (default {DEFAULT_MAX_TOKENS}, 0 for no limit)",
+                        },
+                        "mark_read": {
+                            "type": "boolean",
+                            "description": "Mark the email as read (default true)",
+                        },
                     },
                     "required": ["email_id"],
                 },
@@ -440,6 +853,231 @@ async def main(creds_file_path: str,
                     "required": ["email_id"],
                 },
             ),
+            types.Tool(
+                name="lookup-contact",
+                description="""Finds email addresses of people the user has corresponded with.
+                Use before send-email when only a name or description is known, e.g. "Priya from finance".""",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "query": {
+                            "type": "string",
+                            "description": "Name, partial address or description of the contact",
+                        },
+                        "limit": {
+                            "type": "integer",
+                            "description": "Maximum number of matches (default 5)",
+                        },
+                    },
+                    "required": ["query"],
+                },
+            ),
+            types.Tool(
+                name="create-draft",
+                description="""Saves a new email draft in the mailbox without sending it.
+                Returns the draft ID and a one-line-per-paragraph outline.""",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "recipient_id": {
+                            "type": "string",
+                            "description": "Recipient email address",
+                        },
+                        "subject": {
+                            "type": "string",
+                            "description": "Email subject",
+                        },
+                        "message": {
+                            "type": "string",
+                            "description": "Email content text, paragraphs separated by blank lines",
+                        },
+                    },
+                    "required": ["recipient_id", "subject", "message"],
+                },
+            ),
+            types.Tool(
+                name="update-draft",
+                description=f"""Applies one small edit to a saved draft instead of resending the whole text.
+                Operations: {', '.join(EDIT_OPERATIONS)}.
+                Paragraph operations take a zero-based paragraph index.""",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "draft_id": {
+                            "type": "string",
+                            "description": "Draft ID",
+                        },
+                        "operation": {
+                            "type": "string",
+                            "enum": EDIT_OPERATIONS,
+                            "description": "Edit operation",
+                        },
+                        "text": {
+                            "type": "string",
+                            "description": "New subject, recipient or paragraph text (empty for delete_paragraph)",
+                        },
+                        "index": {
+                            "type": "integer",
+                            "description": "Paragraph index for paragraph operations",
+                        },
+                    },
+                    "required": ["draft_id", "operation"],
+                },
+            ),
+            types.Tool(
+                name="get-draft",
+                description="Shows a saved draft with numbered paragraphs",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "draft_id": {
+                            "type": "string",
+                            "description": "Draft ID",
+                        },
+                    },
+                    "required": ["draft_id"],
+                },
+            ),
+            types.Tool(
+                name="send-draft",
+                description="""Sends a saved draft by ID. 
+                Drafts must be approved before sending.""",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "draft_id": {
+                            "type": "string",
+                            "description": "Draft ID",
+                        },
+                    },
+                    "required": ["draft_id"],
+                },
+            ),
+            types.Tool(
+                name="export-mailbox",
+                description=f"""Exports messages matching a Gmail search query to a local file in the background.
+                Formats: {', '.join(EXPORT_FORMATS)}. Does not mark messages as read.
+                Starting an export again with the same path resumes it. Returns a job ID.""",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "path": {
+                            "type": "string",
+                            "description": "Output file (directory for parquet)",
+                        },
+                        "format": {
+                            "type": "string",
+                            "enum": EXPORT_FORMATS,
+                            "description": "Output format",
+                        },
+                        "query": {
+                            "type": "string",
+                            "description": "Gmail search query, empty for the whole mailbox",
+                        },
+                        "max_messages": {
+                            "type": "integer",
+                            "description": "Stop after this many messages",
+                        },
+                    },
+                    "required": ["path", "format"],
+                },
+            ),
+            types.Tool(
+                name="export-status",
+                description="Reports progress of an export job",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "job_id": {
+                            "type": "string",
+                            "description": "Export job ID",
+                        },
+                    },
+                    "required": ["job_id"],
+                },
+            ),
+            types.Tool(
+                name="list-emails",
+                description="""Lists one page of emails with sender, subject, date and snippet, newest first.
+                Does not mark anything as read. Pass next_page_token from the previous page to continue.""",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "query": {
+                            "type": "string",
+                            "description": "Gmail search query (default in:inbox)",
+                        },
+                        "max_results": {
+                            "type": "integer",
+                            "description": "Messages per page, up to 100 (default 25)",
+                        },
+                        "page_token": {
+                            "type": "string",
+                            "description": "Token of the page to fetch, from next_page_token",
+                        },
+                    },
+                    "required": []
+                },
+            ),
+            types.Tool(
+                name="prioritize-unread",
+                description="""Ranks all unread emails with a local classifier trained on the user's label history.
+                Returns the top K message IDs with sender, subject and a priority score between 0 and 1.
+                Use this instead of reading every unread email.""",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "top_k": {
+                            "type": "integer",
+                            "description": "Number of messages to return (default 10)",
+                        },
+                    },
+                    "required": []
+                },
+            ),
+            types.Tool(
+                name="find-duplicates",
+                description="""Finds clusters of near-identical emails (newsletters, alert storms, CI notifications).
+                Returns cluster IDs with sizes and a few sample messages. Use cluster-action to handle a whole cluster.""",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "min_size": {
+                            "type": "integer",
+                            "description": "Smallest cluster to report (default 3)",
+                        },
+                        "limit": {
+                            "type": "integer",
+                            "description": "Maximum number of clusters (default 10)",
+                        },
+                    },
+                    "required": []
+                },
+            ),
+            types.Tool(
+                name="cluster-action",
+                description=f"""Applies one action to every email in a duplicate cluster with batched requests.
+                Actions: {', '.join(CLUSTER_ACTIONS)}. Confirm with the user before trashing.""",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "cluster_id": {
+                            "type": "string",
+                            "description": "Cluster ID from find-duplicates",
+                        },
+                        "action": {
+                            "type": "string",
+                            "enum": CLUSTER_ACTIONS,
+                            "description": "Action to apply",
+                        },
+                        "label": {
+                            "type": "string",
+                            "description": "Label name for the label action",
+                        },
+                    },
+                    "required": ["cluster_id", "action"],
+                },
+            ),
         ]
 
     @server.call_tool()
@@ -477,15 +1115,20 @@ async def main(creds_file_path: str,
         if name == "get-unread-emails":
                 
             unread_emails = await gmail_service.get_unread_emails()
-            return [types.TextContent(type="text", text=str(unread_emails),artifact={"type": "json", "data": unread_emails} )]
+            return data_content(unread_emails, "json")
         
         if name == "read-email":
             email_id = arguments.get("email_id")
             if not email_id:
                 raise ValueError("Missing email ID parameter")
                 
-            retrieved_email = await gmail_service.read_email(email_id)
-            return [types.TextContent(type="text", text=str(retrieved_email),artifact={"type": "dictionary", "data": retrieved_email} )]
+            max_tokens = arguments.get("max_tokens")
+            if max_tokens is None or max_tokens == "":
+                max_tokens = DEFAULT_MAX_TOKENS
+            # Positional calls from the model pass booleans as text
+            mark_read = str(arguments.get("mark_read", True)).lower() not in ("false", "0", "no")
+            retrieved_email = await gmail_service.read_email(email_id, int(max_tokens), mark_read)
+            return data_content(retrieved_email, "dictionary")
         if name == "open-email":
             email_id = arguments.get("email_id")
             if not email_id:
@@ -507,23 +1150,145 @@ async def main(creds_file_path: str,
                 
             msg = await gmail_service.mark_email_as_read(email_id)
             return [types.TextContent(type="text", text=str(msg))]
+        if name == "lookup-contact":
+            query = arguments.get("query")
+            if not query:
+                raise ValueError("Missing query parameter")
+
+            matches = await gmail_service.lookup_contact(query, int(arguments.get("limit") or 5))
+            if not matches:
+                return [types.TextContent(type="text", text=f"No known contacts match '{query}'.")]
+            return data_content(matches, "json")
+        if name == "create-draft":
+            recipient = arguments.get("recipient_id")
+            if not recipient:
+                raise ValueError("Missing recipient parameter")
+            subject = arguments.get("subject")
+            if not subject:
+                raise ValueError("Missing subject parameter")
+            message = arguments.get("message")
+            if not message:
+                raise ValueError("Missing message parameter")
+
+            draft_response = await gmail_service.create_draft(recipient, subject, message)
+            if draft_response["status"] == "success":
+                response_text = f"Draft saved. Draft ID: {draft_response['draft_id']}\n{draft_response['outline']}"
+            else:
+                response_text = f"Failed to save draft: {draft_response['error_message']}"
+            return [types.TextContent(type="text", text=response_text)]
+        if name == "update-draft":
+            draft_id = arguments.get("draft_id")
+            if not draft_id:
+                raise ValueError("Missing draft ID parameter")
+            operation = arguments.get("operation")
+            if not operation:
+                raise ValueError("Missing operation parameter")
+            index = arguments.get("index")
+            if index is not None and index != "":
+                index = int(index)
+            else:
+                index = None
+
+            msg = await gmail_service.edit_draft(draft_id, operation, arguments.get("text") or "", index)
+            return [types.TextContent(type="text", text=str(msg))]
+        if name == "get-draft":
+            draft_id = arguments.get("draft_id")
+            if not draft_id:
+                raise ValueError("Missing draft ID parameter")
+
+            msg = await gmail_service.get_draft(draft_id)
+            return [types.TextContent(type="text", text=str(msg))]
+        if name == "send-draft":
+            draft_id = arguments.get("draft_id")
+            if not draft_id:
+                raise ValueError("Missing draft ID parameter")
+
+            send_response = await gmail_service.send_draft(draft_id)
+            if send_response["status"] == "success":
+                response_text = f"Draft sent successfully. Message ID: {send_response['message_id']}"
+            else:
+                response_text = f"Failed to send draft: {send_response['error_message']}"
+            return [types.TextContent(type="text", text=response_text)]
+        if name == "export-mailbox":
+            path = arguments.get("path")
+            if not path:
+                raise ValueError("Missing path parameter")
+            export_format = arguments.get("format")
+            if not export_format:
+                raise ValueError("Missing format parameter")
+            max_messages = arguments.get("max_messages")
+            max_messages = int(max_messages) if max_messages not in (None, "") else None
+
+            job = await gmail_service.start_export(path, export_format, arguments.get("query") or "", max_messages)
+            return data_content(job, "dictionary")
+        if name == "export-status":
+            job_id = arguments.get("job_id")
+            if not job_id:
+                raise ValueError("Missing job ID parameter")
+            if job_id not in gmail_service.export_jobs:
+                raise ValueError(f"Unknown export job: {job_id}")
+
+            job = gmail_service.export_jobs[job_id].summary()
+            return data_content(job, "dictionary")
+        if name == "list-emails":
+            arguments = arguments or {}
+            max_results = arguments.get("max_results")
+            max_results = min(int(max_results), 100) if max_results not in (None, "") else 25
+
+            page = await gmail_service.list_emails(
+                arguments.get("query") or "in:inbox", arguments.get("page_token") or None, max_results
+            )
+            return data_content(page, "dictionary")
+        if name == "prioritize-unread":
+            top_k = arguments.get("top_k") if arguments else None
+            top_k = int(top_k) if top_k not in (None, "") else 10
+
+            ranked = await gmail_service.prioritize_unread(top_k)
+            return data_content(ranked, "json")
+        if name == "find-duplicates":
+            arguments = arguments or {}
+            min_size = arguments.get("min_size")
+            min_size = int(min_size) if min_size not in (None, "") else 3
+            limit = arguments.get("limit")
+            limit = int(limit) if limit not in (None, "") else 10
+
+            clusters = await gmail_service.find_duplicates(min_size, limit)
+            if not clusters:
+                return [types.TextContent(type="text", text="No duplicate clusters found.")]
+            return data_content(clusters, "json")
+        if name == "cluster-action":
+            cluster_id = arguments.get("cluster_id")
+            if not cluster_id:
+                raise ValueError("Missing cluster ID parameter")
+            action = arguments.get("action")
+            if not action:
+                raise ValueError("Missing action parameter")
+
+            msg = await gmail_service.cluster_action(cluster_id, action, arguments.get("label") or "")
+            return [types.TextContent(type="text", text=str(msg))]
         else:
             logger.error(f"Unknown tool: {name}")
             raise ValueError(f"Unknown tool: {name}")
 
-    async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
-        await server.run(
-            read_stream,
-            write_stream,
-            InitializationOptions(
-                server_name="gmail",
-                server_version="0.1.0",
-                capabilities=server.get_capabilities(
-                    notification_options=NotificationOptions(),
-                    experimental_capabilities={},
+    try:
+        async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
+            await server.run(
+                read_stream,
+                write_stream,
+                InitializationOptions(
+                    server_name="gmail",
+                    server_version="0.1.0",
+                    capabilities=server.get_capabilities(
+                        notification_options=NotificationOptions(),
+                        experimental_capabilities={},
+                    ),
                 ),
-            ),
-        )
+            )
+    finally:
+        # A client that disconnects before the sync finishes should not leave it running
+        if sync_task and not sync_task.done():
+            sync_task.cancel()
+            await asyncio.gather(sync_task, return_exceptions=True)
 
 if __name__ == "__main__":
     # Get credentials from project directory or environment variables
@@ -3,24 +3,51 @@ document.addEventListener('DOMContentLoaded', function() {
     const userInput = document.getElementById('userInput');
     const sendButton = document.getElementById('sendButton');
     const statusBar = document.getElementById('statusBar');
+    const inboxList = document.getElementById('inboxList');
+    const loadMoreButton = document.getElementById('loadMore');
+    const refreshInboxButton = document.getElementById('refreshInbox');
     
-    // Check connection to server
-    checkServerConnection();
+    // Cursor of the next inbox page; null once the last page is shown
+    let inboxCursor = null;
     
-    // Add initial greeting message
-    appendMessage('Email Assistant', `Hello! I'm your email assistant. I can help you manage your emails.
-
-You can ask me to:
-- Read your unread emails
-- Draft emails for you
-- Send emails
-- Trash emails
-- Open emails in your browser
-
-What would you like to do today?`, 'assistant');
+    // Conversation is virtualized: every message lives in this list, but only
+    // the ones near the visible part of the conversation have DOM elements.
+    // Spacers above and below stand in for the height of the rest.
+    const messages = [];
+    const topSpacer = document.createElement('div');
+    const messageWindow = document.createElement('div');
+    const bottomSpacer = document.createElement('div');
+    conversationArea.append(topSpacer, messageWindow, bottomSpacer);
+    
+    // Pixels rendered beyond the visible area, so scrolling does not show gaps
+    const OVERSCAN = 800;
+    // Results longer than this are shown truncated until expanded
+    const COLLAPSE_CHARS = 2000;
+    const COLLAPSE_LINES = 25;
+    
+    let renderScheduled = false;
+    // Range of messages that currently have elements
+    let windowStart = 0;
+    let windowEnd = 0;
+    // Follow new messages while the user is at the bottom of the conversation
+    let stickToBottom = true;
+    
+    // Show where the conversation left off (or greet a new user), then connect
+    loadHistory().finally(checkServerConnection);
     
     // Event listeners
     sendButton.addEventListener('click', sendMessage);
+    loadMoreButton.addEventListener('click', () => loadInbox(inboxCursor));
+    refreshInboxButton.addEventListener('click', () => loadInbox(null));
+    conversationArea.addEventListener('scroll', function() {
+        stickToBottom = conversationArea.scrollTop + conversationArea.clientHeight >= conversationArea.scrollHeight - 20;
+        scheduleRender();
+    });
+    window.addEventListener('resize', function() {
+        // Wrapping changed, so measured heights are stale
+        messages.forEach(message => { message.height = null; });
+        scheduleRender();
+    });
     userInput.addEventListener('keydown', function(e) {
         // Send message with Ctrl+Enter
         if (e.ctrlKey && e.key === 'Enter') {
@@ -29,6 +56,33 @@ What would you like to do today?`, 'assistant');
         }
     });
     
+    function loadHistory() {
+        return fetchJson('/api/history')
+            .then(data => {
+                if (!data.turns.length) {
+                    showGreeting();
+                    return;
+                }
+                const types = { 'You': 'you', 'Assistant': 'assistant', 'System': 'system' };
+                data.turns.forEach(turn => appendMessage(turn.sender, turn.message, types[turn.sender] || 'system'));
+                appendMessage('System', 'Resumed the previous conversation.', 'system');
+            })
+            .catch(showGreeting);
+    }
+    
+    function showGreeting() {
+        appendMessage('Email Assistant', `Hello! I'm your email assistant. I can help you manage your emails.
+
+You can ask me to:
+- Read your unread emails
+- Draft emails for you
+- Send emails
+- Trash emails
+- Open emails in your browser
+
+What would you like to do today?`, 'assistant');
+    }
+    
     function checkServerConnection() {
         setStatus('Connecting to email server...');
         appendMessage('System', 'Initializing connection to email server...', 'system');
@@ -40,6 +94,7 @@ What would you like to do today?`, 'assistant');
         .then(data => {
             if (data.success) {
                 setStatus(`Ready - Connected with ${data.toolCount} available tools`);
+                loadInbox(null);
             } else {
                 setStatus('Failed to connect to server');
                 appendMessage('System', `Failed to connect to email server: ${data.error}`, 'system');
@@ -51,6 +106,86 @@ What would you like to do today?`, 'assistant');
         });
     }
     
+    function loadInbox(cursor) {
+        // Plain data endpoints: no LLM round trip, and the browser revalidates with ETags
+        const url = cursor ? `/api/emails?cursor=${encodeURIComponent(cursor)}` : '/api/emails';
+        loadMoreButton.disabled = true;
+        
+        fetchJson(url)
+            .then(data => {
+                if (!cursor) {
+                    inboxList.innerHTML = '';
+                }
+                data.emails.forEach(email => inboxList.appendChild(createInboxItem(email)));
+                inboxCursor = data.nextCursor;
+                loadMoreButton.hidden = !inboxCursor;
+            })
+            .catch(error => {
+                setStatus(`Could not load inbox: ${error.message}`);
+            })
+            .finally(() => {
+                loadMoreButton.disabled = false;
+            });
+    }
+    
+    function fetchJson(url) {
+        return fetch(url).then(response => response.json().then(data => {
+            if (!response.ok) {
+                throw new Error(data.error || `Request failed (${response.status})`);
+            }
+            return data;
+        }));
+    }
+    
+    function createInboxItem(email) {
+        const item = document.createElement('li');
+        item.className = email.unread ? 'inbox-item unread' : 'inbox-item';
+        item.title = email.date;
+        
+        const from = document.createElement('div');
+        from.className = 'inbox-from';
+        from.textContent = email.from;
+        
+        const subject = document.createElement('div');
+        subject.className = 'inbox-subject';
+        subject.textContent = email.subject || '(no subject)';
+        
+        const snippet = document.createElement('div');
+        snippet.className = 'inbox-snippet';
+        snippet.textContent = email.snippet;
+        
+        item.appendChild(from);
+        item.appendChild(subject);
+        item.appendChild(snippet);
+        item.addEventListener('click', () => openEmail(email.id, item));
+        return item;
+    }
+    
+    function openEmail(emailId, item) {
+        setStatus('Opening email...');
+        fetchJson(`/api/emails/${encodeURIComponent(emailId)}`)
+            .then(email => {
+                // Fetching leaves read state alone; opening it marks it read
+                fetch(`/api/emails/${encodeURIComponent(emailId)}/read`, { method: 'POST' })
+                    .then(response => {
+                        if (response.ok) {
+                            item.classList.remove('unread');
+                        }
+                    });
+                appendMessage(`Email ${emailId}`, `From: ${email.from}
+To: ${email.to}
+Date: ${email.date}
+Subject: ${email.subject}
+
+${email.content}`, 'email');
+                setStatus('Ready');
+            })
+            .catch(error => {
+                appendMessage('System', `Error opening email: ${error.message}`, 'system');
+                setStatus('Ready');
+            });
+    }
+    
     function sendMessage() {
         const message = userInput.value.trim();
         if (!message) return;
@@ -61,8 +196,16 @@ What would you like to do today?`, 'assistant');
         // Clear input
         userInput.value = '';
         
-        // Send to server
+        // Send to server, streaming the answer when the browser supports it
         setStatus('Processing...');
+        if (window.ReadableStream && window.TextDecoder) {
+            streamMessage(message).catch(() => processMessage(message));
+        } else {
+            processMessage(message);
+        }
+    }
+    
+    function processMessage(message) {
         fetch('/api/process', {
             method: 'POST',
             headers: {
@@ -81,8 +224,11 @@ What would you like to do today?`, 'assistant');
                 }
                 appendMessage('System', `Executing: ${data.functionName}`, 'system');
                 
-                // Poll for function execution results
-                pollFunctionResult(data.executionId);
+                // Stream function execution results (polling is the fallback)
+                watchFunctionResult(data.executionId);
+            }
+            else if (data.type === 'error') {
+                appendMessage('System', `Error processing message: ${data.error}`, 'system');
             }
             setStatus('Ready');
         })
@@ -92,26 +238,140 @@ What would you like to do today?`, 'assistant');
         });
     }
     
-    function pollFunctionResult(executionId) {
+    async function streamMessage(message) {
+        const response = await fetch('/api/process/stream', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({ message: message })
+        });
+        if (!response.ok || !response.body) {
+            throw new Error(`Streaming unavailable (${response.status})`);
+        }
+        
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let answer = null;
+        let answerText = '';
+        let calling = false;
+        
+        // Errors past this point are reported, not retried, since a tool may already be running
+        try {
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                
+                // Each complete line is one JSON event
+                let newline;
+                while ((newline = buffer.indexOf('\n')) !== -1) {
+                    const line = buffer.slice(0, newline).trim();
+                    buffer = buffer.slice(newline + 1);
+                    if (!line) continue;
+                    
+                    const data = JSON.parse(line);
+                    if (data.type === 'text') {
+                        answerText += data.content;
+                        if (!answerText.trim()) continue;
+                        if (!answer) {
+                            answer = appendMessage('Assistant', '', 'assistant');
+                        }
+                        updateMessage(answer, answerText.trim());
+                    } else if (data.type === 'function_call') {
+                        appendMessage('System', `Executing: ${data.functionName}`, 'system');
+                        // Several calls in one answer share one execution
+                        if (!calling) {
+                            watchFunctionResult(data.executionId);
+                        }
+                        calling = true;
+                        // Text after the call goes into a new message below it
+                        answer = null;
+                        answerText = '';
+                    } else if (data.type === 'error') {
+                        appendMessage('System', `Error processing message: ${data.error}`, 'system');
+                    }
+                }
+            }
+        } catch (error) {
+            appendMessage('System', `Error processing message: ${error.message}`, 'system');
+        }
+        if (!calling) {
+            setStatus('Ready');
+        }
+    }
+    
+    function watchFunctionResult(executionId) {
+        // Shared by the stream and the polling fallback so each update is shown once
+        const state = { stepsShown: 0, finished: false, live: null };
+        
+        if (!window.EventSource) {
+            pollFunctionResult(executionId, state);
+            return;
+        }
+        
+        const source = new EventSource(`/api/function_result/${executionId}/stream`);
+        source.onmessage = function(event) {
+            handleFunctionResult(JSON.parse(event.data), state);
+            if (state.finished) {
+                source.close();
+            }
+        };
+        source.onerror = function() {
+            // Stream unavailable or dropped: fall back to polling
+            source.close();
+            if (!state.finished) {
+                pollFunctionResult(executionId, state);
+            }
+        };
+    }
+    
+    function handleFunctionResult(data, state) {
+        const steps = data.steps || [];
+        while (state.stepsShown < steps.length) {
+            // Show each tool result as soon as it returns; the text streamed
+            // before it was the model's explanation, so start a new bubble
+            const step = steps[state.stepsShown++];
+            appendMessage('System', `Result from ${step.functionName}:\n${step.result}`, 'system');
+            state.live = null;
+        }
+        
+        if (data.status === 'processing') {
+            setStatus(`Processing... ${steps.length} tool call${steps.length === 1 ? '' : 's'} done`);
+        }
+        
+        if (data.status === 'processing' && data.processedResult) {
+            // Interpretation is still being generated: grow it in place
+            if (!state.live) {
+                state.live = appendMessage('Assistant', '', 'assistant');
+            }
+            updateMessage(state.live, data.processedResult);
+        } else if (data.status === 'completed') {
+            // Show processed result if available
+            if (data.processedResult) {
+                if (state.live) {
+                    updateMessage(state.live, data.processedResult);
+                } else {
+                    appendMessage('Assistant', data.processedResult, 'assistant');
+                }
+            }
+            state.finished = true;
+            setStatus('Ready');
+        } else if (data.status === 'error') {
+            appendMessage('System', `Error executing ${data.functionName}: ${data.error}`, 'system');
+            state.finished = true;
+            setStatus('Ready');
+        }
+    }
+    
+    function pollFunctionResult(executionId, state) {
         const checkResult = () => {
             fetch(`/api/function_result/${executionId}`)
                 .then(response => response.json())
                 .then(data => {
-                    if (data.status === 'completed') {
-                        // Show raw result
-                        if (data.rawResult) {
-                            appendMessage('System', `Result from ${data.functionName}:\n${data.rawResult}`, 'system');
-                        }
-                        
-                        // Show processed result if available
-                        if (data.processedResult) {
-                            appendMessage('Assistant', data.processedResult, 'assistant');
-                        }
-                        setStatus('Ready');
-                    } else if (data.status === 'error') {
-                        appendMessage('System', `Error executing ${data.functionName}: ${data.error}`, 'system');
-                        setStatus('Ready');
-                    } else {
+                    handleFunctionResult(data, state);
+                    if (!state.finished) {
                         // Still processing, check again after a delay
                         setTimeout(checkResult, 1000);
                     }
@@ -127,24 +387,162 @@ What would you like to do today?`, 'assistant');
     }
     
     function appendMessage(sender, content, type) {
+        const message = {
+            sender: sender,
+            content: content,
+            type: type,
+            // Tool results and emails can be huge; they start collapsed
+            collapsible: type === 'system' || type === 'email',
+            expanded: false,
+            height: null,
+            estimate: null,
+            element: null,
+            dirty: true
+        };
+        messages.push(message);
+        scrollToBottom();
+        
+        // Returned so streamed messages can be updated in place
+        return message;
+    }
+    
+    function updateMessage(message, content) {
+        // Streamed chunks only mark the message; the next frame renders the latest text once
+        message.content = content;
+        message.estimate = null;
+        message.dirty = true;
+        scheduleRender();
+    }
+    
+    function scrollToBottom() {
+        stickToBottom = true;
+        scheduleRender();
+    }
+    
+    function scheduleRender() {
+        // All changes within one frame are applied in a single DOM update
+        if (!renderScheduled) {
+            renderScheduled = true;
+            requestAnimationFrame(render);
+        }
+    }
+    
+    function estimateHeight(message) {
+        // Stand-in until the message is rendered and measured
+        if (message.estimate === null) {
+            message.estimate = 50 + visibleText(message).split('\n').length * 21;
+        }
+        return message.estimate;
+    }
+    
+    function render() {
+        renderScheduled = false;
+        
+        const heights = messages.map(message => message.height || estimateHeight(message));
+        const total = heights.reduce((sum, height) => sum + height, 0);
+        const viewHeight = conversationArea.clientHeight;
+        const scrollTop = stickToBottom ? Math.max(0, total - viewHeight) : conversationArea.scrollTop;
+        
+        // Find the messages overlapping the visible area plus the overscan
+        let first = 0;
+        let offset = 0;
+        while (first < messages.length && offset + heights[first] < scrollTop - OVERSCAN) {
+            offset += heights[first++];
+        }
+        const top = offset;
+        let last = first;
+        while (last < messages.length && offset < scrollTop + viewHeight + OVERSCAN) {
+            offset += heights[last++];
+        }
+        
+        // Messages scrolled out of range give up their elements
+        for (let index = windowStart; index < windowEnd; index++) {
+            if (index < first || index >= last) {
+                messages[index].element = null;
+                messages[index].dirty = true;
+            }
+        }
+        windowStart = first;
+        windowEnd = last;
+        
+        const elements = [];
+        for (let index = first; index < last; index++) {
+            const message = messages[index];
+            if (!message.element) {
+                message.element = createMessageElement(message);
+            }
+            if (message.dirty) {
+                renderContent(message);
+            }
+            elements.push(message.element);
+        }
+        
+        topSpacer.style.height = `${top}px`;
+        bottomSpacer.style.height = `${total - offset}px`;
+        messageWindow.replaceChildren(...elements);
+        
+        // One layout pass for the whole window: record real heights for later frames
+        for (let index = first; index < last; index++) {
+            messages[index].height = messages[index].element.offsetHeight;
+        }
+        if (stickToBottom) {
+            conversationArea.scrollTop = conversationArea.scrollHeight;
+        }
+    }
+    
+    function createMessageElement(message) {
         const messageDiv = document.createElement('div');
-        messageDiv.className = `message ${type}-message`;
+        messageDiv.className = `message ${message.type}-message`;
         
         const senderDiv = document.createElement('div');
-        senderDiv.className = `sender ${type}`;
-        senderDiv.textContent = sender;
+        senderDiv.className = `sender ${message.type}`;
+        senderDiv.textContent = message.sender;
         
         const contentDiv = document.createElement('div');
         contentDiv.className = 'message-content';
-        contentDiv.textContent = content;
         
         messageDiv.appendChild(senderDiv);
         messageDiv.appendChild(contentDiv);
+        return messageDiv;
+    }
+    
+    function isCollapsed(message) {
+        return message.collapsible && !message.expanded &&
+            (message.content.length > COLLAPSE_CHARS || message.content.split('\n', COLLAPSE_LINES + 1).length > COLLAPSE_LINES);
+    }
+    
+    function visibleText(message) {
+        if (!isCollapsed(message)) {
+            return message.content;
+        }
+        return message.content.split('\n', COLLAPSE_LINES).join('\n').slice(0, COLLAPSE_CHARS);
+    }
+    
+    function renderContent(message) {
+        message.dirty = false;
+        const messageDiv = message.element;
+        messageDiv.querySelector('.message-content').textContent = visibleText(message);
         
-        conversationArea.appendChild(messageDiv);
+        const oldToggle = messageDiv.querySelector('.toggle-content');
+        if (oldToggle) {
+            oldToggle.remove();
+        }
+        if (!isCollapsed(message) && !message.expanded) {
+            return;
+        }
         
-        // Scroll to bottom
-        conversationArea.scrollTop = conversationArea.scrollHeight;
+        const toggle = document.createElement('button');
+        toggle.className = 'toggle-content';
+        toggle.textContent = message.expanded
+            ? 'Show less'
+            : `Show all (${message.content.length - visibleText(message).length} more characters)`;
+        toggle.addEventListener('click', function() {
+            message.expanded = !message.expanded;
+            message.estimate = null;
+            message.dirty = true;
+            scheduleRender();
+        });
+        messageDiv.appendChild(toggle);
     }
     
     function setStatus(message) {
@@ -0,0 +1,89 @@
+import re
+import zlib
+from email.utils import parseaddr
+
+import numpy as np
+
+# Labels that mark a message as one the user cares about
+PRIORITY_LABELS = {'IMPORTANT', 'STARRED'}
+# Labels that are not evidence either way and are never used as features
+IGNORED_LABELS = PRIORITY_LABELS | {'UNREAD', 'INBOX', 'SENT', 'DRAFT'}
+
+WORD = re.compile(r"[a-z0-9][a-z0-9'-]{1,30}")
+
+
+def message_tokens(entry: dict) -> list[str]:
+    """Prefixed header, label and body tokens for one cached message"""
+    address = parseaddr(entry.get('from', ''))[1].lower()
+    tokens = ['__bias__']
+    if address:
+        tokens.append(f"from:{address}")
+        tokens.append(f"domain:{address.partition('@')[2]}")
+    tokens.extend(f"label:{label}" for label in entry.get('labelIds', []) if label not in IGNORED_LABELS)
+    tokens.extend(f"subject:{word}" for word in WORD.findall(entry.get('subject', '').lower()))
+    text = entry.get('body') or entry.get('snippet') or ''
+    tokens.extend(f"body:{word}" for word in WORD.findall(text[:2000].lower()))
+    return tokens
+
+
+class TriageClassifier:
+    """Multinomial naive Bayes over hashed message tokens.
+
+    Training data comes from the user's own label history: cached messages
+    that are read and marked IMPORTANT or STARRED are positives, other read
+    inbound messages are negatives. Scoring hashes every message once and
+    computes all scores with a single gather and reduceat over flat arrays.
+    """
+
+    def __init__(self, n_features: int = 2 ** 18, alpha: float = 1.0):
+        self.n_features = n_features
+        self.alpha = alpha
+        self.weights = np.zeros(n_features)
+        self.bias = 0.0
+        self.trained_on = 0
+
+    def _hash(self, entries: list[dict]) -> tuple[np.ndarray, np.ndarray]:
+        """Flat feature index array plus the start offset of each message"""
+        indices = []
+        offsets = np.zeros(len(entries), dtype=np.int64)
+        mask = self.n_features - 1
+        for row, entry in enumerate(entries):
+            offsets[row] = len(indices)
+            indices.extend(zlib.crc32(token.encode()) & mask for token in message_tokens(entry))
+        return np.asarray(indices, dtype=np.int64), offsets
+
+    def fit(self, entries: list[dict]) -> 'TriageClassifier':
+        training = [
+            entry for entry in entries
+            if 'UNREAD' not in entry['labelIds'] and 'SENT' not in entry['labelIds'] and 'DRAFT' not in entry['labelIds']
+        ]
+        labels = np.array([bool(PRIORITY_LABELS & set(entry['labelIds'])) for entry in training])
+        self.trained_on = len(training)
+        if not labels.any() or labels.all():
+            # One class only: nothing to learn, every message scores the same
+            self.weights = np.zeros(self.n_features)
+            self.bias = 0.0
+            return self
+
+        indices, offsets = self._hash(training)
+        lengths = np.diff(np.append(offsets, len(indices)))
+        row_labels = np.repeat(labels, lengths)
+
+        positive = np.bincount(indices[row_labels], minlength=self.n_features) + self.alpha
+        negative = np.bincount(indices[~row_labels], minlength=self.n_features) + self.alpha
+        self.weights = np.log(positive / positive.sum()) - np.log(negative / negative.sum())
+        self.bias = float(np.log(labels.mean()) - np.log(1 - labels.mean()))
+        return self
+
+    def score(self, entries: list[dict]) -> np.ndarray:
+        """Probability that each message is a priority message"""
+        if not entries:
+            return np.zeros(0)
+        indices, offsets = self._hash(entries)
+        logits = np.add.reduceat(self.weights[indices], offsets) + self.bias
+        return 1 / (1 + np.exp(-np.clip(logits, -50, 50)))
+
+    def top_k(self, entries: list[dict], k: int = 10) -> list[tuple[dict, float]]:
+        scores = self.score(entries)
+        order = np.argsort(-scores, kind='stable')[:k]
+        return [(entries[i], float(scores[i])) for i in order]
@@ -0,0 +1,115 @@
+import asyncio
+import hashlib
+import json
+import os
+
+from mcp import StdioServerParameters
+
+from function_calls import build_arguments, result_to_text
+from mcp_pool import MCPSessionPool
+
+# Pieces shared by the Flask (app.py) and ASGI (asgi_app.py) web backends. Both
+# run these coroutines on the event loop that owns their MCP session pool.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def create_session_pool() -> MCPSessionPool:
+    """Pool of MCP server sessions, not yet started"""
+    venv_python_path = os.path.abspath(os.path.join(BASE_DIR, '..', '..', '.venv', 'Scripts', 'python.exe'))
+    server_params = StdioServerParameters(
+        command=venv_python_path,
+        args=["src/gmail/server.py"]
+    )
+
+    # One server process per member; MCP_POOL_SIZE defaults to the core count, up to 4
+    return MCPSessionPool(
+        server_params,
+        size=int(os.getenv("MCP_POOL_SIZE", str(min(4, os.cpu_count() or 1)))),
+        init_timeout=30  # 30-second timeout for each connection
+    )
+
+
+def startup_error_message(error) -> str:
+    """User-facing message for a pool that failed to start"""
+    error_msg = str(error)
+    if "credentials file not found" in error_msg.lower():
+        error_msg = "Gmail credentials file not found. Please create a 'gmail_cred.json' file with your OAuth 2.0 credentials in the project root directory."
+    elif "invalid_grant" in error_msg.lower():
+        error_msg = "Invalid authentication credentials. Your OAuth token may have expired. Delete the token.json file and try again."
+    elif "access_denied" in error_msg.lower():
+        error_msg = "Access denied. You need to authorize the application to access your Gmail account."
+    return error_msg
+
+
+async def call_tool(pool, tools, func_name, params, timeout=30):
+    """Run one tool call on the MCP session pool; returns the arguments used and the result text"""
+    # Find the matching tool
+    tool = next((t for t in tools if t.name == func_name), None)
+    if not tool:
+        raise ValueError(f"Unknown tool: {func_name}")
+
+    arguments = build_arguments(tool, params)
+
+    # Check if the pool is initialized
+    if not pool or not pool.ready:
+        raise ValueError("Session not initialized. Please wait for connection to establish.")
+
+    # Execute the function on the least busy server, with a timeout to avoid hanging
+    try:
+        async with asyncio.timeout(timeout):
+            result = await pool.call_tool(func_name, arguments)
+    except asyncio.TimeoutError:
+        result = "Operation timed out"
+
+    return arguments, result_to_text(result)
+
+
+async def fetch_tool_text(pool, func_name, arguments, timeout=30):
+    """Call a tool directly on the session pool, without the LLM, and return its
+    result text. Raises ValueError when not connected, TimeoutError on timeout
+    and RuntimeError when the tool failed."""
+    if not pool or not pool.ready:
+        raise ValueError("Session not initialized. Please wait for connection to establish.")
+
+    async with asyncio.timeout(timeout):
+        result = await pool.call_tool(func_name, arguments)
+    result_text = result_to_text(result)
+    if getattr(result, "isError", False) or result_text.startswith("An HttpError occurred"):
+        raise RuntimeError(result_text)
+    return result_text
+
+
+async def fetch_tool_data(pool, func_name, arguments, timeout=30):
+    """Like fetch_tool_text, with the tool's JSON result parsed back into data"""
+    result_text = await fetch_tool_text(pool, func_name, arguments, timeout)
+    try:
+        return json.loads(result_text)
+    except ValueError:
+        raise RuntimeError(result_text)
+
+
+def tool_error(error) -> tuple[int, str]:
+    """Status code and JSON body for a failed direct tool call"""
+    if isinstance(error, TimeoutError):
+        return 504, json.dumps({"error": "Operation timed out"})
+    if isinstance(error, ValueError):
+        return 503, json.dumps({"error": str(error)})
+    return 502, json.dumps({"error": str(error)})
+
+
+async def email_data(pool, func_name, arguments, cache_control, if_none_match="", shape=lambda data: data):
+    """Status code, JSON body and headers for a direct tool call. The body gets an
+    ETag, so data the client already has comes back as an empty 304."""
+    try:
+        data = shape(await fetch_tool_data(pool, func_name, arguments))
+    except (ValueError, TimeoutError, RuntimeError) as e:
+        status, body = tool_error(e)
+        return status, body, {}
+
+    body = json.dumps(data)
+    etag = f'"{hashlib.sha1(body.encode()).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag in if_none_match:
+        return 304, "", headers
+    return 200, body, headers
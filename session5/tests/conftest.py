@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The gmail modules import each other as flat siblings, as when run from src/gmail
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src', 'gmail'))
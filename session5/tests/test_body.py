@@ -0,0 +1,54 @@
+from email.message import EmailMessage
+
+from body import clean_text, extract_body, html_to_text, strip_quoted_reply, strip_signature, truncate_to_tokens
+
+
+def test_reply_header_drops_quoted_history():
+    text = "Sounds good, see you then.\n\nOn Mon, 3 Mar 2025 at 10:00, Ann <ann@example.com> wrote:\n> Lunch at noon?\n> Ann"
+    assert strip_quoted_reply(text).strip() == "Sounds good, see you then."
+
+
+def test_outlook_header_block_drops_quoted_history():
+    text = "Approved.\n\nFrom: Bob <bob@example.com>\nSent: Monday\nSubject: Budget\n\nPlease approve."
+    assert strip_quoted_reply(text).strip() == "Approved."
+
+
+def test_forwarded_message_is_kept():
+    text = "FYI\n\n---------- Forwarded message ---------\nFrom: Ann <ann@example.com>\nDate: Monday\n\nThe report is attached."
+    assert "The report is attached." in strip_quoted_reply(text)
+
+
+def test_signature_is_dropped():
+    assert strip_signature("Thanks!\n-- \nBob\nACME Corp") == "Thanks!"
+    assert strip_signature("Thanks!\nSent from my iPhone") == "Thanks!"
+
+
+def test_html_keeps_paragraphs_and_skips_scripts():
+    text = html_to_text("<style>p {}</style><p>Hello</p><ul><li>one</li><li>two</li></ul><script>x()</script>")
+    assert "Hello" in text and "- one" in text and "- two" in text
+    assert "x()" not in text and "p {}" not in text
+
+
+def test_truncation_marks_what_was_cut():
+    text = "First paragraph. " * 20 + "\n\n" + "Second paragraph. " * 50
+    cut = truncate_to_tokens(text, 100)
+    assert cut.startswith("First paragraph.")
+    assert "more tokens truncated]" in cut
+    assert len(cut) < len(text)
+
+
+def test_clean_text_without_limit_keeps_everything():
+    assert clean_text("a  b\n\n\n\nc", max_tokens=None) == "a b\n\nc"
+
+
+def test_extract_body_prefers_plain_text():
+    message = EmailMessage()
+    message.set_content("Plain body\n\n> quoted")
+    message.add_alternative("<p>HTML body</p>", subtype="html")
+    assert extract_body(message) == "Plain body"
+
+
+def test_extract_body_falls_back_to_html():
+    message = EmailMessage()
+    message.set_content("<p>Only <b>HTML</b></p>", subtype="html")
+    assert extract_body(message) == "Only HTML"
@@ -0,0 +1,48 @@
+import time
+
+from contacts import ContactIndex
+
+
+def message(msg_id, sender, to='', days_ago=0):
+    return {'id': msg_id, 'from': sender, 'to': to, 'cc': '', 'internalDate': (time.time() - days_ago * 86400) * 1000}
+
+
+def test_prefix_matches_name_and_address_parts():
+    index = ContactIndex()
+    index.add_message(message('1', 'Priya Raman <priya.raman@finance.example.com>'))
+    assert [c['address'] for c in index.lookup('pri')] == ['priya.raman@finance.example.com']
+    assert [c['address'] for c in index.lookup('finan')] == ['priya.raman@finance.example.com']
+    assert index.lookup('priya')[0]['name'] == 'Priya Raman'
+
+
+def test_stop_words_are_ignored_and_all_terms_count():
+    index = ContactIndex()
+    index.add_message(message('1', 'Priya Raman <priya@finance.example.com>'))
+    index.add_message(message('2', 'Priya Shah <priya@sales.example.com>'))
+    assert [c['address'] for c in index.lookup('Priya from finance')] == ['priya@finance.example.com']
+
+
+def test_frequent_and_recent_contacts_rank_first():
+    index = ContactIndex()
+    index.add_message(message('1', 'Sam Old <sam@old.example.com>', days_ago=120))
+    for i in range(3):
+        index.add_message(message(f'n{i}', 'Sam New <sam@new.example.com>'))
+    ranked = index.lookup('sam')
+    assert [c['address'] for c in ranked] == ['sam@new.example.com', 'sam@old.example.com']
+    assert ranked[0]['count'] == 3
+
+
+def test_ignored_addresses_and_repeated_messages():
+    index = ContactIndex(ignore=['Me@example.com'])
+    entry = message('1', 'Me <me@example.com>', to='Ann <ann@example.com>')
+    index.add_message(entry)
+    index.add_message(entry)
+    assert len(index) == 1
+    assert index.lookup('ann')[0]['count'] == 1
+    assert index.lookup('me') == []
+
+
+def test_encoded_display_names_are_decoded():
+    index = ContactIndex()
+    index.add_message(message('1', '=?utf-8?q?Jos=C3=A9_Garc=C3=ADa?= <jose@example.com>'))
+    assert index.lookup('jos')[0]['name'] == 'José García'
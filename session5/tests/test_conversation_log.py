@@ -0,0 +1,57 @@
+import json
+
+import conversation_log
+from conversation_log import ConversationLog, read_lines_backwards
+
+
+def test_lines_are_read_last_first_across_blocks(tmp_path, monkeypatch):
+    monkeypatch.setattr(conversation_log, 'BLOCK_SIZE', 7)
+    path = tmp_path / 'lines.txt'
+    path.write_bytes(b'first line\nsecond\n\nthird one here\nlast')
+    assert list(read_lines_backwards(str(path))) == [b'last', b'third one here', b'second', b'first line']
+
+
+def test_tail_resumes_from_the_latest_snapshot(tmp_path):
+    path = str(tmp_path / 'log.jsonl')
+    state = {'summary': ''}
+    log = ConversationLog(path, snapshot_every=2, snapshot=lambda: dict(state))
+    for i in range(5):
+        state['summary'] = f'after {i}'
+        log.append('You', f'turn {i}')
+    log.close()
+
+    snapshot, turns = ConversationLog(path).load_tail()
+    assert snapshot == {'summary': 'after 3'}
+    assert turns == [{'sender': 'You', 'message': 'turn 4'}]
+
+
+def test_tail_without_snapshot_is_capped(tmp_path):
+    path = str(tmp_path / 'log.jsonl')
+    log = ConversationLog(path)
+    for i in range(10):
+        log.append('You', f'turn {i}')
+    log.append('You', '')
+    log.close()
+
+    snapshot, turns = ConversationLog(path).load_tail(max_turns=3)
+    assert snapshot is None
+    assert [turn['message'] for turn in turns] == ['turn 7', 'turn 8', 'turn 9']
+
+
+def test_torn_last_line_is_skipped_and_terminated(tmp_path):
+    path = tmp_path / 'log.jsonl'
+    path.write_text(json.dumps({'type': 'turn', 'sender': 'You', 'message': 'kept'}) + '\n{"type": "tu')
+    log = ConversationLog(str(path))
+    assert log.load_tail()[1] == [{'sender': 'You', 'message': 'kept'}]
+
+    log.append('Assistant', 'after the crash')
+    log.close()
+    assert [turn['message'] for turn in ConversationLog(str(path)).load_tail()[1]] == ['kept', 'after the crash']
+
+
+def test_no_path_keeps_nothing(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    log = ConversationLog(None)
+    log.append('You', 'hello')
+    assert log.load_tail() == (None, [])
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,49 @@
+import pytest
+
+from dedup import DuplicateIndex, normalize
+
+ALERT = "Disk usage on server {host} reached {pct} percent at {time}. Check https://monitor.example.com/{host} for details and clean up old log files."
+
+
+def entry(msg_id, subject, body):
+    return {'id': msg_id, 'from': 'alerts@example.com', 'subject': subject, 'body': body}
+
+
+def test_normalize_folds_numbers_and_drops_urls():
+    assert normalize("Job 1234 failed, see https://ci.example.com/1234") == ['job', '0', 'failed', 'see']
+
+
+def test_alert_storm_forms_one_cluster():
+    index = DuplicateIndex()
+    for i in range(5):
+        index.add_message(entry(f'a{i}', 'Disk alert', ALERT.format(host=f'db{i}', pct=90 + i, time=f'10:0{i}')))
+    index.add_message(entry('other', 'Lunch', 'Are we still on for lunch on Friday? I booked a table at the usual place.'))
+
+    clusters = index.clusters()
+    assert len(clusters) == 1
+    assert sorted(clusters[0]['message_ids']) == [f'a{i}' for i in range(5)]
+    assert sorted(index.members('a3')) == [f'a{i}' for i in range(5)]
+    assert index.members('other') == ['other']
+
+
+def test_removed_messages_leave_their_cluster():
+    index = DuplicateIndex()
+    for i in range(3):
+        index.add_message(entry(f'a{i}', 'Disk alert', ALERT.format(host='db', pct=i, time=i)))
+    index.remove(['a0', 'a1'])
+    assert index.clusters() == []
+    assert index.members('a2') == ['a2']
+
+
+def test_snippet_is_used_without_a_body():
+    index = DuplicateIndex()
+    index.add_message({'id': '1', 'subject': 'Weekly digest', 'snippet': 'Top stories this week from your network'})
+    index.add_message({'id': '2', 'subject': 'Weekly digest', 'snippet': 'Top stories this week from your network'})
+    index.add_message({'id': '3', 'subject': '', 'snippet': ''})
+    assert index.clusters()[0]['size'] == 2
+    assert '3' not in index.entries
+
+
+def test_bands_must_divide_permutations():
+    with pytest.raises(ValueError):
+        DuplicateIndex(num_perm=64, bands=10)
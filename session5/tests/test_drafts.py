@@ -0,0 +1,56 @@
+import pytest
+
+from drafts import Draft
+
+
+def draft():
+    return Draft('ann@example.com', 'Plan', "Hi Ann,\n\nHere is the plan.\nStep one.\n\n\nThanks,\nBob")
+
+
+def test_body_is_split_into_paragraphs():
+    d = draft()
+    assert d.paragraphs == ['Hi Ann,', 'Here is the plan.\nStep one.', 'Thanks,\nBob']
+    assert d.body == "Hi Ann,\n\nHere is the plan.\nStep one.\n\nThanks,\nBob"
+
+
+def test_paragraph_operations():
+    d = draft()
+    assert d.apply('replace_paragraph', 'Hello Ann,', 0) == 'Replaced paragraph 0'
+    assert d.apply('insert_paragraph', 'One more thing.', 2) == 'Inserted paragraph 2'
+    assert d.apply('delete_paragraph', index=1) == 'Deleted paragraph 1'
+    assert d.apply('append', 'PS: see you soon') == 'Appended paragraph 3'
+    assert d.paragraphs == ['Hello Ann,', 'One more thing.', 'Thanks,\nBob', 'PS: see you soon']
+
+
+def test_header_operations():
+    d = draft()
+    d.apply('replace_subject', 'New plan')
+    d.apply('set_recipient', 'team@example.com')
+    assert d.outline().splitlines()[:2] == ['To: team@example.com', 'Subject: New plan']
+
+
+@pytest.mark.parametrize('operation, index', [
+    ('rewrite', 0),
+    ('replace_paragraph', None),
+    ('replace_paragraph', 3),
+    ('delete_paragraph', -1),
+    ('insert_paragraph', 4),
+])
+def test_invalid_edits_leave_the_draft_unchanged(operation, index):
+    d = draft()
+    with pytest.raises(ValueError):
+        d.apply(operation, 'text', index)
+    assert d.body == draft().body
+
+
+def test_copy_is_independent():
+    d = draft()
+    edited = d.copy()
+    edited.apply('append', 'Extra')
+    assert len(d.paragraphs) == 3 and len(edited.paragraphs) == 4
+
+
+def test_outline_shortens_long_paragraphs():
+    d = Draft('a@example.com', 'S', 'x' * 100)
+    assert d.outline(width=10).splitlines()[2] == '[0] ' + 'x' * 10 + '...'
+    assert d.render().splitlines()[3] == '[0] ' + 'x' * 100
@@ -0,0 +1,78 @@
+import threading
+import time
+
+import execution_store
+from execution_store import ExecutionStore, SQLiteExecutionStore, result_payload
+
+
+def entry(name='list-emails'):
+    return {'status': 'processing', 'function_name': name, 'raw_result': None, 'processed_result': None}
+
+
+def test_least_recently_used_entries_are_evicted_beyond_the_cap():
+    store = ExecutionStore(max_size=2)
+    store.create('a', entry())
+    store.create('b', entry())
+    store.get('a')
+    store.create('c', entry())
+    assert 'a' in store and 'c' in store
+    assert 'b' not in store
+    assert len(store) == 2
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(execution_store.time, 'time', lambda: now[0])
+    store = ExecutionStore(ttl=60)
+    store.create('a', entry())
+    now[0] += 30
+    store.update('a', {'status': 'completed'})
+    now[0] += 45
+    assert store.get('a')['status'] == 'completed'
+    now[0] += 61
+    assert store.get('a') is None
+    assert result_payload(store.get('a'))['error'] == "Unknown or expired execution ID"
+
+
+def test_updates_bump_the_version_and_wake_waiters():
+    store = ExecutionStore()
+    changes = []
+    store.add_listener(changes.append)
+    store.create('a', entry())
+    threading.Timer(0.05, store.update, ('a', {'status': 'completed', 'raw_result': 'ok', 'processed_result': 'Done'})).start()
+
+    result = store.wait_for_change('a', 0, timeout=5)
+    assert result['version'] == 1
+    assert result_payload(result)['processedResult'] == 'Done'
+    assert changes == ['a', 'a']
+
+
+def test_waiting_on_an_unknown_entry_returns_at_once():
+    store = ExecutionStore()
+    started = time.monotonic()
+    assert store.wait_for_change('missing', -1, timeout=5) is None
+    assert time.monotonic() - started < 1
+
+
+def test_sqlite_store_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / 'executions.sqlite3')
+    writer = SQLiteExecutionStore(path)
+    reader = SQLiteExecutionStore(path)
+    writer.create('a', entry())
+    # Read back from memory before the writer thread has committed it
+    assert writer.get('a')['version'] == 0
+    writer.update('a', {'status': 'completed', 'raw_result': 'ok', 'processed_result': 'Done'})
+    writer.close()
+    assert reader.get('a')['status'] == 'completed'
+    assert reader.wait_for_change('a', 0, timeout=1)['version'] == 1
+    reader.close()
+
+
+def test_sqlite_store_prunes_beyond_the_cap(tmp_path):
+    store = SQLiteExecutionStore(str(tmp_path / 'executions.sqlite3'), max_size=3)
+    for i in range(5):
+        store.create(str(i), entry())
+        time.sleep(0.01)
+    store.close()
+    assert len(store) == 3
+    assert store.get('0') is None and store.get('4') is not None
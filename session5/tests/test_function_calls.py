@@ -0,0 +1,80 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from function_calls import FunctionCallSplitter, build_arguments, parse_function_calls, run_function_calls, split_function_calls
+
+RESPONSE = "I'll read both emails.\nFUNCTION_CALL: read-email|123\nFUNCTION_CALL: read-email|456\nDone."
+
+
+def joined(pieces):
+    """Merge adjacent text pieces, since where text is cut depends on the chunks"""
+    merged = []
+    for kind, value in pieces:
+        if kind == "text" and merged and merged[-1][0] == "text":
+            merged[-1] = ("text", merged[-1][1] + value)
+        else:
+            merged.append((kind, value))
+    return merged
+
+
+EXPECTED = [
+    ("text", "I'll read both emails.\n"),
+    ("call", "read-email|123"),
+    ("call", "read-email|456"),
+    ("text", "Done."),
+]
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 16, len(RESPONSE)])
+def test_calls_split_across_chunks_are_reassembled(size):
+    chunks = [RESPONSE[i:i + size] for i in range(0, len(RESPONSE), size)]
+    assert joined(split_function_calls(chunks)) == EXPECTED
+
+
+def test_text_is_released_before_the_stream_ends():
+    splitter = FunctionCallSplitter()
+    assert splitter.feed("Checking your inbox FUNC") == [("text", "Checking your inbox ")]
+    assert splitter.feed("TION_CALL: list-emails|10") == []
+    assert splitter.close() == [("call", "list-emails|10")]
+
+
+def test_parse_function_calls_returns_the_explanation_and_every_call():
+    explanation, calls = parse_function_calls(RESPONSE)
+    assert explanation == "I'll read both emails."
+    assert calls == [("read-email", ["123"]), ("read-email", ["456"])]
+    assert parse_function_calls("Just an answer.") == ("Just an answer.", [])
+
+
+def test_calls_run_concurrently_within_the_limit_and_keep_their_order():
+    running = []
+    peak = []
+
+    async def call_tool(func_name, params):
+        running.append(func_name)
+        peak.append(len(running))
+        await asyncio.sleep(0.01 * (5 - int(params[0])))
+        running.remove(func_name)
+        if params[0] == "3":
+            raise RuntimeError("boom")
+        return {"id": params[0]}, f"result {params[0]}"
+
+    calls = [("read-email", [str(i)]) for i in range(5)]
+    steps = asyncio.run(run_function_calls(calls, call_tool, limit=2))
+    assert max(peak) == 2
+    assert [step["result"] for step in steps] == [
+        "result 0", "result 1", "result 2", "Error executing read-email: boom", "result 4"
+    ]
+
+
+def test_build_arguments_follows_the_schema_types():
+    tool = SimpleNamespace(inputSchema={'properties': {
+        'query': {'type': 'string'},
+        'max_results': {'type': 'integer'},
+        'threshold': {'type': 'number'},
+        'email_ids': {'type': 'array'},
+    }})
+    assert build_arguments(tool, ["is:unread", "x", "0.5", "[12, abc]", "ignored"]) == {
+        'query': 'is:unread', 'max_results': 0, 'threshold': 0.5, 'email_ids': [12, 'abc']
+    }
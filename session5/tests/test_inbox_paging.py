@@ -0,0 +1,81 @@
+import asyncio
+import threading
+
+from cache import MessageCache
+from email_assistant_app import short_date
+from server import GmailService
+
+
+def api_message(msg_id, labels):
+    headers = [
+        {'name': 'From', 'value': f'Sender {msg_id} <s{msg_id}@example.com>'},
+        {'name': 'Subject', 'value': f'Subject {msg_id}'},
+        {'name': 'Date', 'value': 'Mon, 3 Mar 2025 10:00:00 +0000'},
+    ]
+    return {'id': msg_id, 'threadId': f't{msg_id}', 'labelIds': labels, 'snippet': '', 'payload': {'headers': headers}}
+
+
+class FakeMailbox:
+    """Pages of message IDs and their labels, as the Gmail API returns them"""
+
+    def __init__(self, ids, page_size):
+        self.ids = ids
+        self.page_size = page_size
+        self.labels = {msg_id: ['INBOX', 'UNREAD'] for msg_id in ids}
+        self.fetches = []
+
+    def list_page(self, query='', page_token=None, max_results=100):
+        start = int(page_token or 0)
+        end = start + min(max_results, self.page_size)
+        page = {'messages': [{'id': msg_id} for msg_id in self.ids[start:end]]}
+        if end < len(self.ids):
+            page['nextPageToken'] = str(end)
+        return page
+
+    def batch_get(self, email_ids, batch_size=50, **params):
+        self.fetches.append((params['format'], list(email_ids)))
+        return [api_message(msg_id, self.labels[msg_id]) for msg_id in email_ids], []
+
+
+def service(mailbox):
+    gmail = GmailService.__new__(GmailService)
+    gmail.cache = MessageCache(None)
+    gmail._batch_lock = threading.Lock()
+    gmail.list_page = mailbox.list_page
+    gmail.batch_get = mailbox.batch_get
+    return gmail
+
+
+def test_inbox_pages_follow_the_cursor():
+    mailbox = FakeMailbox([str(i) for i in range(5)], page_size=2)
+    gmail = service(mailbox)
+    seen = []
+    cursor = None
+    while True:
+        page = asyncio.run(gmail.list_emails(page_token=cursor, max_results=2))
+        seen += [email['id'] for email in page['emails']]
+        cursor = page['next_page_token']
+        if not cursor:
+            break
+    assert seen == ['0', '1', '2', '3', '4']
+    assert all(format == 'metadata' for format, _ in mailbox.fetches)
+
+
+def test_cached_rows_only_refresh_their_labels():
+    mailbox = FakeMailbox(['1', '2'], page_size=25)
+    gmail = service(mailbox)
+    first = asyncio.run(gmail.list_emails())
+    assert [email['unread'] for email in first['emails']] == [True, True]
+
+    # Read elsewhere, e.g. in the Gmail web client
+    mailbox.labels['1'] = ['INBOX']
+    second = asyncio.run(gmail.list_emails())
+    assert [email['unread'] for email in second['emails']] == [False, True]
+    assert mailbox.fetches[-1] == ('minimal', ['1', '2'])
+    assert second['emails'][0]['subject'] == 'Subject 1'
+
+
+def test_row_dates_are_shortened():
+    assert short_date('Mon, 3 Mar 2025 10:00:00 +0000') == '2025-03-03 10:00'
+    assert short_date('yesterday') == 'yesterday'
+    assert short_date('') == ''
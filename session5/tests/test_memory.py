@@ -0,0 +1,68 @@
+import asyncio
+
+from body import estimate_tokens
+from memory import RESULT_PREFIX, ConversationMemory
+
+
+def test_old_turns_are_evicted_and_condensed_without_a_summarizer():
+    memory = ConversationMemory(recent_tokens=60, summary_tokens=50)
+    for i in range(10):
+        memory.add("You", f"Message number {i} about the quarterly budget")
+    asyncio.run(memory.compact())
+
+    summary, recent = memory.render().split("Recent conversation:")
+    assert summary.startswith("Summary of earlier conversation:\nYou: Message number")
+    assert "Message number 9" in recent and "Message number 9" not in summary
+    # Over the summary budget the oldest lines are dropped
+    assert "Message number 0" not in summary
+    assert estimate_tokens(memory.summary) <= 50
+
+
+def test_summarizer_gets_the_evicted_turns():
+    seen = []
+
+    async def summarize(summary, turns):
+        seen.append(turns)
+        return "User asked about budgets."
+
+    memory = ConversationMemory(recent_tokens=20, summarize=summarize)
+    memory.add("You", "What is the budget for Q1 marketing?")
+    memory.add("Assistant", "It is 10k, see the email from finance.")
+    asyncio.run(memory.compact())
+    assert seen == ["You: What is the budget for Q1 marketing?"]
+    assert memory.summary == "User asked about budgets."
+
+
+def test_failing_summarizer_falls_back_to_first_lines():
+    async def summarize(summary, turns):
+        raise RuntimeError("quota")
+
+    memory = ConversationMemory(recent_tokens=10, summarize=summarize)
+    memory.add("You", "First question\nwith a second line")
+    memory.add("You", "Second question")
+    asyncio.run(memory.compact())
+    assert memory.summary == "You: First question"
+
+
+def test_tool_results_are_cut_once_answered():
+    memory = ConversationMemory(result_tokens=10)
+    memory.add("System", RESULT_PREFIX + "read-email:\n" + "body text " * 100)
+    assert memory.has_tool_results
+    assert len(memory.turns[0]['message']) > 500
+    memory.add("Assistant", "The email asks for the report.")
+    assert "more tokens truncated]" in memory.turns[0]['message']
+    assert len(memory.turns[0]['message']) < 100
+
+
+def test_state_round_trips_through_restore():
+    memory = ConversationMemory(recent_tokens=30)
+    memory.add("You", "Find the invoice from ACME please")
+    memory.add("System", RESULT_PREFIX + "search-emails: 3 results")
+    memory.add("Assistant", "I found three invoices from ACME.")
+
+    restored = ConversationMemory(recent_tokens=30)
+    restored.restore(memory.state())
+    assert restored.has_tool_results
+    assert [turn['message'] for turn in restored._evicted + restored.turns] == [
+        turn['message'] for turn in memory._evicted + memory.turns
+    ]
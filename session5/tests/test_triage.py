@@ -0,0 +1,43 @@
+from triage import TriageClassifier, message_tokens
+
+
+def entry(msg_id, sender, subject, labels=()):
+    return {'id': msg_id, 'from': sender, 'subject': subject, 'snippet': '', 'labelIds': list(labels)}
+
+
+def history():
+    messages = []
+    for i in range(10):
+        messages.append(entry(f'boss{i}', 'Boss <boss@work.example.com>', f'Quarterly review {i}', ['INBOX', 'IMPORTANT']))
+        messages.append(entry(f'news{i}', 'Deals <deals@shop.example.com>', f'Weekend sale {i}', ['INBOX', 'CATEGORY_PROMOTIONS']))
+    return messages
+
+
+def test_tokens_skip_unread_and_priority_labels():
+    tokens = message_tokens(entry('1', 'Ann <Ann@Example.com>', 'Hi there', ['UNREAD', 'IMPORTANT', 'Label_7']))
+    assert 'from:ann@example.com' in tokens and 'domain:example.com' in tokens
+    assert 'label:Label_7' in tokens
+    assert 'label:UNREAD' not in tokens and 'label:IMPORTANT' not in tokens
+
+
+def test_unread_messages_rank_by_learned_priority():
+    model = TriageClassifier().fit(history())
+    unread = [
+        entry('u1', 'Deals <deals@shop.example.com>', 'Flash sale', ['INBOX', 'UNREAD']),
+        entry('u2', 'Boss <boss@work.example.com>', 'Review notes', ['INBOX', 'UNREAD']),
+    ]
+    ranked = model.top_k(unread, k=2)
+    assert [message['id'] for message, _ in ranked] == ['u2', 'u1']
+    assert ranked[0][1] > 0.5 > ranked[1][1]
+
+
+def test_unread_and_sent_messages_are_not_training_data():
+    messages = history() + [entry('s', 'Me <me@example.com>', 'Sent', ['SENT']), entry('u', 'X <x@example.com>', 'New', ['UNREAD'])]
+    assert TriageClassifier().fit(messages).trained_on == 20
+
+
+def test_one_class_history_scores_everything_the_same():
+    model = TriageClassifier().fit([entry('1', 'a@example.com', 'Hello', ['INBOX'])])
+    scores = model.score([entry('2', 'b@example.com', 'Anything'), entry('3', 'c@example.com', 'Else')])
+    assert list(scores) == [0.5, 0.5]
+    assert len(model.score([])) == 0